@@ -0,0 +1,32 @@
+"""Add artifact tier.
+
+Revision ID: 05b2e1a486e7
+Revises: 513518a9decd
+Create Date: 2026-10-19 09:12:41.503118
+"""
+
+import sqlalchemy as sa
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "05b2e1a486e7"
+down_revision = "513518a9decd"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table("artifact") as batch_op:
+        batch_op.add_column(
+            sa.Column("tier", sa.String(16), nullable=False, server_default="hot")
+        )
+        batch_op.add_column(
+            sa.Column("stored_size", sa.BigInteger, nullable=True, default=None)
+        )
+
+
+def downgrade():
+    with op.batch_alter_table("artifact") as batch_op:
+        batch_op.drop_column("stored_size")
+        batch_op.drop_column("tier")
@@ -0,0 +1,34 @@
+"""Add artifact perceptual hash and near-duplicate parent.
+
+Revision ID: 3e8d5b27c1fa
+Revises: 7c31d9a0f2b4
+Create Date: 2026-10-19 14:12:47.530921
+"""
+
+import sqlalchemy as sa
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "3e8d5b27c1fa"
+down_revision = "7c31d9a0f2b4"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table("artifact") as batch_op:
+        batch_op.add_column(sa.Column("phash", sa.BigInteger, nullable=True))
+        batch_op.add_column(sa.Column("parent_id", sa.BigInteger, nullable=True))
+        batch_op.create_index("ix_artifact_phash", ["phash"])
+        batch_op.create_foreign_key(
+            "fk_artifact_parent_id_artifact", "artifact", ["parent_id"], ["id"]
+        )
+
+
+def downgrade():
+    with op.batch_alter_table("artifact") as batch_op:
+        batch_op.drop_constraint("fk_artifact_parent_id_artifact", type_="foreignkey")
+        batch_op.drop_index("ix_artifact_phash")
+        batch_op.drop_column("parent_id")
+        batch_op.drop_column("phash")
@@ -0,0 +1,38 @@
+"""Add artifact catalog metadata.
+
+Revision ID: 7c31d9a0f2b4
+Revises: 05b2e1a486e7
+Create Date: 2026-10-19 11:40:02.918305
+"""
+
+import sqlalchemy as sa
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "7c31d9a0f2b4"
+down_revision = "05b2e1a486e7"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table("artifact") as batch_op:
+        batch_op.add_column(sa.Column("size", sa.BigInteger, nullable=True))
+        batch_op.add_column(sa.Column("path", sa.String(1024), nullable=True))
+        batch_op.add_column(sa.Column("mimetype", sa.String(256), nullable=True))
+        batch_op.add_column(sa.Column("plugin", sa.String(256), nullable=True))
+        batch_op.create_index("ix_artifact_path", ["path"])
+        batch_op.create_index("ix_artifact_mimetype", ["mimetype"])
+        batch_op.create_index("ix_artifact_plugin", ["plugin"])
+
+
+def downgrade():
+    with op.batch_alter_table("artifact") as batch_op:
+        batch_op.drop_index("ix_artifact_plugin")
+        batch_op.drop_index("ix_artifact_mimetype")
+        batch_op.drop_index("ix_artifact_path")
+        batch_op.drop_column("plugin")
+        batch_op.drop_column("mimetype")
+        batch_op.drop_column("path")
+        batch_op.drop_column("size")
@@ -0,0 +1,42 @@
+"""Add artifact identifiers for preflight duplicate detection.
+
+Revision ID: 9a4f6c3e8d21
+Revises: 3e8d5b27c1fa
+Create Date: 2026-10-19 16:03:29.118402
+"""
+
+import sqlalchemy as sa
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "9a4f6c3e8d21"
+down_revision = "3e8d5b27c1fa"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "artifact_identifier",
+        sa.Column(
+            "id",
+            sa.BigInteger().with_variant(sa.Integer, "sqlite"),
+            primary_key=True,
+        ),
+        sa.Column("created_at", sa.DateTime, server_default=sa.func.now()),
+        sa.Column(
+            "artifact_id", sa.BigInteger, sa.ForeignKey("artifact.id"), nullable=False
+        ),
+        sa.Column("kind", sa.String(64), nullable=False),
+        sa.Column("value", sa.String(1024), nullable=False),
+        sa.UniqueConstraint("kind", "value"),
+    )
+    op.create_index(
+        "ix_artifact_identifier_artifact_id", "artifact_identifier", ["artifact_id"]
+    )
+
+
+def downgrade():
+    op.drop_index("ix_artifact_identifier_artifact_id", "artifact_identifier")
+    op.drop_table("artifact_identifier")
@@ -0,0 +1,28 @@
+"""Add the time content was last dispatched to be fetched.
+
+Revision ID: b6d1e4f2a937
+Revises: 9a4f6c3e8d21
+Create Date: 2026-10-19 21:17:52.640318
+"""
+
+import sqlalchemy as sa
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "b6d1e4f2a937"
+down_revision = "9a4f6c3e8d21"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table("content") as batch_op:
+        batch_op.add_column(
+            sa.Column("dispatched_at", sa.DateTime, nullable=True, default=None)
+        )
+
+
+def downgrade():
+    with op.batch_alter_table("content") as batch_op:
+        batch_op.drop_column("dispatched_at")
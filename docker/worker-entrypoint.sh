@@ -1,4 +1,27 @@
 #!/bin/sh
 
-# run workers
-/code/.venv/bin/dramatiq brut.tasks
+# run a dedicated worker pool for each queue so a backlog of large fetches can never
+# delay watches, each pool can be sized independently through the environment
+PIDS=""
+start_pool() {
+  /code/.venv/bin/dramatiq brut.tasks --queues "$1" --processes "$2" --threads "$3" &
+  PIDS="$PIDS $!"
+}
+
+start_pool "${WATCH_QUEUE:-watch}" "${WATCH_PROCESSES:-1}" "${WATCH_THREADS:-4}"
+start_pool "${ENQUEUE_QUEUE:-enqueue}" "${ENQUEUE_PROCESSES:-1}" "${ENQUEUE_THREADS:-1}"
+start_pool "${FETCH_QUEUE:-fetch}" "${FETCH_PROCESSES:-2}" "${FETCH_THREADS:-4}"
+start_pool "${MAINTENANCE_QUEUE:-maintenance}" "${MAINTENANCE_PROCESSES:-1}" "${MAINTENANCE_THREADS:-1}"
+
+# stop all pools whenever the container is stopped or any one of the pools exits
+trap 'kill $PIDS 2>/dev/null' INT TERM
+running=1
+while [ "$running" -eq 1 ]; do
+  sleep 5
+  for pid in $PIDS; do
+    kill -0 "$pid" 2>/dev/null || running=0
+  done
+done
+
+kill $PIDS 2>/dev/null
+wait
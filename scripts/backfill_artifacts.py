@@ -0,0 +1,174 @@
+# -*- encoding: utf-8 -*-
+# Copyright (c) 2021 Stephen Bunn <stephen@bunn.io>
+# ISC License <https://choosealicense.com/licenses/isc>
+
+"""Backfill catalog metadata of artifacts created before it was recorded."""
+
+import argparse
+import mimetypes
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Any, Dict, Generator, List, Optional, Tuple
+
+from megu.services import get_plugin
+from sqlalchemy.orm import Session
+
+from brut.compression import COMPRESSED_SUFFIX
+from brut.db import Artifact, Content, db_session
+from brut.hasher import DEFAULT_CHUNK_SIZE, HashType
+from brut.log import instance as log
+from brut.store import Store, get_store
+
+# artifacts backfilled per commit
+DEFAULT_BATCH_SIZE = 1000
+
+# checksum mapped to the relative path, size, and stored size of a file
+LeafIndex = Dict[str, Tuple[str, int, int]]
+
+
+def index_leaf(store: Store, relative_dirpath: Path) -> LeafIndex:
+    """Hash all files of a leaf directory across all volumes of the store."""
+
+    index: LeafIndex = {}
+    for volume in store.volumes:
+        dirpath = volume.path / relative_dirpath
+        if not dirpath.is_dir():
+            continue
+
+        for path in dirpath.iterdir():
+            if not path.is_file() or path.name.startswith("."):
+                continue
+
+            hasher = HashType.XXHASH.hasher()
+            size = 0
+            with store.open_path(path) as artifact_io:
+                chunk = artifact_io.read(DEFAULT_CHUNK_SIZE)
+                while chunk:
+                    hasher.update(chunk)
+                    size += len(chunk)
+                    chunk = artifact_io.read(DEFAULT_CHUNK_SIZE)
+
+            relative_path = relative_dirpath / path.name
+            if path.suffix == COMPRESSED_SUFFIX:
+                relative_path = relative_path.with_suffix("")
+
+            index[hasher.hexdigest()] = (
+                relative_path.as_posix(),
+                size,
+                path.stat().st_size,
+            )
+
+    return index
+
+
+def get_plugin_name(url: str) -> Optional[str]:
+    """Get the name of the plugin that handles the given url."""
+
+    try:
+        return get_plugin(url).name
+    except Exception as exc:
+        log.warning(f"Failed to determine plugin for {url}, {exc}")
+        return None
+
+
+def iter_batches(
+    session: Session, store: Store, batch_size: int
+) -> Generator[Dict[Path, List[Tuple[int, str, Optional[str]]]], None, None]:
+    """Page through artifacts missing their metadata in batches of whole leaves."""
+
+    query = (
+        session.query(Artifact.id, Artifact.fingerprint, Content.url)
+        .outerjoin(Content, Content.id == Artifact.content_id)
+        .filter(Artifact.path == None, Artifact.parent_id == None)  # noqa
+        .order_by(Artifact.fingerprint)
+    )
+    last_fingerprint = ""
+    while True:
+        rows = query.filter(Artifact.fingerprint > last_fingerprint).limit(batch_size)
+        artifacts = rows.all()
+        if len(artifacts) == 0:
+            return
+
+        if len(artifacts) >= batch_size:
+            # complete the last leaf so it is only hashed once
+            prefix = "".join(store.get_relative_dirpath(artifacts[-1][1]).parts)
+            artifacts.extend(
+                query.filter(
+                    Artifact.fingerprint > artifacts[-1][1],
+                    Artifact.fingerprint.startswith(prefix),
+                )
+            )
+
+        last_fingerprint = artifacts[-1][1]
+        batch: Dict[Path, List[Tuple[int, str, Optional[str]]]] = defaultdict(list)
+        for artifact_id, fingerprint, url in artifacts:
+            batch[store.get_relative_dirpath(fingerprint)].append(
+                (artifact_id, fingerprint, url)
+            )
+
+        yield batch
+
+
+def get_mappings(
+    artifacts: List[Tuple[int, str, Optional[str]]], index: LeafIndex
+) -> Generator[Dict[str, Any], None, None]:
+    """Get the catalog updates of a leaf directory's artifacts from its index."""
+
+    for artifact_id, fingerprint, url in artifacts:
+        if fingerprint not in index:
+            log.warning(f"No file found for artifact {artifact_id} ({fingerprint})")
+            continue
+
+        path, size, stored_size = index[fingerprint]
+        log.info(f"Backfilling artifact {artifact_id} at {path}")
+        yield {
+            "id": artifact_id,
+            "path": path,
+            "size": size,
+            "stored_size": stored_size,
+            "mimetype": mimetypes.guess_type(path)[0],
+            "plugin": get_plugin_name(url) if url else None,
+        }
+
+
+def backfill_artifacts(
+    processes: Optional[int] = None, batch_size: int = DEFAULT_BATCH_SIZE
+):
+    """Backfill catalog metadata of artifacts created before it was recorded."""
+
+    store = get_store()
+    with db_session() as session:
+        with ProcessPoolExecutor(max_workers=processes) as executor:
+            for leaves in iter_batches(session, store, batch_size):
+                leaf_dirpaths = list(leaves.keys())
+                log.info(f"Backfilling artifacts across {len(leaf_dirpaths)} leaves")
+                mappings: List[Dict[str, Any]] = []
+                for relative_dirpath, index in zip(
+                    leaf_dirpaths,
+                    executor.map(
+                        index_leaf, [store] * len(leaf_dirpaths), leaf_dirpaths
+                    ),
+                ):
+                    mappings.extend(get_mappings(leaves[relative_dirpath], index))
+
+                session.bulk_update_mappings(Artifact, mappings)
+                session.commit()
+
+
+if "__main__" in __name__:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "--processes",
+        type=int,
+        default=None,
+        help="number of processes used to hash files (defaults to the CPU count)",
+    )
+    parser.add_argument(
+        "--batch-size",
+        type=int,
+        default=DEFAULT_BATCH_SIZE,
+        help="number of artifacts backfilled per commit",
+    )
+    args = parser.parse_args()
+    backfill_artifacts(processes=args.processes, batch_size=args.batch_size)
@@ -0,0 +1,37 @@
+# -*- encoding: utf-8 -*-
+# Copyright (c) 2021 Stephen Bunn <stephen@bunn.io>
+# ISC License <https://choosealicense.com/licenses/isc>
+
+"""Quarantine or remove files in the store that have no artifact in the catalog."""
+
+import argparse
+from typing import Optional
+
+from brut.garbage import (
+    ACTION_QUARANTINE,
+    ACTION_REMOVE,
+    ACTION_REPORT,
+    collect_garbage,
+)
+
+
+def collect_store_garbage(action: Optional[str] = None, dry_run: bool = False):
+    """Quarantine or remove files in the store that have no artifact in the catalog."""
+
+    collect_garbage(action=action, dry_run=dry_run)
+
+
+if "__main__" in __name__:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "--action",
+        choices=[ACTION_REPORT, ACTION_QUARANTINE, ACTION_REMOVE],
+        help="what to do with orphaned files (defaults to the configured action)",
+    )
+    parser.add_argument(
+        "--dry-run",
+        action="store_true",
+        help="only log the orphaned files that would be collected",
+    )
+    args = parser.parse_args()
+    collect_store_garbage(action=args.action, dry_run=args.dry_run)
@@ -0,0 +1,38 @@
+# -*- encoding: utf-8 -*-
+# Copyright (c) 2021 Stephen Bunn <stephen@bunn.io>
+# ISC License <https://choosealicense.com/licenses/isc>
+
+"""Move store artifacts to match the configured store layout and volumes."""
+
+import argparse
+
+from brut.db import db_session
+from brut.log import instance as log
+from brut.store import DEFAULT_REBALANCE_BATCH, get_store
+
+
+def rebalance_store(dry_run: bool = False, batch_size: int = DEFAULT_REBALANCE_BATCH):
+    """Move store artifacts to match the configured store layout and volumes."""
+
+    with db_session() as session:
+        moved = get_store().rebalance(
+            dry_run=dry_run, session=session, batch_size=batch_size
+        )
+    log.info(f"{'Would move' if dry_run else 'Moved'} {moved} artifacts")
+
+
+if "__main__" in __name__:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "--dry-run",
+        action="store_true",
+        help="only log the moves that would be made",
+    )
+    parser.add_argument(
+        "--batch-size",
+        type=int,
+        default=DEFAULT_REBALANCE_BATCH,
+        help="number of moved artifacts updated in the catalog per commit",
+    )
+    args = parser.parse_args()
+    rebalance_store(dry_run=args.dry_run, batch_size=args.batch_size)
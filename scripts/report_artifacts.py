@@ -0,0 +1,46 @@
+# -*- encoding: utf-8 -*-
+# Copyright (c) 2021 Stephen Bunn <stephen@bunn.io>
+# ISC License <https://choosealicense.com/licenses/isc>
+
+"""Report artifact counts and sizes from the artifact catalog."""
+
+import argparse
+
+from sqlalchemy import func
+
+from brut.db import Artifact, db_session
+
+GROUPS = {
+    "plugin": Artifact.plugin,
+    "mimetype": Artifact.mimetype,
+    "tier": Artifact.tier,
+}
+
+
+def report_artifacts(group: str = "tier"):
+    """Report artifact counts and sizes from the artifact catalog."""
+
+    column = GROUPS[group]
+    with db_session(commit=False) as session:
+        rows = (
+            session.query(
+                column,
+                func.count(Artifact.id),
+                func.sum(Artifact.size),
+                func.sum(Artifact.stored_size),
+            )
+            .group_by(column)
+            .order_by(func.sum(Artifact.stored_size).desc())
+        )
+
+        print(f"{group:<32} {'count':>12} {'size':>18} {'stored size':>18}")
+        for name, count, size, stored_size in rows:
+            print(
+                f"{name or '-':<32} {count:>12} {size or 0:>18} {stored_size or 0:>18}"
+            )
+
+
+if "__main__" in __name__:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--group", choices=sorted(GROUPS.keys()), default="tier")
+    report_artifacts(group=parser.parse_args().group)
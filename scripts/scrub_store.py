@@ -0,0 +1,49 @@
+# -*- encoding: utf-8 -*-
+# Copyright (c) 2021 Stephen Bunn <stephen@bunn.io>
+# ISC License <https://choosealicense.com/licenses/isc>
+
+"""Verify store artifacts against the artifact catalog, continuing the last scrub."""
+
+import argparse
+from typing import Optional
+
+from brut.helpers import parse_size
+from brut.scrub import DEFAULT_BATCH_SIZE, scrub
+
+
+def scrub_store(
+    processes: Optional[int] = None,
+    rate: Optional[str] = None,
+    max_duration: Optional[float] = None,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+):
+    """Verify store artifacts against the artifact catalog."""
+
+    scrub(
+        processes=processes,
+        rate=parse_size(rate) if rate else None,
+        max_duration=max_duration,
+        batch_size=batch_size,
+    )
+
+
+if "__main__" in __name__:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--processes", type=int, help="number of hashing processes")
+    parser.add_argument(
+        "--rate",
+        help="maximum bytes read per second by each process (e.g. 50M)",
+    )
+    parser.add_argument(
+        "--max-duration",
+        type=float,
+        help="seconds to scrub for before pausing at a checkpoint",
+    )
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE)
+    args = parser.parse_args()
+    scrub_store(
+        processes=args.processes,
+        rate=args.rate,
+        max_duration=args.max_duration,
+        batch_size=args.batch_size,
+    )
@@ -0,0 +1,223 @@
+# -*- encoding: utf-8 -*-
+# Copyright (c) 2021 Stephen Bunn <stephen@bunn.io>
+# ISC License <https://choosealicense.com/licenses/isc>
+
+"""Contains the content velocity tracking used for adaptive watch schedules.
+
+After each poll, the watch actor records the rate of new content entries it found,
+the number of new entries per second since the previous poll of the watch, as an
+exponentially weighted moving average in Redis.
+The new entries found by follow-up pages of a poll are added to the same sample.
+Watches with an adaptive schedule are rescheduled by the scheduler once for each new
+sample of their rate, so that each poll is expected to find about the configured
+target of new entries, stretching the interval of quiet watches and shrinking the
+interval of busy watches within the configured bounds.
+
+Attributes:
+    VELOCITY_KEY (str):
+        The Redis hash of the observed velocity of each watch.
+    SMOOTHING (float):
+        The weight of the latest poll in the moving average.
+    MAX_STEP (float):
+        The maximum factor an interval is stretched or shrunk by at once.
+"""
+
+import json
+import time
+from hashlib import sha1
+from typing import Any, Dict, Iterable, NamedTuple, Optional
+
+from .config import AdaptiveConfig
+from .state import build_key, get_redis
+
+VELOCITY_KEY = build_key("watch", "velocity")
+SMOOTHING = 0.3
+MAX_STEP = 2.0
+
+# keyword arguments only used for follow-up pages of the same poll
+CURSOR_KWARGS = ("after",)
+
+
+class Velocity(NamedTuple):
+    """Describes the observed rate of new content entries of a watch."""
+
+    rate: Optional[float]
+    polled_at: float
+    samples: int
+    count: int = 0
+    elapsed: float = 0.0
+    previous_rate: Optional[float] = None
+
+
+def get_watch_key(
+    watcher_type: str, args: Iterable[Any], kwargs: Dict[str, Any]
+) -> str:
+    """Get the key identifying a watch by its watcher type and arguments.
+
+    Args:
+        watcher_type (str):
+            The type of watcher used for the watch.
+        args (Iterable[Any]):
+            The arguments of the watch.
+        kwargs (Dict[str, Any]):
+            The keyword arguments of the watch.
+
+    Returns:
+        str:
+            The key of the watch.
+    """
+
+    value = json.dumps(
+        [
+            watcher_type.lower(),
+            list(args),
+            {key: kwargs[key] for key in kwargs if key not in CURSOR_KWARGS},
+        ],
+        sort_keys=True,
+        default=str,
+    )
+    return sha1(value.encode("utf-8")).hexdigest()
+
+
+def get_smoothed_rate(rate: float, previous_rate: Optional[float]) -> float:
+    """Get the moving average of a watch's rate after a new sample.
+
+    >>> from brut.adaptive import get_smoothed_rate
+    >>> get_smoothed_rate(10.0, None), get_smoothed_rate(10.0, 0.0)
+    (10.0, 3.0)
+
+    Args:
+        rate (float):
+            The rate of the new sample.
+        previous_rate (Optional[float]):
+            The moving average before the new sample, if any.
+
+    Returns:
+        float:
+            The updated moving average.
+    """
+
+    if previous_rate is None:
+        return rate
+
+    return SMOOTHING * rate + (1 - SMOOTHING) * previous_rate
+
+
+def record_poll(
+    watch_key: str,
+    count: int,
+    polled_at: Optional[float] = None,
+    follow_up: bool = False,
+) -> Optional[Velocity]:
+    """Record the number of new content entries found by a poll of a watch.
+
+    The rate of a poll is its count over the time elapsed since the previous poll, so
+    the first poll of a watch only records when it was polled.
+    The count of a follow-up page is added to the latest sample of the watch, as it
+    belongs to the same poll.
+
+    Args:
+        watch_key (str):
+            The key of the watch.
+        count (int):
+            The number of new content entries found by the poll.
+        polled_at (Optional[float], optional):
+            The timestamp of the poll.
+            Defaults to the current time.
+        follow_up (bool, optional):
+            If True, the count was found by a follow-up page of the latest poll.
+            Defaults to False.
+
+    Returns:
+        Optional[Velocity]:
+            The updated velocity of the watch, or None if a follow-up page was
+            polled for a watch that was never polled.
+    """
+
+    previous = get_velocity(watch_key)
+    if follow_up:
+        if previous is None or previous.elapsed <= 0:
+            # the latest poll was the first of the watch, so it has no rate yet
+            return previous
+
+        count += previous.count
+        velocity = previous._replace(
+            rate=get_smoothed_rate(count / previous.elapsed, previous.previous_rate),
+            count=count,
+        )
+    else:
+        polled_at = time.time() if polled_at is None else polled_at
+        velocity = Velocity(None, polled_at, 0, count=count)
+        if previous is not None:
+            elapsed = polled_at - previous.polled_at
+            if elapsed > 0:
+                velocity = Velocity(
+                    get_smoothed_rate(count / elapsed, previous.rate),
+                    polled_at,
+                    previous.samples + 1,
+                    count=count,
+                    elapsed=elapsed,
+                    previous_rate=previous.rate,
+                )
+            else:
+                velocity = previous
+
+    get_redis().hset(VELOCITY_KEY, watch_key, json.dumps(velocity._asdict()))
+    return velocity
+
+
+def get_velocity(watch_key: str) -> Optional[Velocity]:
+    """Get the observed velocity of a watch.
+
+    Args:
+        watch_key (str):
+            The key of the watch.
+
+    Returns:
+        Optional[Velocity]:
+            The velocity of the watch, or None if the watch was never polled.
+    """
+
+    value = get_redis().hget(VELOCITY_KEY, watch_key)
+    if value is None:
+        return None
+
+    data = json.loads(value)
+    if not isinstance(data, dict):
+        # averages of new entries per poll recorded by older releases have no rate
+        return None
+
+    return Velocity(**data)
+
+
+def get_adapted_interval(
+    interval: float, rate: float, adaptive_config: AdaptiveConfig
+) -> float:
+    """Get the interval that is expected to find the target of new entries per poll.
+
+    >>> from brut.adaptive import get_adapted_interval
+    >>> from brut.config import AdaptiveConfig
+    >>> get_adapted_interval(300, 0.1, AdaptiveConfig(target=25))
+    250.0
+
+    Args:
+        interval (float):
+            The current interval in seconds.
+        rate (float):
+            The average of new content entries per second.
+        adaptive_config (~brut.config.AdaptiveConfig):
+            The adaptive schedule of the watch.
+
+    Returns:
+        float:
+            The adapted interval in seconds.
+    """
+
+    adapted = adaptive_config.target / rate if rate > 0 else interval * MAX_STEP
+    adapted = min(max(adapted, interval / MAX_STEP), interval * MAX_STEP)
+    return float(
+        min(
+            max(adapted, adaptive_config.min_interval),
+            adaptive_config.max_interval,
+        )
+    )
@@ -5,9 +5,10 @@
 """Contains the core bootstrap methods for the application."""
 
 from .config import instance as config
+from .env import instance as env
 from .helpers import setup_logging
 from .log import instance as log
-from .schedule import get_scheduler
+from .schedule import run_scheduler
 
 # brut.app is an entrypoint for the app, ensure logging is setup early
 setup_logging()
@@ -16,13 +17,11 @@ setup_logging()
 def run_app():
     """Bootstrap and run the application scheduler."""
 
-    scheduler = get_scheduler(config)
     try:
         log.info("Starting up task scheduler")
-        scheduler.start()
+        run_scheduler(config, env.config_path)
     finally:
         log.info("Shutting down task scheduler")
-        scheduler.shutdown()
 
 
 # allow triggering this application through `python -m brut.app`
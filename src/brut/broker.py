@@ -0,0 +1,37 @@
+# -*- encoding: utf-8 -*-
+# Copyright (c) 2021 Stephen Bunn <stephen@bunn.io>
+# ISC License <https://choosealicense.com/licenses/isc>
+
+"""Contains the dramatiq broker used by the task actors."""
+
+from functools import lru_cache
+
+import dramatiq
+from dramatiq.brokers.redis import RedisBroker
+from dramatiq.results import Results
+from dramatiq.results.backends import RedisBackend
+
+from .config import instance as config
+from .log import instance as log
+
+
+@lru_cache
+def get_broker() -> RedisBroker:
+    """Get the Redis broker for dramatiq actors, building it on first use.
+
+    The broker is set as the global dramatiq broker, so this must be called before
+    the ``@dramatiq.actor`` decorator is used or task messages will never be read
+    from Redis.
+
+    Returns:
+        ~dramatiq.brokers.redis.RedisBroker:
+            The Redis broker for the configured Redis URL.
+    """
+
+    log.info(f"Constructing a Redis broker from {config.redis!r}")
+    redis_backend = RedisBackend()
+    redis_broker = RedisBroker(url=config.redis)
+    redis_broker.add_middleware(Results(backend=redis_backend))
+
+    dramatiq.set_broker(redis_broker)
+    return redis_broker
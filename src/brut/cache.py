@@ -0,0 +1,340 @@
+# -*- encoding: utf-8 -*-
+# Copyright (c) 2021 Stephen Bunn <stephen@bunn.io>
+# ISC License <https://choosealicense.com/licenses/isc>
+
+"""Contains a bounded local cache of downloaded resources.
+
+Completed resource downloads are kept in a content-addressed blob directory, keyed by
+the xxhash of their bytes, and indexed by the resource URL and the validators
+(``ETag`` / ``Last-Modified``) the server responded with.
+When the same URL is downloaded again, for example when a fetch is retried after
+failing to store or commit its content or when the same media is posted several times,
+a conditional request is made and a ``304 Not Modified`` response restores the resource
+from the cache instead of downloading it again.
+
+The index is a small SQLite database shared by all workers on the host.
+Once the total size of the cached blobs exceeds the configured size, the least
+recently used blobs are evicted.
+
+Attributes:
+    CACHE_DIRNAME (str):
+        The name of the cache directory within the store if not configured.
+"""
+
+import os
+import shutil
+import sqlite3
+import time
+from contextlib import closing
+from functools import lru_cache
+from pathlib import Path
+from typing import Dict, NamedTuple, Optional
+
+from .config import CacheConfig
+from .config import instance as config
+from .helpers import parse_size
+from .log import instance as log
+from .store import get_store
+
+CACHE_DIRNAME = ".cache"
+INDEX_FILENAME = "index.sqlite"
+BLOBS_DIRNAME = "blobs"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS entry (
+    url TEXT PRIMARY KEY,
+    etag TEXT,
+    last_modified TEXT,
+    digest TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    accessed REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS ix_entry_digest ON entry (digest);
+CREATE INDEX IF NOT EXISTS ix_entry_accessed ON entry (accessed);
+"""
+
+
+class CacheEntry(NamedTuple):
+    """Describes a cached resource."""
+
+    url: str
+    etag: Optional[str]
+    last_modified: Optional[str]
+    digest: str
+    size: int
+
+
+def link_or_copy(from_path: Path, to_path: Path):
+    """Hard link a file to a new path, copying it if linking is not possible.
+
+    Args:
+        from_path (~pathlib.Path):
+            The path of the file to link.
+        to_path (~pathlib.Path):
+            The path to link the file to.
+    """
+
+    temp_path = to_path.with_name(f".{to_path.name}.tmp")
+    try:
+        os.link(from_path, temp_path)
+    except OSError:
+        shutil.copyfile(from_path, temp_path)
+
+    os.replace(temp_path, to_path)
+
+
+class ResponseCache:
+    """A bounded, content-addressed cache of downloaded resources."""
+
+    def __init__(self, dirpath: Path, max_size: int):
+        """Initialize the cache.
+
+        Args:
+            dirpath (~pathlib.Path):
+                The directory the cache is kept in.
+            max_size (int):
+                The maximum total size in bytes of the cached blobs.
+        """
+
+        self.dirpath = dirpath
+        self.max_size = max_size
+        self.blobs_dirpath = dirpath / BLOBS_DIRNAME
+        self.blobs_dirpath.mkdir(parents=True, exist_ok=True)
+        with closing(self.connect()) as connection:
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.executescript(SCHEMA)
+
+    def connect(self) -> sqlite3.Connection:
+        """Connect to the cache index.
+
+        Returns:
+            ~sqlite3.Connection:
+                A new connection to the cache index.
+        """
+
+        return sqlite3.connect(
+            (self.dirpath / INDEX_FILENAME).as_posix(),
+            timeout=30,
+            isolation_level=None,
+        )
+
+    def get_blob_path(self, digest: str) -> Path:
+        """Get the path of a cached blob.
+
+        Args:
+            digest (str):
+                The xxhash digest of the blob.
+
+        Returns:
+            ~pathlib.Path:
+                The path of the blob.
+        """
+
+        return self.blobs_dirpath / digest[:2] / digest
+
+    def get(self, url: str) -> Optional[CacheEntry]:
+        """Get the cache entry for a URL.
+
+        Args:
+            url (str):
+                The URL of the resource.
+
+        Returns:
+            Optional[CacheEntry]:
+                The cache entry, or None if the URL is not cached.
+        """
+
+        with closing(self.connect()) as connection:
+            row = connection.execute(
+                "SELECT url, etag, last_modified, digest, size FROM entry "
+                "WHERE url = ?",
+                (url,),
+            ).fetchone()
+
+        if row is None:
+            return None
+
+        entry = CacheEntry(*row)
+        if not self.get_blob_path(entry.digest).is_file():
+            self.remove(url)
+            return None
+
+        return entry
+
+    def get_conditional_headers(self, entry: CacheEntry) -> Dict[str, str]:
+        """Get the headers to revalidate a cache entry with.
+
+        Args:
+            entry (CacheEntry):
+                The cache entry to revalidate.
+
+        Returns:
+            Dict[str, str]:
+                The conditional request headers.
+        """
+
+        headers: Dict[str, str] = {}
+        if entry.etag:
+            headers["If-None-Match"] = entry.etag
+        if entry.last_modified:
+            headers["If-Modified-Since"] = entry.last_modified
+
+        return headers
+
+    def restore(self, entry: CacheEntry, to_path: Path) -> bool:
+        """Restore a cached resource to a path.
+
+        Args:
+            entry (CacheEntry):
+                The cache entry to restore.
+            to_path (~pathlib.Path):
+                The path to restore the resource to.
+
+        Returns:
+            bool:
+                True if the resource was restored, False if it was evicted.
+        """
+
+        try:
+            link_or_copy(self.get_blob_path(entry.digest), to_path)
+        except FileNotFoundError:
+            return False
+
+        with closing(self.connect()) as connection:
+            connection.execute(
+                "UPDATE entry SET accessed = ? WHERE digest = ?",
+                (time.time(), entry.digest),
+            )
+
+        log.info(f"Restored {entry.url} from the response cache")
+        return True
+
+    def put(
+        self,
+        url: str,
+        etag: Optional[str],
+        last_modified: Optional[str],
+        digest: str,
+        from_path: Path,
+    ):
+        """Add a downloaded resource to the cache.
+
+        Resources without validators are not cached as they can't be revalidated.
+
+        Args:
+            url (str):
+                The URL of the resource.
+            etag (Optional[str]):
+                The ``ETag`` the server responded with.
+            last_modified (Optional[str]):
+                The ``Last-Modified`` date the server responded with.
+            digest (str):
+                The xxhash digest of the resource.
+            from_path (~pathlib.Path):
+                The path of the downloaded resource.
+        """
+
+        if not etag and not last_modified:
+            return
+
+        size = from_path.stat().st_size
+        if size > self.max_size:
+            return
+
+        blob_path = self.get_blob_path(digest)
+        if not blob_path.is_file():
+            blob_path.parent.mkdir(parents=True, exist_ok=True)
+            link_or_copy(from_path, blob_path)
+
+        with closing(self.connect()) as connection:
+            connection.execute(
+                "INSERT OR REPLACE INTO entry "
+                "(url, etag, last_modified, digest, size, accessed) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (url, etag, last_modified, digest, size, time.time()),
+            )
+
+        self.evict()
+
+    def remove(self, url: str):
+        """Remove the cache entry for a URL.
+
+        Args:
+            url (str):
+                The URL of the resource.
+        """
+
+        with closing(self.connect()) as connection:
+            connection.execute("DELETE FROM entry WHERE url = ?", (url,))
+
+    def get_total_size(self, connection: sqlite3.Connection) -> int:
+        """Get the total size in bytes of the cached blobs.
+
+        Args:
+            connection (~sqlite3.Connection):
+                The connection to the cache index.
+
+        Returns:
+            int:
+                The total size of the cached blobs.
+        """
+
+        (total,) = connection.execute(
+            "SELECT COALESCE(SUM(size), 0) FROM "
+            "(SELECT MAX(size) AS size FROM entry GROUP BY digest)"
+        ).fetchone()
+        return total
+
+    def evict(self) -> int:
+        """Evict the least recently used blobs until the cache fits its size.
+
+        Returns:
+            int:
+                The number of evicted blobs.
+        """
+
+        evicted = 0
+        with closing(self.connect()) as connection:
+            total = self.get_total_size(connection)
+            if total <= self.max_size:
+                return evicted
+
+            for digest, size in connection.execute(
+                "SELECT digest, MAX(size) FROM entry "
+                "GROUP BY digest ORDER BY MAX(accessed)"
+            ).fetchall():
+                if total <= self.max_size:
+                    break
+
+                connection.execute("DELETE FROM entry WHERE digest = ?", (digest,))
+                try:
+                    self.get_blob_path(digest).unlink()
+                except FileNotFoundError:
+                    pass
+
+                total -= size
+                evicted += 1
+
+        log.debug(f"Evicted {evicted} blobs from the response cache")
+        return evicted
+
+
+@lru_cache
+def get_response_cache() -> Optional[ResponseCache]:
+    """Get the configured response cache.
+
+    Returns:
+        Optional[ResponseCache]:
+            The response cache, or None if no cache is configured.
+    """
+
+    cache_config: Optional[CacheConfig] = config.cache
+    if cache_config is None:
+        return None
+
+    dirpath = (
+        Path(cache_config.dir)
+        if cache_config.dir
+        else get_store().primary.path / CACHE_DIRNAME
+    )
+    return ResponseCache(dirpath, parse_size(cache_config.size))
@@ -0,0 +1,299 @@
+# -*- encoding: utf-8 -*-
+# Copyright (c) 2021 Stephen Bunn <stephen@bunn.io>
+# ISC License <https://choosealicense.com/licenses/isc>
+
+"""Contains store capacity admission control for fetches.
+
+Before content is downloaded, the bytes it is expected to take up in the store are
+reserved in Redis so that all workers share a view of the in-flight downloads.
+A reservation is only granted if the free space of the store, minus the bytes already
+reserved by other in-flight downloads, stays above the configured watermark.
+Otherwise the fetch is deferred until space is available again.
+As the volume some content is written to depends on its checksum, which is only known
+once it is downloaded, the watermark is checked against the volume with the least
+free space above its watermark.
+
+The expected size of some content is taken from the size reported by the plugin, or
+from ``HEAD`` requests against the content's resources if the plugin doesn't know it.
+
+.. note:: The free space of the store already includes bytes written by in-flight
+    downloads, so reservations are slightly conservative while downloads progress.
+
+Attributes:
+    DEFAULT_TIMEOUT (int):
+        The default timeout in seconds for ``HEAD`` requests used for size hints.
+"""
+
+import time
+from contextlib import contextmanager
+from typing import Generator, Optional, Tuple
+
+import requests
+from megu.models import Content as MeguContent
+from megu.models import HttpResource
+from prometheus_client import Counter, Gauge
+
+from .config import CapacityConfig
+from .config import instance as config
+from .helpers import parse_size
+from .log import instance as log
+from .state import build_key, get_redis
+from .store import Store
+
+DEFAULT_TIMEOUT = 10
+
+RESERVATIONS_KEY = build_key("capacity", "reservations")
+
+# atomically drops expired reservations, sums the remaining reservations, and adds the
+# requested reservation only if the free space stays above the watermark
+RESERVE_SCRIPT = """
+local now = tonumber(ARGV[4])
+local reserved = 0
+local entries = redis.call('HGETALL', KEYS[1])
+for index = 1, #entries, 2 do
+    local size, expires = string.match(entries[index + 1], '(%d+):(%d+)')
+    if tonumber(expires) < now then
+        redis.call('HDEL', KEYS[1], entries[index])
+    elseif entries[index] ~= ARGV[1] then
+        reserved = reserved + tonumber(size)
+    end
+end
+if tonumber(ARGV[2]) - reserved - tonumber(ARGV[3]) < tonumber(ARGV[5]) then
+    return {0, reserved}
+end
+redis.call('HSET', KEYS[1], ARGV[1], ARGV[3] .. ':' .. (now + tonumber(ARGV[6])))
+return {1, reserved + tonumber(ARGV[3])}
+"""
+
+free_bytes_gauge = Gauge(
+    "brut_store_free_bytes",
+    "The free bytes of the store volume closest to its watermark.",
+    multiprocess_mode="liveall",
+)
+reserved_bytes_gauge = Gauge(
+    "brut_store_reserved_bytes",
+    "The bytes reserved in the store for in-flight downloads.",
+    multiprocess_mode="liveall",
+)
+reservations_gauge = Gauge(
+    "brut_store_reservations",
+    "The number of in-flight downloads with a store reservation.",
+    multiprocess_mode="liveall",
+)
+deferred_counter = Counter(
+    "brut_fetch_deferred",
+    "The number of fetches deferred due to insufficient store capacity.",
+)
+
+
+class AdmissionDeferred(Exception):
+    """Raised when a fetch must be deferred until store capacity is available."""
+
+
+def get_capacity_config() -> CapacityConfig:
+    """Get the capacity configuration, falling back to defaults if not configured.
+
+    Returns:
+        ~brut.config.CapacityConfig:
+            The capacity configuration to use.
+    """
+
+    return config.capacity or CapacityConfig()
+
+
+def get_size_hint(content: MeguContent) -> Optional[int]:
+    """Get the expected size in bytes of some content.
+
+    Args:
+        content (~megu.models.Content):
+            The content to get the expected size of.
+
+    Returns:
+        Optional[int]:
+            The expected size of the content, if it could be determined.
+    """
+
+    if content.size and content.size > 0:
+        return content.size
+
+    size = 0
+    with requests.Session() as session:
+        for resource in content.resources:
+            if not isinstance(resource, HttpResource):
+                return None
+
+            try:
+                response = session.head(
+                    resource.url,
+                    headers=resource.headers,
+                    allow_redirects=True,
+                    timeout=DEFAULT_TIMEOUT,
+                )
+            except requests.RequestException as exc:
+                log.debug(f"Failed to request size hint for {resource.url}, {exc}")
+                return None
+
+            content_length = response.headers.get("Content-Length", "")
+            if not response.ok or not content_length.isdigit():
+                return None
+
+            size += int(content_length)
+
+    return size
+
+
+def get_reserved_bytes() -> int:
+    """Get the total bytes currently reserved for in-flight downloads.
+
+    Returns:
+        int:
+            The total reserved bytes.
+    """
+
+    now = int(time.time())
+    reserved = 0
+    for value in get_redis().hvals(RESERVATIONS_KEY):
+        size, expires = value.decode("utf-8").split(":")
+        if int(expires) >= now:
+            reserved += int(size)
+
+    return reserved
+
+
+def get_headroom(store: Store, watermark: str) -> Tuple[int, int]:
+    """Get the free bytes and watermark of the volume closest to its watermark.
+
+    Args:
+        store (~brut.store.Store):
+            The store artifacts are persisted to.
+        watermark (str):
+            The watermark as a percentage of each volume or a size.
+
+    Returns:
+        Tuple[int, int]:
+            The free bytes and watermark in bytes of the volume.
+    """
+
+    return min(
+        (
+            (free, parse_size(watermark, total=total))
+            for total, free in store.get_volume_usage()
+        ),
+        key=lambda usage: usage[0] - usage[1],
+    )
+
+
+def update_metrics(store: Store):
+    """Update the capacity metrics from the current reservation state.
+
+    Args:
+        store (~brut.store.Store):
+            The store artifacts are persisted to.
+    """
+
+    free, _ = get_headroom(store, get_capacity_config().watermark)
+    free_bytes_gauge.set(free)
+    reserved_bytes_gauge.set(get_reserved_bytes())
+    reservations_gauge.set(get_redis().hlen(RESERVATIONS_KEY))
+
+
+def reserve(key: str, size: int, store: Store):
+    """Reserve bytes in the store for an in-flight download.
+
+    Args:
+        key (str):
+            The unique key of the download to reserve bytes for.
+        size (int):
+            The amount of bytes to reserve.
+        store (~brut.store.Store):
+            The store artifacts are persisted to.
+
+    Raises:
+        AdmissionDeferred:
+            If reserving the bytes would cross the configured watermark.
+    """
+
+    capacity_config = get_capacity_config()
+    free, watermark = get_headroom(store, capacity_config.watermark)
+
+    granted, reserved = get_redis().eval(
+        RESERVE_SCRIPT,
+        1,
+        RESERVATIONS_KEY,
+        key,
+        free,
+        size,
+        int(time.time()),
+        watermark,
+        capacity_config.reservation_ttl,
+    )
+
+    free_bytes_gauge.set(free)
+    reserved_bytes_gauge.set(reserved)
+    reservations_gauge.set(get_redis().hlen(RESERVATIONS_KEY))
+
+    if not granted:
+        deferred_counter.inc()
+        raise AdmissionDeferred(
+            f"Reserving {size} bytes for {key} would cross the store watermark "
+            f"({free} free, {reserved} reserved, {watermark} watermark)"
+        )
+
+    log.debug(f"Reserved {size} bytes in the store for {key}")
+
+
+def release(key: str, store: Store):
+    """Release the bytes reserved in the store for an in-flight download.
+
+    Args:
+        key (str):
+            The unique key of the download to release the reservation of.
+        store (~brut.store.Store):
+            The store artifacts are persisted to.
+    """
+
+    log.debug(f"Releasing store reservation for {key}")
+    get_redis().hdel(RESERVATIONS_KEY, key)
+    update_metrics(store)
+
+
+@contextmanager
+def reservation(
+    content_id: int,
+    content: MeguContent,
+    store: Store,
+    size: Optional[int] = None,
+) -> Generator[int, None, None]:
+    """Hold a store reservation for some content while it is being downloaded.
+
+    Args:
+        content_id (int):
+            The database ID of the content being downloaded.
+        content (~megu.models.Content):
+            The content being downloaded.
+        store (~brut.store.Store):
+            The store artifacts are persisted to.
+        size (Optional[int], optional):
+            The expected size of the content if already known.
+            Defaults to None.
+
+    Raises:
+        AdmissionDeferred:
+            If there is not enough capacity in the store to download the content.
+
+    Yields:
+        int:
+            The amount of bytes reserved for the content.
+    """
+
+    key = f"{content_id}:{content.id}"
+    if size is None:
+        size = get_size_hint(content)
+    if size is None:
+        size = parse_size(get_capacity_config().default_reservation)
+
+    reserve(key, size, store)
+    try:
+        yield size
+    finally:
+        release(key, store)
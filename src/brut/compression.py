@@ -0,0 +1,117 @@
+# -*- encoding: utf-8 -*-
+# Copyright (c) 2021 Stephen Bunn <stephen@bunn.io>
+# ISC License <https://choosealicense.com/licenses/isc>
+
+"""Contains zstd compression used for cold artifacts in the store.
+
+Artifacts are compressed as a sequence of independent zstd frames of a fixed
+decompressed size followed by a seek table as described by the `zstd seekable format`_.
+The seek table is written as a skippable frame, so any zstd decompressor can still
+read the artifact as a regular zstd stream while seekable readers can jump directly to
+the frame containing some offset.
+
+.. _zstd seekable format:
+    https://github.com/facebook/zstd/tree/dev/contrib/seekable_format
+
+Attributes:
+    COMPRESSED_SUFFIX (str):
+        The suffix appended to the filename of compressed artifacts.
+    DEFAULT_FRAME_SIZE (int):
+        The default decompressed size in bytes of each independent frame.
+    DEFAULT_LEVEL (int):
+        The default zstd compression level.
+"""
+
+import struct
+from pathlib import Path
+from typing import BinaryIO, List, Tuple
+
+import zstandard
+
+COMPRESSED_SUFFIX = ".zst"
+DEFAULT_FRAME_SIZE = 2 ** 22
+DEFAULT_LEVEL = 10
+
+SKIPPABLE_FRAME_MAGIC = 0x184D2A5E
+SEEKABLE_MAGIC = 0x8F92EAB1
+
+
+def build_seek_table(frames: List[Tuple[int, int]]) -> bytes:
+    """Build the seek table skippable frame for some compressed frames.
+
+    Args:
+        frames (List[Tuple[int, int]]):
+            The compressed and decompressed size of each frame.
+
+    Returns:
+        bytes:
+            The seek table as a skippable frame.
+    """
+
+    entries = b"".join(
+        struct.pack("<II", compressed_size, decompressed_size)
+        for compressed_size, decompressed_size in frames
+    )
+    # footer holds the number of frames, the descriptor (no checksums), and the magic
+    footer = struct.pack("<IBI", len(frames), 0, SEEKABLE_MAGIC)
+    payload = entries + footer
+    return struct.pack("<II", SKIPPABLE_FRAME_MAGIC, len(payload)) + payload
+
+
+def compress_file(
+    from_path: Path,
+    to_path: Path,
+    level: int = DEFAULT_LEVEL,
+    frame_size: int = DEFAULT_FRAME_SIZE,
+) -> int:
+    """Compress a file into independent zstd frames with a trailing seek table.
+
+    Args:
+        from_path (~pathlib.Path):
+            The path of the file to compress.
+        to_path (~pathlib.Path):
+            The path to write the compressed file to.
+        level (int, optional):
+            The zstd compression level.
+            Defaults to :attr:`~DEFAULT_LEVEL`.
+        frame_size (int, optional):
+            The decompressed size in bytes of each independent frame.
+            Defaults to :attr:`~DEFAULT_FRAME_SIZE`.
+
+    Returns:
+        int:
+            The size in bytes of the compressed file.
+    """
+
+    compressor = zstandard.ZstdCompressor(level=level)
+    frames: List[Tuple[int, int]] = []
+    with from_path.open("rb") as from_io, to_path.open("wb") as to_io:
+        chunk = from_io.read(frame_size)
+        while chunk:
+            frame = compressor.compress(chunk)
+            to_io.write(frame)
+            frames.append((len(frame), len(chunk)))
+            chunk = from_io.read(frame_size)
+
+        to_io.write(build_seek_table(frames))
+        return to_io.tell()
+
+
+def open_compressed(path: Path) -> BinaryIO:
+    """Open a compressed file for reading its decompressed content.
+
+    Args:
+        path (~pathlib.Path):
+            The path of the compressed file.
+
+    Returns:
+        BinaryIO:
+            A readable binary stream of the decompressed content, closing the stream
+            also closes the underlying file.
+    """
+
+    return zstandard.ZstdDecompressor().stream_reader(  # type: ignore
+        path.open("rb"),
+        read_across_frames=True,
+        closefd=True,
+    )
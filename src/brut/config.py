@@ -5,11 +5,12 @@
 """Contains definitions to read in the configuration format."""
 
 from pathlib import Path
-from typing import Any, Dict, List
+from typing import Any, Dict, List, cast
 
 from file_config import config, var
 
 from .env import instance as env
+from .lazy import Lazy
 
 
 @config
@@ -23,12 +24,22 @@ class IntervalConfig:
     seconds: int = var(required=False)
 
 
+@config
+class AdaptiveConfig:
+    """Describes the bounds of an adaptive polling interval."""
+
+    min_interval: int = var(default=60)
+    max_interval: int = var(default=3600)
+    target: float = var(default=25.0)
+
+
 @config
 class ScheduleConfig:
     """Describes available schedules for an observe entry."""
 
     crontab: str = var(required=False)
     interval: IntervalConfig = var(required=False)
+    adaptive: AdaptiveConfig = var(required=False)
     immediate: bool = var(default=False)
 
 
@@ -50,6 +61,9 @@ class RedditConfig:
     client_id: str = var()
     client_secret: str = var()
     user_agent: str = var()
+    group: bool = var(default=False)
+    group_size: int = var(default=100)
+    reserve: int = var(default=10)
 
 
 @config
@@ -57,6 +71,7 @@ class WatcherConfig:
     """Describes available watcher configuration."""
 
     reddit: RedditConfig = var()
+    concurrency: int = var(default=32)
 
 
 @config
@@ -73,6 +88,119 @@ class LogConfig:
     debug: bool = var(default=False)
 
 
+@config
+class VolumeConfig:
+    """Describes a single volume of the store."""
+
+    path: str = var()
+    weight: float = var(default=1.0)
+
+
+@config
+class StorageConfig:
+    """Describes the layout of the store."""
+
+    volumes: List[VolumeConfig] = var(required=False)
+    fanout: List[int] = var(required=False)
+    placement: str = var(default="hash", decoder=lambda x: x.lower())
+
+
+@config
+class CapacityConfig:
+    """Describes store capacity admission control for fetches."""
+
+    watermark: str = var(default="5%")
+    default_reservation: str = var(default="64M")
+    reservation_ttl: int = var(default=21600)
+    retry_delay: int = var(default=300)
+
+
+@config
+class CacheConfig:
+    """Describes the local cache of downloaded resources."""
+
+    dir: str = var(required=False)
+    size: str = var(default="10G")
+
+
+@config
+class TieringConfig:
+    """Describes compression tiering of cold artifacts in the store."""
+
+    schedule: ScheduleConfig = var()
+    age: int = var(default=30)
+    level: int = var(default=10)
+    frame_size: str = var(default="4M")
+    max_ratio: float = var(default=0.9)
+    batch_size: int = var(default=100)
+
+
+@config
+class GarbageConfig:
+    """Describes garbage collection of orphaned files and stale temporary data."""
+
+    schedule: ScheduleConfig = var(required=False)
+    action: str = var(default="quarantine", decoder=lambda x: x.lower())
+    grace: int = var(default=24)
+    retention: int = var(default=30)
+    stale_age: int = var(default=72)
+    workers: int = var(required=False)
+
+
+@config
+class SimilarityConfig:
+    """Describes near-duplicate detection of image artifacts by perceptual hash."""
+
+    hash: str = var(default="dhash", decoder=lambda x: x.lower())
+    distance: int = var(default=6)
+    policy: str = var(default="link", decoder=lambda x: x.lower())
+
+
+@config
+class SchedulerConfig:
+    """Describes how scheduled jobs are spread out over time."""
+
+    jitter: int = var(default=5)
+    misfire_grace_time: int = var(required=False)
+    startup_interval: float = var(default=1.0)
+    lock_ttl: int = var(default=30)
+
+
+@config
+class QueueConfig:
+    """Describes the queue, priority and limits used for an actor's messages."""
+
+    name: str = var(required=False)
+    priority: int = var(required=False)
+    time_limit: int = var(required=False)
+    max_retries: int = var(required=False)
+
+
+@config
+class QueuesConfig:
+    """Describes queue configuration for each of the task actors."""
+
+    watch: QueueConfig = var(required=False)
+    enqueue: QueueConfig = var(required=False)
+    fetch: QueueConfig = var(required=False)
+    maintenance: QueueConfig = var(required=False)
+
+
+@config
+class FetchConfig:
+    """Describes configuration for fetching content to the store."""
+
+    batch_size: int = var(default=1)
+    commit: str = var(default="item", decoder=lambda x: x.lower())
+    on_watch: bool = var(default=False)
+    partial_dir: str = var(required=False)
+    preflight: bool = var(default=True)
+    staging_threshold: str = var(default="8M")
+    staging_dir: str = var(required=False)
+    staging_plugins: List[str] = var(required=False)
+    sweep_grace: int = var(default=3600)
+
+
 @config
 class BrutConfig:
     """Contains observe configuration for the app."""
@@ -84,6 +212,15 @@ class BrutConfig:
     watchers: WatcherConfig = var()
     watch: List[WatchConfig] = var()
     enqueue: ScheduleConfig = var()
+    scheduler: SchedulerConfig = var(required=False)
+    fetch: FetchConfig = var(required=False)
+    queues: QueuesConfig = var(required=False)
+    capacity: CapacityConfig = var(required=False)
+    storage: StorageConfig = var(required=False)
+    tiering: TieringConfig = var(required=False)
+    garbage: GarbageConfig = var(required=False)
+    similarity: SimilarityConfig = var(required=False)
+    cache: CacheConfig = var(required=False)
 
 
 def get_config(config_path: Path) -> BrutConfig:
@@ -109,4 +246,16 @@ def get_config(config_path: Path) -> BrutConfig:
         return BrutConfig.load_yaml(fp)  # type: ignore
 
 
-instance = get_config(env.config_path)
+def load_config() -> BrutConfig:
+    """Load the configuration from the path given by the environment.
+
+    Returns:
+        BrutConfig:
+            The parsed configuration to use within the app.
+    """
+
+    return get_config(env.config_path)
+
+
+# parsed on first use so modules can be imported without a config file
+instance = cast(BrutConfig, Lazy(load_config))
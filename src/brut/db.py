@@ -22,6 +22,7 @@ from sqlalchemy import (
     String,
     Table,
     Text,
+    UniqueConstraint,
     func,
 )
 from sqlalchemy.engine import Engine, create_engine
@@ -35,6 +36,11 @@ from .log import instance as log
 # The SQLAlchemy ORM registry that we use to decorate dataclasses with
 orm_registry = registry()
 
+# Storage tiers of artifacts, cold artifacts are either compressed or incompressible
+TIER_HOT = "hot"
+TIER_COMPRESSED = "zstd"
+TIER_RAW = "raw"
+
 
 @orm_registry.mapped
 @dataclass
@@ -51,6 +57,7 @@ class Content:
         Column("fingerprint", String(64), unique=True),
         Column("url", String(2048)),
         Column("data", Text),
+        Column("dispatched_at", DateTime, nullable=True, default=None),
         Column("processed_at", DateTime, nullable=True, default=None),
         Column("processed_message", Text, nullable=True, default=None),
     )
@@ -63,6 +70,7 @@ class Content:
     fingerprint: str
     url: str
     data: str
+    dispatched_at: Optional[datetime] = field(default=None)
     processed_at: Optional[datetime] = field(default=None)
     processed_message: Optional[str] = field(default=None)
     artifacts: List[Artifact] = field(default_factory=list)
@@ -101,12 +109,51 @@ class Artifact:
         Column("created_at", DateTime, server_default=func.now()),
         Column("fingerprint", String(64), unique=True),
         Column("content_id", ForeignKey("content.id")),
+        Column("tier", String(16), nullable=False, server_default=TIER_HOT),
+        Column("stored_size", BigInteger, nullable=True, default=None),
+        Column("size", BigInteger, nullable=True, default=None),
+        Column("path", String(1024), nullable=True, default=None, index=True),
+        Column("mimetype", String(256), nullable=True, default=None, index=True),
+        Column("plugin", String(256), nullable=True, default=None, index=True),
+        Column("phash", BigInteger, nullable=True, default=None, index=True),
+        Column("parent_id", ForeignKey("artifact.id"), nullable=True, default=None),
     )
 
     id: int = field(init=False)
     created_at: datetime
     fingerprint: str
     content_id: int = field(init=False)
+    tier: str = field(default=TIER_HOT)
+    stored_size: Optional[int] = field(default=None)
+    size: Optional[int] = field(default=None)
+    path: Optional[str] = field(default=None)
+    mimetype: Optional[str] = field(default=None)
+    plugin: Optional[str] = field(default=None)
+    phash: Optional[int] = field(default=None)
+    parent_id: Optional[int] = field(default=None)
+
+
+@orm_registry.mapped
+@dataclass
+class ArtifactIdentifier:
+    """Describes a cheap remote identifier of some artifact's content."""
+
+    __table__ = Table(
+        "artifact_identifier",
+        orm_registry.metadata,
+        Column("id", BigInteger().with_variant(Integer, "sqlite"), primary_key=True),
+        Column("created_at", DateTime, server_default=func.now()),
+        Column("artifact_id", ForeignKey("artifact.id"), nullable=False, index=True),
+        Column("kind", String(64), nullable=False),
+        Column("value", String(1024), nullable=False),
+        UniqueConstraint("kind", "value"),
+    )
+
+    id: int = field(init=False)
+    created_at: datetime
+    artifact_id: int
+    kind: str
+    value: str
 
 
 @lru_cache
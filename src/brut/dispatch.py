@@ -0,0 +1,243 @@
+# -*- encoding: utf-8 -*-
+# Copyright (c) 2021 Stephen Bunn <stephen@bunn.io>
+# ISC License <https://choosealicense.com/licenses/isc>
+
+"""Contains the dispatcher pacing rate-limited watch polls.
+
+Rather than sending watch messages as soon as their triggers fire, rate-limited
+watches are marked as due and sent by the dispatcher on each tick.
+The dispatcher refills a token bucket at the request rate that fits within the
+remaining quota of the current rate-limit window, and sends due watches in order of
+staleness, least recently sent first, while tokens are available.
+Watches that don't fit within the quota stay due until a later tick, so bursts of
+triggers are spread out instead of exhausting the quota.
+Many watches sent on the same tick are sent as a single message so they are polled
+concurrently by a single worker.
+
+Follow-up pages of a poll are queued in Redis by the watch workers, and only sent by
+the leading scheduler, so they are paced within the same quota as scheduled polls.
+Follow-ups are sent before any scheduled poll, as they continue a poll that found a
+full page of new content.
+
+Attributes:
+    DISPATCH_INTERVAL (float):
+        The interval in seconds between ticks of the dispatcher.
+    FOLLOW_UPS_KEY (str):
+        The Redis list of follow-up page polls waiting to be dispatched.
+    MAX_FOLLOW_UPS (int):
+        The maximum number of follow-up page polls kept waiting.
+"""
+
+import json
+import time
+from threading import Lock
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Tuple
+
+from redis import Redis
+
+from .log import instance as log
+from .quota import QuotaTracker
+from .state import build_key
+
+DISPATCH_INTERVAL = 1.0
+FOLLOW_UPS_KEY = build_key("watch", "follow-ups")
+MAX_FOLLOW_UPS = 10000
+
+
+class WatchRequest(NamedTuple):
+    """Describes a due watch poll."""
+
+    name: str
+    type: str
+    args: List[Any]
+    kwargs: Dict[str, Any]
+    requested_at: float
+    follow_up: bool = False
+
+
+def queue_follow_up(
+    redis: Redis, watcher_type: str, args: List[Any], kwargs: Dict[str, Any]
+):
+    """Queue a follow-up page poll of a watch to be sent by the leading scheduler.
+
+    Args:
+        redis (~redis.Redis):
+            The Redis client to queue the follow-up with.
+        watcher_type (str):
+            The type of watcher to use for the follow-up.
+        args (List[Any]):
+            The arguments of the watch.
+        kwargs (Dict[str, Any]):
+            The keyword arguments of the watch, including the page cursor.
+    """
+
+    with redis.pipeline() as pipeline:
+        pipeline.rpush(FOLLOW_UPS_KEY, json.dumps([watcher_type, args, kwargs]))
+        pipeline.ltrim(FOLLOW_UPS_KEY, -MAX_FOLLOW_UPS, -1)
+        pipeline.execute()
+
+
+def pop_follow_ups(redis: Redis) -> List[Tuple[str, List[Any], Dict[str, Any]]]:
+    """Pop all queued follow-up page polls.
+
+    Args:
+        redis (~redis.Redis):
+            The Redis client the follow-ups are queued with.
+
+    Returns:
+        List[Tuple[str, List[Any], Dict[str, Any]]]:
+            The watcher type, arguments, and keyword arguments of each follow-up.
+    """
+
+    with redis.pipeline() as pipeline:
+        pipeline.lrange(FOLLOW_UPS_KEY, 0, -1)
+        pipeline.delete(FOLLOW_UPS_KEY)
+        values, _ = pipeline.execute()
+
+    return [tuple(json.loads(value)) for value in values]  # type: ignore
+
+
+class WatchDispatcher:
+    """Paces and reorders rate-limited watch polls to fit within the API quota."""
+
+    def __init__(
+        self,
+        send: Callable[..., Any],
+        tracker: QuotaTracker,
+        reserve: int = 0,
+        send_many: Optional[Callable[..., Any]] = None,
+    ):
+        """Initialize the dispatcher.
+
+        Args:
+            send (Callable[..., Any]):
+                The function sending a watch message, called with the watcher type,
+                arguments, and keyword arguments of the watch.
+            tracker (QuotaTracker):
+                The tracker of the API quota.
+            reserve (int, optional):
+                The number of requests of the quota to keep in reserve.
+                Defaults to 0.
+            send_many (Optional[Callable[..., Any]], optional):
+                The function sending many watches as a single message, called with
+                a list of the watcher type, arguments, and keyword arguments of each
+                watch.
+                Defaults to None.
+        """
+
+        self.send = send
+        self.send_many = send_many
+        self.tracker = tracker
+        self.reserve = reserve
+        self.pending: Dict[str, WatchRequest] = {}
+        self.last_sent: Dict[str, float] = {}
+        self.tokens = 0.0
+        self.refilled_at: Optional[float] = None
+        self.lock = Lock()
+
+    def request(
+        self,
+        name: str,
+        watcher_type: str,
+        args: List[Any],
+        kwargs: Dict[str, Any],
+        follow_up: bool = False,
+    ):
+        """Mark a watch as due.
+
+        A watch that is already due is not requested twice.
+
+        Args:
+            name (str):
+                The name of the watch.
+            watcher_type (str):
+                The type of watcher to use for the watch.
+            args (List[Any]):
+                The arguments of the watch.
+            kwargs (Dict[str, Any]):
+                The keyword arguments of the watch.
+            follow_up (bool, optional):
+                If True, the watch polls a follow-up page and is sent before any
+                scheduled watch.
+                Defaults to False.
+        """
+
+        with self.lock:
+            if name in self.pending:
+                log.debug(f"Watch {name!r} is already waiting for quota")
+                return
+
+            self.pending[name] = WatchRequest(
+                name, watcher_type, args, kwargs, time.time(), follow_up
+            )
+
+    def refill(self, now: float) -> Optional[float]:
+        """Refill the token bucket for the time elapsed since the last refill.
+
+        Args:
+            now (float):
+                The current monotonic time.
+
+        Returns:
+            Optional[float]:
+                The available tokens, or None if the quota is unknown.
+        """
+
+        rate = self.tracker.get_rate(self.reserve)
+        elapsed = now - self.refilled_at if self.refilled_at is not None else 0
+        self.refilled_at = now
+        if rate is None:
+            self.tokens = 0.0
+            return None
+
+        # never bank more than a single tick's worth of requests
+        self.tokens = min(
+            self.tokens + rate * elapsed, max(rate * DISPATCH_INTERVAL, 1.0)
+        )
+        return self.tokens
+
+    def tick(self) -> int:
+        """Send the stalest due watches that fit within the API quota.
+
+        Returns:
+            int:
+                The number of sent watches.
+        """
+
+        with self.lock:
+            tokens = self.refill(time.monotonic())
+            if len(self.pending) == 0:
+                return 0
+
+            requests = sorted(
+                self.pending.values(),
+                key=lambda request: (
+                    not request.follow_up,
+                    self.last_sent.get(request.name, 0),
+                    request.requested_at,
+                ),
+            )
+            if tokens is not None:
+                requests = requests[: int(tokens)]
+                self.tokens -= len(requests)
+
+            for request in requests:
+                del self.pending[request.name]
+                # follow-ups are named by their cursor and never requested again
+                if not request.follow_up:
+                    self.last_sent[request.name] = time.time()
+
+        if self.send_many is not None and len(requests) > 1:
+            log.debug(f"Dispatching watches {[r.name for r in requests]!r}")
+            self.send_many(
+                [[request.type, request.args, request.kwargs] for request in requests]
+            )
+        else:
+            for request in requests:
+                log.debug(f"Dispatching watch {request.name!r}")
+                self.send(request.type, *request.args, **request.kwargs)
+
+        if len(self.pending) > 0:
+            log.debug(f"{len(self.pending)} watches are waiting for quota")
+
+        return len(requests)
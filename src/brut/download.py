@@ -0,0 +1,593 @@
+# -*- encoding: utf-8 -*-
+# Copyright (c) 2021 Stephen Bunn <stephen@bunn.io>
+# ISC License <https://choosealicense.com/licenses/isc>
+
+"""Contains resumable downloading of content resources.
+
+Instead of downloading into a throwaway temporary directory, resources are downloaded
+into a persistent partial download area keyed by the content id and the content's
+stream URL.
+When a worker is restarted in the middle of a download, the retried fetch continues
+from where the previous attempt stopped using HTTP Range requests.
+
+Every partial download has a small JSON state file next to it which records the
+validators (``ETag`` / ``Last-Modified``) of the remote resource and the xxhash of the
+downloaded prefix at the last checkpoint.
+Before resuming, the partial file is truncated to the last checkpoint and the prefix is
+rehashed.
+If the prefix no longer matches, or the server no longer agrees to resume the same
+resource, the download is restarted from scratch.
+
+If a :class:`~brut.cache.ResponseCache` is given, a cached URL is first revalidated
+with a conditional request and restored from the cache if unmodified, and completed
+downloads are added to the cache.
+
+Attributes:
+    PARTIAL_DIRNAME (str):
+        The name of the partial download area within the store if not configured.
+    DEFAULT_CHECKPOINT_SIZE (int):
+        The default amount of bytes downloaded between checkpoints.
+    DEFAULT_TIMEOUT (int):
+        The default timeout in seconds for connecting and reading from a resource.
+    TRANSIENT_ERRORS (Tuple[Type[Exception], ...]):
+        Errors that should result in the download being retried rather than failed.
+"""
+
+import json
+import os
+import re
+import shutil
+from functools import lru_cache
+from hashlib import sha256
+from pathlib import Path
+from typing import Any, BinaryIO, Dict, List, Optional, Tuple
+
+import requests
+from megu.models import Content as MeguContent
+from megu.models import HttpResource, Manifest
+from megu.plugin.base import BasePlugin
+
+from .cache import ResponseCache
+from .hasher import DEFAULT_CHUNK_SIZE, HashType
+from .log import instance as log
+
+PARTIAL_DIRNAME = ".partial"
+PARTIAL_SUFFIX = ".part"
+STATE_SUFFIX = ".json"
+
+DEFAULT_CHECKPOINT_SIZE = 2 ** 25
+DEFAULT_TIMEOUT = 30
+
+TRANSIENT_ERRORS = (
+    requests.exceptions.ConnectionError,
+    requests.exceptions.Timeout,
+    requests.exceptions.ChunkedEncodingError,
+)
+
+CONTENT_RANGE_PATTERN = re.compile(r"^bytes (?P<start>\d+)-\d+/(?P<total>\d+|\*)$")
+
+
+def get_url_key(url: str) -> str:
+    """Get the key used to identify a given URL within the partial download area.
+
+    Args:
+        url (str):
+            The URL to build a key for.
+
+    Returns:
+        str:
+            The key for the URL.
+    """
+
+    return sha256(url.encode("utf-8")).hexdigest()[:32]
+
+
+def get_partial_dirpath(partial_dirpath: Path, content_id: int, url: str) -> Path:
+    """Get the partial download directory for some content's stream URL.
+
+    Args:
+        partial_dirpath (~pathlib.Path):
+            The root of the partial download area.
+        content_id (int):
+            The database ID of the content being downloaded.
+        url (str):
+            The stream URL of the content being downloaded.
+
+    Returns:
+        ~pathlib.Path:
+            The directory partial downloads for the content's stream are written to.
+    """
+
+    return partial_dirpath / str(content_id) / get_url_key(url)
+
+
+def read_state(state_path: Path) -> Dict[str, Any]:
+    """Read the state of a partial download.
+
+    Args:
+        state_path (~pathlib.Path):
+            The path to the state file of the partial download.
+
+    Returns:
+        Dict[str, Any]:
+            The state of the partial download, empty if no usable state exists.
+    """
+
+    if not state_path.is_file():
+        return {}
+
+    try:
+        return json.loads(state_path.read_text())
+    except ValueError:
+        log.warning(f"Discarding unreadable partial download state at {state_path}")
+        return {}
+
+
+def write_state(state_path: Path, state: Dict[str, Any]):
+    """Atomically write the state of a partial download.
+
+    Args:
+        state_path (~pathlib.Path):
+            The path to the state file of the partial download.
+        state (Dict[str, Any]):
+            The state of the partial download.
+    """
+
+    temp_path = state_path.with_name(f"{state_path.name}.tmp")
+    temp_path.write_text(json.dumps(state))
+    os.replace(temp_path, state_path)
+
+
+def verify_prefix(partial_path: Path, state: Dict[str, Any]) -> Optional[Any]:
+    """Verify the downloaded prefix of a partial download against its checkpoint.
+
+    The partial file is truncated to the last checkpoint before being hashed so that
+    any bytes written after the last checkpoint (which may be incomplete) are dropped.
+
+    Args:
+        partial_path (~pathlib.Path):
+            The path to the partial download.
+        state (Dict[str, Any]):
+            The state of the partial download.
+
+    Returns:
+        Optional[Any]:
+            The xxhash instance updated with the verified prefix, or None if the
+            partial download cannot be resumed.
+    """
+
+    offset = state.get("offset", 0)
+    if offset <= 0 or not partial_path.is_file():
+        return None
+
+    if partial_path.stat().st_size < offset:
+        log.warning(f"Partial download {partial_path} is shorter than its checkpoint")
+        return None
+
+    hasher = HashType.XXHASH.hasher()
+    with partial_path.open("r+b") as partial_io:
+        partial_io.truncate(offset)
+        chunk = partial_io.read(DEFAULT_CHUNK_SIZE)
+        while chunk:
+            hasher.update(chunk)
+            chunk = partial_io.read(DEFAULT_CHUNK_SIZE)
+
+    if hasher.hexdigest() != state.get("checksum"):
+        log.warning(f"Partial download {partial_path} failed prefix verification")
+        return None
+
+    return hasher
+
+
+def get_expected_size(response: requests.Response, offset: int) -> Optional[int]:
+    """Get the total size of a resource from a download response.
+
+    Args:
+        response (~requests.Response):
+            The response of the download request.
+        offset (int):
+            The offset the download was requested from.
+
+    Returns:
+        Optional[int]:
+            The total size in bytes of the resource, if known.
+    """
+
+    if offset > 0:
+        match = CONTENT_RANGE_PATTERN.match(response.headers.get("Content-Range", ""))
+        if match and match.group("total") != "*":
+            return int(match.group("total"))
+        return None
+
+    # requests transparently decodes content encodings so the length is not the size
+    if "Content-Encoding" in response.headers:
+        return None
+
+    content_length = response.headers.get("Content-Length")
+    return int(content_length) if content_length and content_length.isdigit() else None
+
+
+def can_resume(response: requests.Response, offset: int) -> bool:
+    """Check if a response continues a partial download from the given offset.
+
+    Args:
+        response (~requests.Response):
+            The response of the ranged download request.
+        offset (int):
+            The offset the download was requested from.
+
+    Returns:
+        bool:
+            True if the response body starts at the given offset.
+    """
+
+    if response.status_code != 206:
+        return False
+
+    match = CONTENT_RANGE_PATTERN.match(response.headers.get("Content-Range", ""))
+    return match is not None and int(match.group("start")) == offset
+
+
+def restore_cached(
+    session: requests.Session,
+    resource: HttpResource,
+    partial_path: Path,
+    cache: ResponseCache,
+    timeout: int = DEFAULT_TIMEOUT,
+) -> bool:
+    """Restore a resource from the cache if the server reports it as unmodified.
+
+    Args:
+        session (~requests.Session):
+            The session to use for requests.
+        resource (~megu.models.HttpResource):
+            The resource to restore.
+        partial_path (~pathlib.Path):
+            The path the resource should be restored to.
+        cache (~brut.cache.ResponseCache):
+            The cache to restore the resource from.
+        timeout (int, optional):
+            The timeout in seconds for connecting to the resource.
+            Defaults to :attr:`~DEFAULT_TIMEOUT`.
+
+    Returns:
+        bool:
+            True if the resource was restored from the cache.
+    """
+
+    cache_entry = cache.get(resource.url)
+    if cache_entry is None:
+        return False
+
+    headers = dict(resource.headers or {})
+    headers.update(cache.get_conditional_headers(cache_entry))
+    # the body of a modified resource is never read, it is downloaded again afterwards
+    with session.request(
+        resource.method,
+        resource.url,
+        headers=headers,
+        data=resource.data,
+        auth=resource.auth,
+        stream=True,
+        timeout=timeout,
+    ) as response:
+        if response.status_code != 304:
+            log.debug(f"Cached {resource.url} was modified, downloading again")
+            return False
+
+    if not cache.restore(cache_entry, partial_path):
+        return False
+
+    write_state(
+        partial_path.with_name(f"{partial_path.name}{STATE_SUFFIX}"),
+        {
+            "url": resource.url,
+            "etag": cache_entry.etag,
+            "last_modified": cache_entry.last_modified,
+            "offset": cache_entry.size,
+            "checksum": cache_entry.digest,
+            "complete": True,
+        },
+    )
+    return True
+
+
+def download_resource(
+    session: requests.Session,
+    resource: HttpResource,
+    partial_path: Path,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    checkpoint_size: int = DEFAULT_CHECKPOINT_SIZE,
+    timeout: int = DEFAULT_TIMEOUT,
+    cache: Optional[ResponseCache] = None,
+) -> Path:
+    """Download a single resource to a partial download path, resuming if possible.
+
+    Args:
+        session (~requests.Session):
+            The session to use for requests.
+        resource (~megu.models.HttpResource):
+            The resource to download.
+        partial_path (~pathlib.Path):
+            The path the resource should be downloaded to.
+        chunk_size (int, optional):
+            The size in bytes of chunks read from the response stream.
+            Defaults to :attr:`~DEFAULT_CHUNK_SIZE`.
+        checkpoint_size (int, optional):
+            The amount of bytes downloaded between checkpoints.
+            Defaults to :attr:`~DEFAULT_CHECKPOINT_SIZE`.
+        timeout (int, optional):
+            The timeout in seconds for connecting and reading from the resource.
+            Defaults to :attr:`~DEFAULT_TIMEOUT`.
+        cache (Optional[~brut.cache.ResponseCache], optional):
+            The cache to revalidate and store the resource with.
+            Defaults to None.
+
+    Raises:
+        ValueError:
+            If the downloaded resource does not match the size reported by the server.
+
+    Returns:
+        ~pathlib.Path:
+            The path the resource was downloaded to.
+    """
+
+    state_path = partial_path.with_name(f"{partial_path.name}{STATE_SUFFIX}")
+    state = read_state(state_path)
+    if state.get("url") != resource.url:
+        state = {}
+
+    headers = dict(resource.headers or {})
+    resumable = resource.method.upper() == "GET" and not any(
+        key.lower() == "range" for key in headers.keys()
+    )
+
+    hasher = verify_prefix(partial_path, state) if resumable else None
+    offset = state["offset"] if hasher is not None else 0
+    if hasher is not None and state.get("complete"):
+        log.info(f"Reusing completed partial download {partial_path} of {resource.url}")
+        return partial_path
+
+    if hasher is not None:
+        log.info(f"Resuming download of {resource.url} at byte {offset}")
+        headers["Range"] = f"bytes={offset}-"
+        headers["Accept-Encoding"] = "identity"
+        validator = state.get("etag") or state.get("last_modified")
+        if validator:
+            headers["If-Range"] = validator
+
+    if (
+        hasher is None
+        and resumable
+        and cache is not None
+        and restore_cached(session, resource, partial_path, cache, timeout=timeout)
+    ):
+        return partial_path
+
+    with session.request(
+        resource.method,
+        resource.url,
+        headers=headers,
+        data=resource.data,
+        auth=resource.auth,
+        stream=True,
+        timeout=timeout,
+    ) as response:
+        if offset > 0 and response.status_code == 416:
+            log.warning(f"Server rejected resume range of {resource.url}, restarting")
+            write_state(state_path, {})
+            return download_resource(
+                session,
+                resource,
+                partial_path,
+                chunk_size=chunk_size,
+                checkpoint_size=checkpoint_size,
+                timeout=timeout,
+                cache=cache,
+            )
+
+        response.raise_for_status()
+
+        if offset > 0 and not can_resume(response, offset):
+            log.warning(f"Server refused to resume {resource.url}, restarting download")
+            offset = 0
+
+        if offset <= 0:
+            hasher = HashType.XXHASH.hasher()
+            state = {
+                "url": resource.url,
+                "etag": response.headers.get("ETag"),
+                "last_modified": response.headers.get("Last-Modified"),
+                "offset": 0,
+                "checksum": hasher.hexdigest(),
+            }
+            write_state(state_path, state)
+
+            # the partial file may be a hard link to a cached blob, never truncate it
+            partial_path.unlink(missing_ok=True)
+
+        expected_size = get_expected_size(response, offset)
+        written = offset
+        checkpoint = offset
+        with partial_path.open("ab" if offset > 0 else "wb") as partial_io:
+            for chunk in response.iter_content(chunk_size=chunk_size):
+                partial_io.write(chunk)
+                hasher.update(chunk)
+                written += len(chunk)
+
+                if written - checkpoint >= checkpoint_size:
+                    partial_io.flush()
+                    os.fsync(partial_io.fileno())
+                    state.update(offset=written, checksum=hasher.hexdigest())
+                    write_state(state_path, state)
+                    checkpoint = written
+
+            partial_io.flush()
+            os.fsync(partial_io.fileno())
+
+    if expected_size is not None and written != expected_size:
+        raise ValueError(
+            f"Downloaded {written} bytes of {resource.url} but expected {expected_size}"
+        )
+
+    state.update(offset=written, checksum=hasher.hexdigest(), complete=True)
+    write_state(state_path, state)
+
+    if cache is not None and resumable:
+        cache.put(
+            resource.url,
+            state.get("etag"),
+            state.get("last_modified"),
+            state["checksum"],
+            partial_path,
+        )
+
+    return partial_path
+
+
+@lru_cache
+def get_session() -> requests.Session:
+    """Get the requests session of the current process for staged downloads.
+
+    Returns:
+        ~requests.Session:
+            The session, reusing connections across downloads.
+    """
+
+    return requests.Session()
+
+
+def stage_resource(
+    resource: HttpResource,
+    to_io: BinaryIO,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    timeout: int = DEFAULT_TIMEOUT,
+) -> Tuple[str, int]:
+    """Download a single small resource into a stream, hashing it while streaming.
+
+    Staged downloads are not resumable, they are meant for resources small enough to
+    simply be downloaded again.
+
+    Args:
+        resource (~megu.models.HttpResource):
+            The resource to download.
+        to_io (BinaryIO):
+            The stream to write the resource to.
+        chunk_size (int, optional):
+            The size in bytes of chunks read from the response stream.
+            Defaults to :attr:`~DEFAULT_CHUNK_SIZE`.
+        timeout (int, optional):
+            The timeout in seconds for connecting and reading from the resource.
+            Defaults to :attr:`~DEFAULT_TIMEOUT`.
+
+    Raises:
+        ValueError:
+            If the downloaded resource does not match the size reported by the server.
+
+    Returns:
+        Tuple[str, int]:
+            The xxhash checksum and the size in bytes of the resource.
+    """
+
+    hasher = HashType.XXHASH.hasher()
+    written = 0
+    with get_session().request(
+        resource.method,
+        resource.url,
+        headers=resource.headers,
+        data=resource.data,
+        auth=resource.auth,
+        stream=True,
+        timeout=timeout,
+    ) as response:
+        response.raise_for_status()
+        expected_size = get_expected_size(response, 0)
+        for chunk in response.iter_content(chunk_size=chunk_size):
+            to_io.write(chunk)
+            hasher.update(chunk)
+            written += len(chunk)
+
+    if expected_size is not None and written != expected_size:
+        raise ValueError(
+            f"Downloaded {written} bytes of {resource.url} but expected {expected_size}"
+        )
+
+    to_io.seek(0)
+    return hasher.hexdigest(), written
+
+
+def download_content(
+    content_id: int,
+    content: MeguContent,
+    plugin: BasePlugin,
+    partial_dirpath: Path,
+    cache: Optional[ResponseCache] = None,
+) -> Optional[Manifest]:
+    """Download all resources of some content into the partial download area.
+
+    Args:
+        content_id (int):
+            The database ID of the content being downloaded.
+        content (~megu.models.Content):
+            The content to download.
+        plugin (~megu.plugin.base.BasePlugin):
+            The plugin that extracted the content.
+        partial_dirpath (~pathlib.Path):
+            The root of the partial download area.
+        cache (Optional[~brut.cache.ResponseCache], optional):
+            The cache to revalidate and store downloaded resources with.
+            Defaults to None.
+
+    Returns:
+        Optional[~megu.models.Manifest]:
+            The manifest of the downloaded resources to merge, or None if the content
+            has resources that cannot be downloaded resumably.
+    """
+
+    if not all(isinstance(resource, HttpResource) for resource in content.resources):
+        log.debug(f"Content {content.id} has non-HTTP resources, cannot resume")
+        return None
+
+    dirpath = get_partial_dirpath(partial_dirpath, content_id, content.url)
+    if not dirpath.is_dir():
+        log.debug(f"Creating partial download directory at {dirpath}")
+        dirpath.mkdir(parents=True)
+
+    artifacts: List[Tuple[HttpResource, Path]] = []
+    with requests.Session() as session:
+        for index, resource in enumerate(content.resources):
+            partial_path = dirpath.joinpath(
+                f"{index:04d}-{get_url_key(resource.url)[:16]}{PARTIAL_SUFFIX}"
+            )
+            artifacts.append(
+                (
+                    resource,
+                    download_resource(session, resource, partial_path, cache=cache),
+                )
+            )
+
+    return Manifest(plugin=plugin.name, content=content, artifacts=artifacts)
+
+
+def remove_partials(content_id: int, url: str, partial_dirpath: Path):
+    """Remove the partial downloads of some content's stream URL.
+
+    Args:
+        content_id (int):
+            The database ID of the downloaded content.
+        url (str):
+            The stream URL of the downloaded content.
+        partial_dirpath (~pathlib.Path):
+            The root of the partial download area.
+    """
+
+    dirpath = get_partial_dirpath(partial_dirpath, content_id, url)
+    if dirpath.is_dir():
+        log.debug(f"Removing partial downloads at {dirpath}")
+        shutil.rmtree(dirpath, ignore_errors=True)
+
+    try:
+        dirpath.parent.rmdir()
+    except OSError:
+        # other streams of the same content may still have partial downloads
+        pass
@@ -6,9 +6,12 @@
 
 import os
 from pathlib import Path
+from typing import cast
 
 import environ
 
+from .lazy import Lazy
+
 
 @environ.config(prefix="APP")
 class AppEnv:
@@ -28,4 +31,4 @@ def get_env() -> AppEnv:
     return environ.to_config(AppEnv, environ=os.environ)
 
 
-instance = get_env()
+instance = cast(AppEnv, Lazy(get_env))
@@ -0,0 +1,591 @@
+# -*- encoding: utf-8 -*-
+# Copyright (c) 2021 Stephen Bunn <stephen@bunn.io>
+# ISC License <https://choosealicense.com/licenses/isc>
+
+"""Contains garbage collection of orphaned store files and stale temporary data.
+
+Files can end up in the store without an artifact if a fetch fails after the file is
+written but before the artifact is committed, and temporary directories pile up if a
+worker dies while merging downloaded content.
+
+The store is indexed by walking each top-level fan-out directory in parallel with
+:func:`os.scandir`, producing the files of each volume sorted by their path relative to
+the volume.
+The index is then diffed against the artifact catalog, queried in the same order, with
+a single sorted merge rather than a query per file.
+Orphaned files older than a grace period are moved to a quarantine directory in their
+volume (or removed), and quarantined files are removed once the retention has passed.
+
+Attributes:
+    QUARANTINE_DIRNAME (str):
+        The name of the hidden directory in each volume orphaned files are moved to.
+    TEMPORARY_PREFIX (str):
+        The prefix of the temporary directories created while fetching content.
+"""
+
+import heapq
+import os
+import shutil
+import tempfile
+import time
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from pathlib import Path
+from typing import (
+    Callable,
+    Deque,
+    Dict,
+    Generator,
+    Iterator,
+    List,
+    NamedTuple,
+    Optional,
+    Tuple,
+)
+
+from dramatiq import Middleware
+from sqlalchemy.orm import Session
+
+from .compression import COMPRESSED_SUFFIX
+from .config import GarbageConfig
+from .config import instance as config
+from .db import Artifact, db_session
+from .log import instance as log
+from .store import Store, get_store
+
+QUARANTINE_DIRNAME = ".quarantine"
+TEMPORARY_PREFIX = "brut"
+TEMPORARY_SUFFIX = ".tmp"
+
+ACTION_REPORT = "report"
+ACTION_QUARANTINE = "quarantine"
+ACTION_REMOVE = "remove"
+
+
+class IndexEntry(NamedTuple):
+    """Describes a single file found while indexing the store."""
+
+    key: str
+    volume_path: Path
+    relative_path: Path
+    mtime: float
+    temporary: bool
+
+
+def get_garbage_config() -> GarbageConfig:
+    """Get the garbage configuration, falling back to defaults if not configured.
+
+    Returns:
+        ~brut.config.GarbageConfig:
+            The garbage configuration to use.
+    """
+
+    return config.garbage or GarbageConfig()
+
+
+def get_sort_key(name: str, is_dir: bool) -> str:
+    """Get the key a directory entry is sorted by when indexing the store.
+
+    Compressed files sort by the name of their uncompressed artifact, and directories
+    sort as the prefix of the paths they contain.
+
+    Args:
+        name (str):
+            The name of the directory entry.
+        is_dir (bool):
+            True if the entry is a directory.
+
+    Returns:
+        str:
+            The key to sort the entry by.
+    """
+
+    if is_dir:
+        return f"{name}/"
+
+    if name.endswith(COMPRESSED_SUFFIX):
+        return name[: -len(COMPRESSED_SUFFIX)]
+
+    return name
+
+
+def scan_sorted(dirpath: str) -> List[Tuple[str, os.DirEntry]]:
+    """Scan a directory, returning its entries sorted by their key.
+
+    Args:
+        dirpath (str):
+            The path of the directory to scan.
+
+    Returns:
+        List[Tuple[str, ~os.DirEntry]]:
+            The key and entry of each directory entry.
+    """
+
+    try:
+        with os.scandir(dirpath) as scanner:
+            return sorted(
+                (
+                    (
+                        get_sort_key(entry.name, entry.is_dir(follow_symlinks=False)),
+                        entry,
+                    )
+                    for entry in scanner
+                ),
+                key=lambda item: item[0],
+            )
+    except OSError as exc:
+        log.warning(f"Failed to scan store directory {dirpath}, {exc}")
+        return []
+
+
+def get_index_entry(
+    volume_path: Path, prefix: str, key: str, entry: os.DirEntry
+) -> Optional[IndexEntry]:
+    """Get the index entry for a file found while walking a volume.
+
+    Hidden files are only indexed if they are temporary files left by
+    :meth:`~brut.store.Store.put`.
+
+    Args:
+        volume_path (~pathlib.Path):
+            The path of the volume being walked.
+        prefix (str):
+            The path of the file's directory relative to the volume.
+        key (str):
+            The sort key of the file.
+        entry (~os.DirEntry):
+            The directory entry of the file.
+
+    Returns:
+        Optional[IndexEntry]:
+            The index entry of the file, or None if the file should not be indexed.
+    """
+
+    temporary = entry.name.startswith(".")
+    if temporary and not entry.name.endswith(TEMPORARY_SUFFIX):
+        return None
+
+    return IndexEntry(
+        key=f"{prefix}{key}",
+        volume_path=volume_path,
+        relative_path=Path(f"{prefix}{entry.name}"),
+        mtime=entry.stat(follow_symlinks=False).st_mtime,
+        temporary=temporary,
+    )
+
+
+def walk_sorted(volume_path: Path, dirpath: str) -> List[IndexEntry]:
+    """Walk a directory of a volume, returning its files sorted by their key.
+
+    Hidden directories are skipped.
+
+    Args:
+        volume_path (~pathlib.Path):
+            The path of the volume being walked.
+        dirpath (str):
+            The path of the directory to walk.
+
+    Returns:
+        List[IndexEntry]:
+            The files within the directory sorted by their key.
+    """
+
+    entries: List[IndexEntry] = []
+    prefix = f"{os.path.relpath(dirpath, volume_path).replace(os.sep, '/')}/"
+    for key, entry in scan_sorted(dirpath):
+        if entry.is_dir(follow_symlinks=False):
+            if not entry.name.startswith("."):
+                entries.extend(walk_sorted(volume_path, entry.path))
+            continue
+
+        index_entry = get_index_entry(volume_path, prefix, key, entry)
+        if index_entry is not None:
+            entries.append(index_entry)
+
+    return entries
+
+
+def index_volume(
+    volume_path: Path, executor: ThreadPoolExecutor, window: int
+) -> Generator[IndexEntry, None, None]:
+    """Index the files of a single volume in order of their key.
+
+    Top-level directories are walked in parallel, at most ``window`` ahead of the
+    directory currently being yielded to bound the memory held by the index.
+
+    Args:
+        volume_path (~pathlib.Path):
+            The path of the volume to index.
+        executor (~concurrent.futures.ThreadPoolExecutor):
+            The executor to walk the top-level directories with.
+        window (int):
+            The number of top-level directories walked ahead.
+
+    Yields:
+        IndexEntry:
+            The indexed files of the volume.
+    """
+
+    if not volume_path.is_dir():
+        return
+
+    children = scan_sorted(volume_path.as_posix())
+    pending: Deque[Tuple[str, Future]] = deque()
+    dirpaths = iter(
+        entry.path
+        for _, entry in children
+        if entry.is_dir(follow_symlinks=False) and not entry.name.startswith(".")
+    )
+
+    def submit():
+        dirpath = next(dirpaths, None)
+        if dirpath is not None:
+            pending.append(
+                (dirpath, executor.submit(walk_sorted, volume_path, dirpath))
+            )
+
+    for _ in range(window):
+        submit()
+
+    for key, entry in children:
+        if entry.is_dir(follow_symlinks=False):
+            if pending and pending[0][0] == entry.path:
+                _, future = pending.popleft()
+                submit()
+                yield from future.result()
+            continue
+
+        index_entry = get_index_entry(volume_path, "", key, entry)
+        if index_entry is not None:
+            yield index_entry
+
+
+def index_store(store: Store, workers: Optional[int] = None) -> Iterator[IndexEntry]:
+    """Index the files of all volumes of the store in order of their key.
+
+    Args:
+        store (~brut.store.Store):
+            The store to index.
+        workers (Optional[int], optional):
+            The number of threads used to walk the store.
+            Defaults to the executor's default.
+
+    Returns:
+        Iterator[IndexEntry]:
+            The indexed files of the store.
+    """
+
+    executor = ThreadPoolExecutor(max_workers=workers)
+    window = executor._max_workers * 2  # type: ignore
+    try:
+        yield from heapq.merge(
+            *[index_volume(volume.path, executor, window) for volume in store.volumes],
+            key=lambda entry: entry.key,
+        )
+    finally:
+        executor.shutdown(wait=True)
+
+
+def iter_catalog_paths(session: Session) -> Generator[str, None, None]:
+    """Iterate over the store paths of all artifacts in the catalog in sorted order.
+
+    Args:
+        session (~sqlalchemy.orm.Session):
+            The session to query the catalog with.
+
+    Yields:
+        str:
+            The path of each artifact relative to its volume.
+    """
+
+    column = Artifact.path
+    if session.bind.dialect.name == "postgresql":  # type: ignore
+        # compare by bytes to match the order of the store index
+        column = column.collate("C")  # type: ignore
+
+    for (path,) in (
+        session.query(Artifact.path)
+        .filter(Artifact.path != None)  # noqa
+        .order_by(column)
+        .yield_per(10000)
+    ):
+        yield path
+
+
+def iter_orphans(
+    index: Iterator[IndexEntry], catalog: Iterator[str]
+) -> Generator[IndexEntry, None, None]:
+    """Diff a sorted store index against the sorted catalog paths.
+
+    Args:
+        index (Iterator[IndexEntry]):
+            The sorted store index.
+        catalog (Iterator[str]):
+            The sorted store paths of all artifacts.
+
+    Yields:
+        IndexEntry:
+            The indexed files which have no artifact in the catalog.
+    """
+
+    catalog_path = next(catalog, None)
+    for entry in index:
+        if entry.temporary:
+            yield entry
+            continue
+
+        while catalog_path is not None and catalog_path < entry.key:
+            catalog_path = next(catalog, None)
+
+        if catalog_path != entry.key:
+            yield entry
+
+
+def has_uncataloged_artifacts(session: Session) -> bool:
+    """Check if any artifacts are missing their store path in the catalog.
+
+    Args:
+        session (~sqlalchemy.orm.Session):
+            The session to query the catalog with.
+
+    Returns:
+        bool:
+            True if some artifact's file can not be matched against the store index.
+    """
+
+    return (
+        session.query(Artifact.id)
+        .filter(Artifact.path == None, Artifact.parent_id == None)  # noqa
+        .first()
+        is not None
+    )
+
+
+def get_newest_mtime(path: Path) -> float:
+    """Get the most recent modification time of a path or anything within it.
+
+    Args:
+        path (~pathlib.Path):
+            The path to get the newest modification time of.
+
+    Returns:
+        float:
+            The newest modification time.
+    """
+
+    newest = path.stat().st_mtime
+    if path.is_dir():
+        for dirpath, _, filenames in os.walk(path):
+            for name in filenames:
+                try:
+                    newest = max(newest, os.stat(os.path.join(dirpath, name)).st_mtime)
+                except OSError:
+                    continue
+
+    return newest
+
+
+def remove_path(path: Path):
+    """Remove a file or directory, ignoring if it was already removed.
+
+    Args:
+        path (~pathlib.Path):
+            The path to remove.
+    """
+
+    if path.is_dir():
+        shutil.rmtree(path, ignore_errors=True)
+    else:
+        try:
+            path.unlink()
+        except FileNotFoundError:
+            pass
+
+
+def quarantine(volume_path: Path, relative_path: Path):
+    """Move an orphaned file into the quarantine directory of its volume.
+
+    Args:
+        volume_path (~pathlib.Path):
+            The path of the volume the file is in.
+        relative_path (~pathlib.Path):
+            The path of the file relative to the volume.
+    """
+
+    to_path = volume_path / QUARANTINE_DIRNAME / relative_path
+    to_path.parent.mkdir(parents=True, exist_ok=True)
+    os.replace(volume_path / relative_path, to_path)
+    # the quarantine retention is based on when the file was quarantined
+    os.utime(to_path)
+
+
+def purge_quarantine(store: Store, retention: int) -> int:
+    """Remove quarantined files which have been quarantined longer than the retention.
+
+    Args:
+        store (~brut.store.Store):
+            The store to purge quarantined files from.
+        retention (int):
+            The days quarantined files are kept for.
+
+    Returns:
+        int:
+            The number of purged files.
+    """
+
+    cutoff = time.time() - retention * 86400
+    purged = 0
+    for volume in store.volumes:
+        quarantine_dirpath = volume.path / QUARANTINE_DIRNAME
+        for dirpath, _, filenames in os.walk(quarantine_dirpath, topdown=False):
+            for name in filenames:
+                path = Path(dirpath, name)
+                if path.stat().st_mtime < cutoff:
+                    log.info(f"Purging quarantined file {path}")
+                    path.unlink()
+                    purged += 1
+
+            if dirpath != quarantine_dirpath.as_posix():
+                try:
+                    os.rmdir(dirpath)
+                except OSError:
+                    pass
+
+    return purged
+
+
+def collect_garbage(
+    store: Optional[Store] = None,
+    action: Optional[str] = None,
+    dry_run: bool = False,
+) -> Dict[str, int]:
+    """Quarantine or remove orphaned files in the store.
+
+    Args:
+        store (Optional[~brut.store.Store], optional):
+            The store to collect garbage in.
+            Defaults to the configured store.
+        action (Optional[str], optional):
+            The action to take on orphaned files (``report``, ``quarantine``, or
+            ``remove``).
+            Defaults to the configured action.
+        dry_run (bool, optional):
+            If True, only log the orphaned files that would be collected.
+            Defaults to False.
+
+    Raises:
+        ValueError:
+            If the given action is not supported.
+
+    Returns:
+        Dict[str, int]:
+            The number of files for each outcome of the collection.
+    """
+
+    garbage_config = get_garbage_config()
+    store = store or get_store()
+    action = action or garbage_config.action
+    if action not in (ACTION_REPORT, ACTION_QUARANTINE, ACTION_REMOVE):
+        raise ValueError(f"Unsupported garbage collection action {action!r}")
+
+    counts = {"orphaned": 0, "pending": 0, "collected": 0, "purged": 0}
+    cutoff = time.time() - garbage_config.grace * 3600
+    with db_session(commit=False) as session:
+        if action != ACTION_REPORT and has_uncataloged_artifacts(session):
+            log.warning(
+                "Only reporting orphaned files as some artifacts have no store path, "
+                "run scripts/backfill_artifacts.py first"
+            )
+            action = ACTION_REPORT
+
+        for entry in iter_orphans(
+            index_store(store, workers=garbage_config.workers),
+            iter_catalog_paths(session),
+        ):
+            path = entry.volume_path / entry.relative_path
+            counts["orphaned"] += 1
+            if entry.mtime > cutoff:
+                counts["pending"] += 1
+                continue
+
+            log.info(f"Found orphaned file {path}")
+            if action == ACTION_REPORT or dry_run:
+                continue
+
+            # temporary files are never worth keeping in the quarantine
+            if action == ACTION_REMOVE or entry.temporary:
+                remove_path(path)
+            else:
+                quarantine(entry.volume_path, entry.relative_path)
+            counts["collected"] += 1
+
+    if not dry_run:
+        counts["purged"] = purge_quarantine(store, garbage_config.retention)
+
+    log.info(f"Garbage collection completed with {counts!r}")
+    return counts
+
+
+def clean_stale_temporary(partial_dirpath: Path, stale_age: int) -> int:
+    """Remove temporary directories and partial downloads that are no longer used.
+
+    Only entries that have not been modified within the stale age are removed, so
+    entries used by other running workers are left alone.
+
+    Args:
+        partial_dirpath (~pathlib.Path):
+            The root of the partial download area.
+        stale_age (int):
+            The hours since an entry was last modified before it is considered stale.
+
+    Returns:
+        int:
+            The number of removed entries.
+    """
+
+    cutoff = time.time() - stale_age * 3600
+    candidates: List[Path] = [
+        path
+        for path in Path(tempfile.gettempdir()).glob(f"{TEMPORARY_PREFIX}*")
+        if path.is_dir()
+    ]
+    if partial_dirpath.is_dir():
+        candidates.extend(partial_dirpath.iterdir())
+
+    removed = 0
+    for path in candidates:
+        try:
+            if get_newest_mtime(path) > cutoff:
+                continue
+        except FileNotFoundError:
+            continue
+
+        log.info(f"Removing stale temporary data at {path}")
+        remove_path(path)
+        removed += 1
+
+    return removed
+
+
+class CleanupMiddleware(Middleware):
+    """Removes stale temporary data when a worker boots."""
+
+    def __init__(self, get_partial_dirpath: Callable[[], Path]):
+        """Initialize the middleware.
+
+        Args:
+            get_partial_dirpath (Callable[[], ~pathlib.Path]):
+                A callable returning the root of the partial download area.
+        """
+
+        self.get_partial_dirpath = get_partial_dirpath
+
+    def after_worker_boot(self, broker, worker):
+        """Remove stale temporary data once the worker has booted."""
+
+        try:
+            clean_stale_temporary(
+                self.get_partial_dirpath(), get_garbage_config().stale_age
+            )
+        except OSError as exc:
+            log.warning(f"Failed to clean stale temporary data, {exc}")
@@ -4,16 +4,22 @@
 
 """Contains module-wide helpers."""
 
+import re
+
 from .config import instance as config
-from .log import DEFAULT_LOG_DIRPATH, configure_logger
+from .log import configure_logger, get_log_dirpath
 from .log import instance as log
 
+SIZE_PATTERN = re.compile(r"^(?P<value>\d+(?:\.\d+)?)\s*(?P<unit>[KMGT]?)B?$", re.I)
+SIZE_UNITS = {"": 1, "K": 2 ** 10, "M": 2 ** 20, "G": 2 ** 30, "T": 2 ** 40}
+
 
 def setup_logging():
     """Configure logging based on the current environment configuration."""
 
-    if not DEFAULT_LOG_DIRPATH.is_dir() and config.log.record:
-        DEFAULT_LOG_DIRPATH.mkdir(parents=True)
+    log_dirpath = get_log_dirpath()
+    if not log_dirpath.is_dir() and config.log.record:
+        log_dirpath.mkdir(parents=True)
 
     configure_logger(
         log,
@@ -21,3 +27,40 @@ def setup_logging():
         record=config.log.record,
         debug=config.log.debug,
     )
+
+
+def parse_size(size: str, total: int = 0) -> int:
+    """Parse a human readable size into bytes.
+
+    >>> from brut.helpers import parse_size
+    >>> parse_size("10G")
+    10737418240
+    >>> parse_size("5%", total=1000)
+    50
+
+    Args:
+        size (str):
+            The size to parse, either an amount of bytes with an optional unit suffix
+            (``K``, ``M``, ``G``, ``T``) or a percentage of the given total.
+        total (int, optional):
+            The total bytes percentages are relative to.
+            Defaults to 0.
+
+    Raises:
+        ValueError:
+            If the given size cannot be parsed.
+
+    Returns:
+        int:
+            The size in bytes.
+    """
+
+    size = size.strip()
+    if size.endswith("%"):
+        return int(total * float(size[:-1]) / 100)
+
+    match = SIZE_PATTERN.match(size)
+    if not match:
+        raise ValueError(f"Invalid size {size!r}")
+
+    return int(float(match.group("value")) * SIZE_UNITS[match.group("unit").upper()])
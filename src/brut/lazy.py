@@ -0,0 +1,96 @@
+# -*- encoding: utf-8 -*-
+# Copyright (c) 2021 Stephen Bunn <stephen@bunn.io>
+# ISC License <https://choosealicense.com/licenses/isc>
+
+"""Contains the proxy used for module-level singletons built on first use.
+
+Module-level instances such as the parsed configuration and the configured logger are
+wrapped in a :class:`~Lazy` proxy so importing a module never parses the
+configuration file or configures logging handlers.
+The wrapped instance is built the first time one of its attributes is accessed.
+
+Examples:
+    .. code-block:: python
+        from .lazy import Lazy
+        instance = Lazy(get_config)
+        instance.redis  # the config is only parsed here
+"""
+
+from threading import RLock
+from typing import Any, Callable, Generic, Optional, TypeVar
+
+T = TypeVar("T")
+
+
+class Lazy(Generic[T]):
+    """A proxy to a singleton that is only built on first use."""
+
+    __slots__ = ("_factory", "_instance", "_lock")
+
+    def __init__(self, factory: Callable[[], T]):
+        """Initialize the proxy.
+
+        Args:
+            factory (Callable[[], T]):
+                The function building the proxied instance.
+        """
+
+        object.__setattr__(self, "_factory", factory)
+        object.__setattr__(self, "_instance", None)
+        object.__setattr__(self, "_lock", RLock())
+
+    def _resolve(self) -> T:
+        """Get the proxied instance, building it if it wasn't built yet.
+
+        Returns:
+            T:
+                The proxied instance.
+        """
+
+        instance: Optional[T] = object.__getattribute__(self, "_instance")
+        if instance is not None:
+            return instance
+
+        with object.__getattribute__(self, "_lock"):
+            instance = object.__getattribute__(self, "_instance")
+            if instance is None:
+                instance = object.__getattribute__(self, "_factory")()
+                object.__setattr__(self, "_instance", instance)
+
+            return instance  # type: ignore
+
+    def __getattr__(self, name: str) -> Any:
+        """Get an attribute of the proxied instance.
+
+        Args:
+            name (str):
+                The name of the attribute.
+
+        Returns:
+            Any:
+                The attribute of the proxied instance.
+        """
+
+        return getattr(self._resolve(), name)
+
+    def __setattr__(self, name: str, value: Any):
+        """Set an attribute of the proxied instance.
+
+        Args:
+            name (str):
+                The name of the attribute.
+            value (Any):
+                The value of the attribute.
+        """
+
+        setattr(self._resolve(), name, value)
+
+    def __repr__(self) -> str:
+        """Get the representation of the proxied instance.
+
+        Returns:
+            str:
+                The representation of the proxied instance.
+        """
+
+        return repr(self._resolve())
@@ -0,0 +1,200 @@
+# -*- encoding: utf-8 -*-
+# Copyright (c) 2021 Stephen Bunn <stephen@bunn.io>
+# ISC License <https://choosealicense.com/licenses/isc>
+
+"""Contains the Redis lock used to elect a single leading scheduler.
+
+Only the scheduler instance holding the lock dispatches jobs, all other instances
+stand by until the lock expires.
+The holder renews the lock well within its TTL, so a crashed or partitioned leader
+is replaced after at most a single TTL.
+
+A standby only notices an expired lock on its next attempt, so a lost leader may go
+unreplaced for up to the TTL plus the renewal interval, and runs scheduled in between
+start late by as much.
+
+Every acquisition increments a fencing token which is stored in the lock's value.
+Before dispatching, the leader checks that the lock still holds its token, so a
+leader that stalled past its TTL and was replaced stops dispatching instead of
+dispatching alongside its successor.
+"""
+
+from typing import Optional
+from uuid import uuid4
+
+from redis import Redis
+
+from .log import instance as log
+
+# atomically takes the lock only if it is free and assigns it the next fencing token
+ACQUIRE_SCRIPT = """
+if redis.call('EXISTS', KEYS[1]) == 1 then
+    return 0
+end
+local token = redis.call('INCR', KEYS[2])
+redis.call('SET', KEYS[1], token .. ':' .. ARGV[1], 'PX', ARGV[2])
+return token
+"""
+
+# extends the lock only if it is still held with the given value
+RENEW_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('PEXPIRE', KEYS[1], ARGV[2])
+end
+return 0
+"""
+
+# releases the lock only if it is still held with the given value
+RELEASE_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+
+def get_renew_interval(ttl: int) -> float:
+    """Get the interval a leader renews, and a standby retries, a lock at.
+
+    >>> from brut.leader import get_renew_interval
+    >>> get_renew_interval(30)
+    10.0
+
+    Args:
+        ttl (int):
+            The time in seconds the lock is held for without being renewed.
+
+    Returns:
+        float:
+            The interval in seconds.
+    """
+
+    return max(ttl / 3, 1)
+
+
+def get_failover_time(ttl: int) -> float:
+    """Get the longest time a lost leader may go unreplaced by a standby.
+
+    >>> from brut.leader import get_failover_time
+    >>> get_failover_time(30)
+    40.0
+
+    Args:
+        ttl (int):
+            The time in seconds the lock is held for without being renewed.
+
+    Returns:
+        float:
+            The time in seconds.
+    """
+
+    return ttl + get_renew_interval(ttl)
+
+
+class LeaderLock:
+    """A Redis lock with a TTL and fencing token electing a single leader."""
+
+    def __init__(self, redis: Redis, key: str, ttl: int):
+        """Initialize the lock.
+
+        Args:
+            redis (~redis.Redis):
+                The Redis client to keep the lock in.
+            key (str):
+                The Redis key of the lock.
+            ttl (int):
+                The time in seconds the lock is held for without being renewed.
+        """
+
+        self.redis = redis
+        self.key = key
+        self.fencing_key = f"{key}:fencing"
+        self.ttl = ttl
+        self.identity = uuid4().hex
+        self.token: Optional[int] = None
+
+    @property
+    def value(self) -> Optional[str]:
+        """Value of the lock while it is held by this instance.
+
+        Returns:
+            Optional[str]:
+                The value of the lock, or None if the lock is not held.
+        """
+
+        if self.token is None:
+            return None
+
+        return f"{self.token}:{self.identity}"
+
+    def acquire(self) -> bool:
+        """Acquire the lock, or renew it if it is already held.
+
+        Returns:
+            bool:
+                True if the lock is held by this instance.
+        """
+
+        if self.token is not None:
+            return self.renew()
+
+        token = int(
+            self.redis.eval(
+                ACQUIRE_SCRIPT,
+                2,
+                self.key,
+                self.fencing_key,
+                self.identity,
+                self.ttl * 1000,
+            )
+        )
+        if token == 0:
+            return False
+
+        self.token = token
+        log.info(f"Acquired leader lock {self.key!r} with fencing token {token}")
+        return True
+
+    def renew(self) -> bool:
+        """Extend the TTL of the held lock.
+
+        Returns:
+            bool:
+                True if the lock is still held by this instance.
+        """
+
+        if self.value is None:
+            return False
+
+        if not self.redis.eval(RENEW_SCRIPT, 1, self.key, self.value, self.ttl * 1000):
+            log.warning(
+                f"Lost leader lock {self.key!r} with fencing token {self.token}"
+            )
+            self.token = None
+            return False
+
+        return True
+
+    def check(self) -> bool:
+        """Check that the lock is still held with this instance's fencing token.
+
+        Returns:
+            bool:
+                True if the lock is still held by this instance.
+        """
+
+        if self.value is None:
+            return False
+
+        value = self.redis.get(self.key)
+        return value is not None and value.decode("utf-8") == self.value
+
+    def release(self):
+        """Release the lock if it is held by this instance."""
+
+        if self.value is None:
+            return
+
+        self.redis.eval(RELEASE_SCRIPT, 1, self.key, self.value)
+        log.info(f"Released leader lock {self.key!r} with fencing token {self.token}")
+        self.token = None
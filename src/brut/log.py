@@ -32,6 +32,7 @@ Examples:
 Attributes:
     instance (:class:`loguru.Logger`):
         The configured global logger instance that should likely always be used.
+        It is only configured once it is first used.
 """
 
 from __future__ import annotations
@@ -39,24 +40,15 @@ from __future__ import annotations
 import sys
 from functools import lru_cache
 from pathlib import Path
-from typing import Any, Dict, List
+from typing import Any, Dict, List, cast
 
 import loguru
 
 from .config import instance as config
 from .constants import APP_NAME, APP_VERSION
+from .lazy import Lazy
 
-DEFAULT_LOG_DIRPATH = Path(config.log.dir)
 DEFAULT_LOG_FORMAT = "<dim>{time}</dim> <level>{level:8s}</level> {message}"
-DEFAULT_RECORD_HANDLER = dict(
-    sink=DEFAULT_LOG_DIRPATH.joinpath(f"{APP_NAME!s}.log").as_posix(),
-    level=config.log.level,
-    format=DEFAULT_LOG_FORMAT,
-    rotation=config.log.rotation,
-    retention=config.log.retention,
-    compression=config.log.compression,
-    serialize=config.log.serialize,
-)
 DEFAULT_STDOUT_HANDLER = dict(
     sink=sys.stdout,
     level="CRITICAL",
@@ -64,6 +56,36 @@ DEFAULT_STDOUT_HANDLER = dict(
 )
 
 
+def get_log_dirpath() -> Path:
+    """Get the directory logs are recorded to.
+
+    Returns:
+        ~pathlib.Path:
+            The configured log directory.
+    """
+
+    return Path(config.log.dir)
+
+
+def get_record_handler() -> Dict[str, Any]:
+    """Get the handler recording logs to the log directory.
+
+    Returns:
+        Dict[str, Any]:
+            The configured record handler.
+    """
+
+    return dict(
+        sink=get_log_dirpath().joinpath(f"{APP_NAME!s}.log").as_posix(),
+        level=config.log.level,
+        format=DEFAULT_LOG_FORMAT,
+        rotation=config.log.rotation,
+        retention=config.log.retention,
+        compression=config.log.compression,
+        serialize=config.log.serialize,
+    )
+
+
 def configure_logger(
     logger: loguru.Logger,
     level: str = "CRITICAL",
@@ -98,7 +120,7 @@ def configure_logger(
     ]
 
     if record:
-        handlers.append(DEFAULT_RECORD_HANDLER)
+        handlers.append(get_record_handler())
 
     logger.configure(handlers=handlers)
     return logger.bind(version=APP_VERSION)
@@ -121,4 +143,5 @@ def get_logger(debug=False) -> loguru.Logger:
     return configure_logger(loguru.logger, debug=debug)
 
 
-instance: loguru.Logger = get_logger()
+# configured on first use so importing modules doesn't configure logging handlers
+instance = cast("loguru.Logger", Lazy(get_logger))
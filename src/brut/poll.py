@@ -0,0 +1,145 @@
+# -*- encoding: utf-8 -*-
+# Copyright (c) 2021 Stephen Bunn <stephen@bunn.io>
+# ISC License <https://choosealicense.com/licenses/isc>
+
+"""Contains the asyncio executor polling many watches concurrently.
+
+Rather than blocking a worker thread for the network round trips of every watch,
+many watches are polled through :meth:`~brut.watchers.base.BaseWatcher.aiter_content`
+on a single event loop.
+A semaphore bounds how many watches are polled at once, so polling hundreds of
+sources never opens hundreds of connections or threads.
+
+None of the builtin watchers poll with an async client yet, as their API clients
+(``requests`` and ``praw``) are synchronous.
+Each of their polls still occupies a thread of the loop's executor, which is sized
+to the concurrency, so the event loop only bounds and gathers those threads until a
+watcher overrides :meth:`~brut.watchers.base.BaseWatcher.aiter_content` natively.
+"""
+
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Iterable, List, NamedTuple, Optional, Sequence
+
+from .db import Content
+from .log import instance as log
+from .watchers import get_watcher
+
+
+class WatchPoll(NamedTuple):
+    """Describes the result of polling a single watch."""
+
+    type: str
+    args: List[Any]
+    kwargs: Dict[str, Any]
+    contents: List[Content]
+    cursor: Optional[str]
+    save_state: Optional[Callable[[], None]]
+    error: Optional[BaseException]
+
+
+async def poll_watch(
+    semaphore: asyncio.Semaphore,
+    watcher_type: str,
+    args: List[Any],
+    kwargs: Dict[str, Any],
+) -> WatchPoll:
+    """Poll a single watch once a slot of the semaphore is available.
+
+    Args:
+        semaphore (~asyncio.Semaphore):
+            The semaphore bounding the number of concurrently polled watches.
+        watcher_type (str):
+            The type of watcher to use for the watch.
+        args (List[Any]):
+            The arguments of the watch.
+        kwargs (Dict[str, Any]):
+            The keyword arguments of the watch.
+
+    Returns:
+        WatchPoll:
+            The polled content of the watch, or the error the watch failed with.
+    """
+
+    watcher = get_watcher(watcher_type)
+    if watcher is None:
+        return WatchPoll(
+            watcher_type,
+            args,
+            kwargs,
+            [],
+            None,
+            None,
+            ValueError(f"No watcher is available for {watcher_type!r}"),
+        )
+
+    instance = watcher()
+    contents: List[Content] = []
+    async with semaphore:
+        try:
+            async for content in instance.aiter_content(*args, **kwargs):
+                contents.append(content)
+        except Exception as exc:
+            log.exception(f"Failed to poll {watcher_type!r} watch {args!r}, {exc}")
+            return WatchPoll(watcher_type, args, kwargs, contents, None, None, exc)
+
+    return WatchPoll(
+        watcher_type,
+        args,
+        kwargs,
+        contents,
+        instance.cursor,
+        instance.save_state,
+        None,
+    )
+
+
+async def poll_watches(
+    watches: Iterable[Sequence[Any]], concurrency: int
+) -> List[WatchPoll]:
+    """Poll many watches concurrently.
+
+    Args:
+        watches (Iterable[Sequence[Any]]):
+            The watcher type, arguments, and keyword arguments of each watch.
+        concurrency (int):
+            The maximum number of watches polled at once.
+
+    Returns:
+        List[WatchPoll]:
+            The result of each watch in the order the watches were given.
+    """
+
+    semaphore = asyncio.Semaphore(max(concurrency, 1))
+    return await asyncio.gather(
+        *(
+            poll_watch(semaphore, watcher_type, list(args or []), dict(kwargs or {}))
+            for watcher_type, args, kwargs in watches
+        )
+    )
+
+
+def poll_many(watches: Iterable[Sequence[Any]], concurrency: int) -> List[WatchPoll]:
+    """Poll many watches concurrently on a new event loop.
+
+    The event loop gets a thread pool as large as the concurrency, so watchers that
+    are run in threads are polled just as concurrently as async watchers.
+
+    Args:
+        watches (Iterable[Sequence[Any]]):
+            The watcher type, arguments, and keyword arguments of each watch.
+        concurrency (int):
+            The maximum number of watches polled at once.
+
+    Returns:
+        List[WatchPoll]:
+            The result of each watch in the order the watches were given.
+    """
+
+    async def run() -> List[WatchPoll]:
+        asyncio.get_running_loop().set_default_executor(
+            ThreadPoolExecutor(max(concurrency, 1), thread_name_prefix="brut-poll")
+        )
+        return await poll_watches(watches, concurrency)
+
+    return asyncio.run(run())
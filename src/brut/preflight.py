@@ -0,0 +1,228 @@
+# -*- encoding: utf-8 -*-
+# Copyright (c) 2021 Stephen Bunn <stephen@bunn.io>
+# ISC License <https://choosealicense.com/licenses/isc>
+
+"""Contains the preflight probe used to skip downloads of already archived content.
+
+Before content is downloaded, cheap remote identifiers are collected for it.
+The checksums reported by the plugin are used as is, and a ``HEAD`` request is made
+for each of the content's resources to collect their ``Content-Length`` and strong
+``ETag``.
+Once content is stored, its identifiers are recorded against the resulting artifact
+so later fetches with a matching identifier are resolved without transferring the
+body.
+
+``ETag`` values are only meaningful to the server that issued them, so they are
+combined with the host and size of each resource before being recorded.
+Weak ``ETag`` values are ignored as they don't guarantee byte-identical content.
+
+Attributes:
+    DEFAULT_TIMEOUT (int):
+        The default timeout in seconds for ``HEAD`` requests of the probe.
+"""
+
+from dataclasses import dataclass, field
+from datetime import datetime
+from hashlib import sha256
+from pathlib import Path
+from typing import List, Optional, Tuple
+from urllib.parse import urlparse
+
+import requests
+from megu.models import Content as MeguContent
+from megu.models import HttpResource
+from sqlalchemy import and_, or_
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from .db import Artifact, ArtifactIdentifier
+from .log import instance as log
+from .store import Store
+
+DEFAULT_TIMEOUT = 10
+
+IDENTIFIER_CHECKSUM = "checksum"
+IDENTIFIER_ETAG = "etag"
+
+Identifier_T = Tuple[str, str]
+
+
+@dataclass
+class Probe:
+    """Describes the remote identifiers collected for some content."""
+
+    size: Optional[int] = None
+    identifiers: List[Identifier_T] = field(default_factory=list)
+
+
+def get_etag_identifier(
+    resources: List[Tuple[str, str, int]],
+) -> Optional[Identifier_T]:
+    """Get the identifier for the ``ETag`` values of some content's resources.
+
+    Args:
+        resources (List[Tuple[str, str, int]]):
+            The host, ``ETag``, and size of each resource of the content.
+
+    Returns:
+        Optional[Identifier_T]:
+            The identifier of the content's resources, if they have any.
+    """
+
+    if len(resources) == 0:
+        return None
+
+    value = "\n".join(f"{host} {etag} {size}" for host, etag, size in resources)
+    return IDENTIFIER_ETAG, sha256(value.encode("utf-8")).hexdigest()
+
+
+def probe_content(
+    content: MeguContent, remote: bool = True, timeout: int = DEFAULT_TIMEOUT
+) -> Probe:
+    """Collect cheap remote identifiers for some content.
+
+    Args:
+        content (~megu.models.Content):
+            The content to probe.
+        remote (bool, optional):
+            If False, only the checksums and size reported by the plugin are used.
+            Defaults to True.
+        timeout (int, optional):
+            The timeout in seconds for ``HEAD`` requests.
+            Defaults to :attr:`~DEFAULT_TIMEOUT`.
+
+    Returns:
+        Probe:
+            The identifiers and expected size of the content.
+    """
+
+    probe = Probe(
+        size=content.size if content.size and content.size > 0 else None,
+        identifiers=[
+            (f"{IDENTIFIER_CHECKSUM}:{checksum.type}", checksum.hash)
+            for checksum in content.checksums
+        ],
+    )
+    if not remote or not all(
+        isinstance(resource, HttpResource) for resource in content.resources
+    ):
+        return probe
+
+    resources: List[Tuple[str, str, int]] = []
+    size = 0
+    with requests.Session() as session:
+        for resource in content.resources:
+            try:
+                response = session.head(
+                    resource.url,
+                    headers=resource.headers,
+                    allow_redirects=True,
+                    timeout=timeout,
+                )
+            except requests.RequestException as exc:
+                log.debug(f"Failed to probe {resource.url}, {exc}")
+                return probe
+
+            content_length = response.headers.get("Content-Length", "")
+            if not response.ok or not content_length.isdigit():
+                return probe
+
+            size += int(content_length)
+            etag = response.headers.get("ETag")
+            if etag is not None and not etag.startswith("W/"):
+                resources.append(
+                    (urlparse(response.url).netloc, etag, int(content_length))
+                )
+
+    probe.size = probe.size or size
+    if len(resources) == len(content.resources):
+        etag_identifier = get_etag_identifier(resources)
+        if etag_identifier is not None:
+            probe.identifiers.append(etag_identifier)
+
+    return probe
+
+
+def find_archived(
+    session: Session, identifiers: List[Identifier_T], store: Store
+) -> Optional[Artifact]:
+    """Find an archived artifact matching any of some content's identifiers.
+
+    Args:
+        session (~sqlalchemy.orm.Session):
+            The session to query the artifact catalog with.
+        identifiers (List[Identifier_T]):
+            The identifiers of the content.
+        store (~brut.store.Store):
+            The store artifacts are persisted to.
+
+    Returns:
+        Optional[~brut.db.Artifact]:
+            The matching artifact, if its file still exists in the store.
+    """
+
+    if len(identifiers) == 0:
+        return None
+
+    for db_artifact in (
+        session.query(Artifact)
+        .join(ArtifactIdentifier, ArtifactIdentifier.artifact_id == Artifact.id)
+        .filter(
+            or_(
+                *[
+                    and_(
+                        ArtifactIdentifier.kind == kind,
+                        ArtifactIdentifier.value == value,
+                    )
+                    for kind, value in identifiers
+                ]
+            )
+        )
+    ):
+        # linked near-duplicates are archived through their parent
+        if db_artifact.parent_id is not None:
+            return db_artifact
+
+        if db_artifact.path is not None and store.locate(
+            db_artifact.fingerprint, Path(db_artifact.path).name
+        ):
+            return db_artifact
+
+    return None
+
+
+def record_identifiers(
+    session: Session, artifact_id: int, identifiers: List[Identifier_T]
+):
+    """Record the identifiers of some content against the artifact it was stored as.
+
+    Args:
+        session (~sqlalchemy.orm.Session):
+            The session to record the identifiers with.
+        artifact_id (int):
+            The database ID of the artifact.
+        identifiers (List[Identifier_T]):
+            The identifiers of the content.
+    """
+
+    for kind, value in identifiers:
+        if session.query(
+            session.query(ArtifactIdentifier)
+            .filter(ArtifactIdentifier.kind == kind, ArtifactIdentifier.value == value)
+            .exists()
+        ).scalar():
+            continue
+
+        try:
+            # another worker may record the same identifier concurrently
+            with session.begin_nested():
+                session.add(
+                    ArtifactIdentifier(
+                        created_at=datetime.now(),
+                        artifact_id=artifact_id,
+                        kind=kind,
+                        value=value,
+                    )
+                )
+        except IntegrityError:
+            log.debug(f"Identifier {kind} {value} was already recorded")
@@ -0,0 +1,175 @@
+# -*- encoding: utf-8 -*-
+# Copyright (c) 2021 Stephen Bunn <stephen@bunn.io>
+# ISC License <https://choosealicense.com/licenses/isc>
+
+"""Contains the API quota tracker shared between workers and the scheduler.
+
+Reddit reports the state of the client's rate-limit window in the
+``x-ratelimit-remaining``, ``x-ratelimit-used``, and ``x-ratelimit-reset`` headers of
+every API response.
+Workers record these figures in Redis after each request so the scheduler can pace
+watch polls to fit within the remaining quota of the current window.
+
+Attributes:
+    QUOTA_KEY (str):
+        The Redis hash of the last recorded Reddit quota.
+"""
+
+import time
+from functools import lru_cache
+from typing import Mapping, NamedTuple, Optional
+
+from redis import Redis
+
+from .log import instance as log
+from .state import build_key, get_redis
+
+QUOTA_KEY = build_key("quota", "reddit")
+
+HEADER_REMAINING = "x-ratelimit-remaining"
+HEADER_USED = "x-ratelimit-used"
+HEADER_RESET = "x-ratelimit-reset"
+
+
+class Quota(NamedTuple):
+    """Describes the state of a rate-limit window."""
+
+    remaining: float
+    used: int
+    reset_at: float
+
+
+def parse_quota(headers: Mapping[str, str], now: float) -> Optional[Quota]:
+    """Parse the quota reported by the rate-limit headers of a response.
+
+    Args:
+        headers (Mapping[str, str]):
+            The headers of the response.
+        now (float):
+            The timestamp the response was received at.
+
+    Returns:
+        Optional[Quota]:
+            The reported quota, or None if the headers are missing or invalid.
+    """
+
+    try:
+        return Quota(
+            remaining=float(headers[HEADER_REMAINING]),
+            used=int(float(headers.get(HEADER_USED, 0))),
+            reset_at=now + float(headers[HEADER_RESET]),
+        )
+    except (KeyError, ValueError):
+        return None
+
+
+class QuotaTracker:
+    """Tracks the quota of a rate-limited API in Redis."""
+
+    def __init__(self, redis: Redis, key: str):
+        """Initialize the tracker.
+
+        Args:
+            redis (~redis.Redis):
+                The Redis client to keep the quota in.
+            key (str):
+                The Redis key to keep the quota at.
+        """
+
+        self.redis = redis
+        self.key = key
+
+    def update(self, headers: Mapping[str, str]) -> Optional[Quota]:
+        """Record the quota reported by the headers of a response.
+
+        Args:
+            headers (Mapping[str, str]):
+                The headers of the response.
+
+        Returns:
+            Optional[Quota]:
+                The recorded quota, or None if the headers don't report any.
+        """
+
+        now = time.time()
+        quota = parse_quota(headers, now)
+        if quota is None:
+            return None
+
+        pipeline = self.redis.pipeline()
+        pipeline.hset(self.key, mapping=quota._asdict())
+        pipeline.expireat(self.key, int(quota.reset_at) + 1)
+        pipeline.execute()
+        return quota
+
+    def get(self) -> Optional[Quota]:
+        """Get the quota of the current rate-limit window.
+
+        Returns:
+            Optional[Quota]:
+                The quota of the current window, or None if it is unknown or the
+                window has already reset.
+        """
+
+        values = self.redis.hmget(self.key, Quota._fields)
+        if any(value is None for value in values):
+            return None
+
+        remaining, used, reset_at = values
+        quota = Quota(float(remaining), int(float(used)), float(reset_at))
+        if quota.reset_at <= time.time():
+            return None
+
+        return quota
+
+    def get_rate(self, reserve: int = 0) -> Optional[float]:
+        """Get the rate of requests that fits within the current window.
+
+        Args:
+            reserve (int, optional):
+                The number of requests to keep in reserve.
+                Defaults to 0.
+
+        Returns:
+            Optional[float]:
+                The number of requests per second that can be made until the window
+                resets, or None if the quota is unknown.
+        """
+
+        quota = self.get()
+        if quota is None:
+            return None
+
+        return max(quota.remaining - reserve, 0) / max(quota.reset_at - time.time(), 1)
+
+
+@lru_cache
+def get_quota_tracker() -> QuotaTracker:
+    """Get the tracker of the Reddit API quota.
+
+    Returns:
+        QuotaTracker:
+            The tracker of the Reddit API quota.
+    """
+
+    return QuotaTracker(get_redis(), QUOTA_KEY)
+
+
+def record_response(response, *args, **kwargs):
+    """Record the quota reported by a response to a Reddit API request.
+
+    Meant to be used as a ``response`` hook of a :class:`~requests.Session`.
+
+    Args:
+        response (~requests.Response):
+            The response to record the quota of.
+    """
+
+    try:
+        quota = get_quota_tracker().update(response.headers)
+    except Exception as exc:
+        log.warning(f"Failed to record quota of {response.url}, {exc}")
+        return
+
+    if quota is not None:
+        log.debug(f"Recorded quota {quota} from {response.url}")
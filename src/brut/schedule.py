@@ -2,20 +2,99 @@
 # Copyright (c) 2021 Stephen Bunn <stephen@bunn.io>
 # ISC License <https://choosealicense.com/licenses/isc>
 
-"""Contains functions for building the appropriate tasks scheduler."""
+"""Contains functions for building the appropriate tasks scheduler.
 
+Jobs are persisted in Redis so restarts and failovers resume the schedule rather
+than rebuilding it.
+Since persisted jobs are pickled, job functions are module-level functions taking
+only the name of their watch or task, and look up everything else from the
+:attr:`~context` of the running scheduler.
+
+Attributes:
+    LEADER_KEY (str):
+        The Redis key of the lock electing the leading scheduler.
+    LAST_SUCCESS_KEY (str):
+        The Redis hash of the last successful run time of each job.
+"""
+
+import json
+import math
+import time
+from collections import Counter
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
 from functools import partial
-from typing import Optional, Union
+from hashlib import sha1
+from pathlib import Path
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Tuple, Union
 
+import dramatiq
 import file_config
-from apscheduler.events import EVENT_JOB_ERROR, EVENT_JOB_EXECUTED, SchedulerEvent
-from apscheduler.schedulers.blocking import BlockingScheduler
+from apscheduler.events import EVENT_JOB_ERROR, EVENT_JOB_EXECUTED, JobExecutionEvent
+from apscheduler.jobstores.memory import MemoryJobStore
+from apscheduler.jobstores.redis import RedisJobStore
+from apscheduler.schedulers.background import BackgroundScheduler
+from apscheduler.schedulers.base import STATE_STOPPED, BaseScheduler
+from apscheduler.triggers.base import BaseTrigger
 from apscheduler.triggers.cron import CronTrigger
 from apscheduler.triggers.interval import IntervalTrigger
 
-from .config import BrutConfig, ScheduleConfig
+from .adaptive import get_adapted_interval, get_velocity, get_watch_key
+from .config import (
+    AdaptiveConfig,
+    BrutConfig,
+    ScheduleConfig,
+    SchedulerConfig,
+    WatchConfig,
+    get_config,
+)
+from .dispatch import DISPATCH_INTERVAL, WatchDispatcher, pop_follow_ups
+from .leader import LeaderLock, get_failover_time, get_renew_interval
 from .log import instance as log
-from .tasks import enqueue, watch
+from .quota import get_quota_tracker
+from .state import build_key, get_redis
+from .tasks import collect, enqueue, tier, watch, watch_many
+from .watchers import get_watcher
+
+LEADER_KEY = build_key("scheduler", "leader")
+JOBS_KEY = build_key("scheduler", "jobs")
+RUN_TIMES_KEY = build_key("scheduler", "run-times")
+SPECS_KEY = build_key("scheduler", "specs")
+LAST_SUCCESS_KEY = build_key("scheduler", "last-success")
+
+PERSISTENT_JOBSTORE = "default"
+MEMORY_JOBSTORE = "memory"
+
+TASKS: Dict[str, dramatiq.Actor] = {
+    "enqueue": enqueue,
+    "tier": tier,
+    "collect": collect,
+}
+
+
+class JobSpec(NamedTuple):
+    """Describes a job that should be scheduled."""
+
+    id: str
+    func: Callable[[str], Any]
+    name: str
+    trigger: BaseTrigger
+    digest: str
+    immediate: bool
+
+
+@dataclass
+class ScheduleContext:
+    """Describes the state shared by the jobs of the running scheduler."""
+
+    scheduler: Optional[BaseScheduler] = None
+    dispatcher: Optional[WatchDispatcher] = None
+    lock: Optional[LeaderLock] = None
+    watches: Dict[str, WatchConfig] = field(default_factory=dict)
+    adapted: Dict[str, int] = field(default_factory=dict)
+
+
+context = ScheduleContext()
 
 
 def get_trigger(
@@ -39,15 +118,585 @@ def get_trigger(
         return CronTrigger.from_crontab(schedule_config.crontab)
     elif schedule_config.interval is not None:
         return IntervalTrigger(**file_config.to_dict(schedule_config.interval))
+    elif schedule_config.adaptive is not None:
+        return IntervalTrigger(seconds=schedule_config.adaptive.min_interval)
 
     return None
 
 
-def schedule_listener(event: SchedulerEvent):
+def get_phase(job_id: str, period: int) -> int:
+    """Get the deterministic phase offset of a job within a period.
+
+    Args:
+        job_id (str):
+            The ID of the job.
+        period (int):
+            The period in seconds to get the offset within.
+
+    Returns:
+        int:
+            The offset in seconds of the job within the period.
+    """
+
+    return int(sha1(job_id.encode("utf-8")).hexdigest()[:8], 16) % max(period, 1)
+
+
+def spread_trigger(trigger: Optional[BaseTrigger], job_id: str, jitter: int):
+    """Spread the runs of a job by a deterministic phase offset and random jitter.
+
+    Interval triggers are offset within their interval and cron triggers are offset
+    within their minute, so jobs sharing the same schedule don't fire at once.
+    The jitter of interval triggers never exceeds a tenth of their interval.
+
+    Args:
+        trigger (Optional[~apscheduler.triggers.base.BaseTrigger]):
+            The trigger of the job.
+        job_id (str):
+            The ID of the job.
+        jitter (int):
+            The maximum random delay in seconds added to each run.
+
+    Returns:
+        Optional[~apscheduler.triggers.base.BaseTrigger]:
+            The spread trigger, or the given trigger if it can't be spread.
+    """
+
+    if isinstance(trigger, IntervalTrigger):
+        period = int(trigger.interval.total_seconds())
+        start_at = time.time() // max(period, 1) * period + get_phase(job_id, period)
+        return IntervalTrigger(
+            seconds=period,
+            start_date=datetime.fromtimestamp(start_at, trigger.timezone),
+            timezone=trigger.timezone,
+            jitter=min(jitter, period // 10) or None,
+        )
+    elif isinstance(trigger, CronTrigger):
+        fields = {
+            field.name: str(field) for field in trigger.fields if field.name != "second"
+        }
+        return CronTrigger(
+            **fields,
+            second=get_phase(job_id, 60),
+            timezone=trigger.timezone,
+            jitter=jitter or None,
+        )
+
+    return trigger
+
+
+def adapt_job(
+    scheduler: BaseScheduler,
+    job_id: str,
+    watch_key: str,
+    adaptive_config: AdaptiveConfig,
+):
+    """Reschedule an adaptive watch job based on its observed content velocity.
+
+    A job is adapted at most once for each recorded poll of its watch.
+
+    Args:
+        scheduler (~apscheduler.schedulers.base.BaseScheduler):
+            The scheduler running the job.
+        job_id (str):
+            The ID of the job.
+        watch_key (str):
+            The key of the watch polled by the job.
+        adaptive_config (~brut.config.AdaptiveConfig):
+            The adaptive schedule of the watch.
+    """
+
+    job = scheduler.get_job(job_id)
+    velocity = get_velocity(watch_key)
+    if (
+        job is None
+        or velocity is None
+        or velocity.rate is None
+        or not isinstance(job.trigger, IntervalTrigger)
+    ):
+        return
+
+    # adapting again before the next poll is recorded would compound the same sample
+    if context.adapted.get(job_id) == velocity.samples:
+        return
+
+    context.adapted[job_id] = velocity.samples
+    interval = job.trigger.interval.total_seconds()
+    adapted = get_adapted_interval(interval, velocity.rate, adaptive_config)
+    if abs(adapted - interval) < 1:
+        return
+
+    log.info(
+        f"Rescheduling watch job {job_id!r} from every {interval:.0f}s to every "
+        f"{adapted:.0f}s for {velocity.rate * 3600:.1f} new entries per hour"
+    )
+    # keep the phase the job was spread to so rescheduled watches don't bunch up
+    job.reschedule(
+        IntervalTrigger(
+            seconds=adapted,
+            start_date=job.trigger.start_date,
+            timezone=job.trigger.timezone,
+            jitter=min(job.trigger.jitter or 0, int(adapted) // 10) or None,
+        )
+    )
+
+
+def get_bucket(subreddit: str, bucket_count: int) -> int:
+    """Get the bucket a subreddit is grouped into, by a stable hash of its name.
+
+    Args:
+        subreddit (str):
+            The name of the subreddit.
+        bucket_count (int):
+            The number of buckets, a power of two.
+
+    Returns:
+        int:
+            The index of the subreddit's bucket.
+    """
+
+    return int(sha1(subreddit.lower().encode("utf-8")).hexdigest(), 16) % bucket_count
+
+
+def group_watches(
+    watch_configs: List[WatchConfig], group_size: int
+) -> List[WatchConfig]:
+    """Group compatible subreddit watches into combined multireddit watches.
+
+    Subreddit watches with a single subreddit, no keyword arguments, and an identical
+    schedule are merged into multireddit watches of up to ``group_size``
+    subreddits each.
+    Subreddits are bucketed by a hash of their name into the fewest power of two
+    buckets that fit within the group size, and each bucket is named after its
+    schedule and index, so adding or removing a subreddit only changes the members
+    of its own bucket rather than shifting every later group.
+    All other watches are returned as is.
+
+    Args:
+        watch_configs (List[~brut.config.WatchConfig]):
+            The configured watches.
+        group_size (int):
+            The maximum number of subreddits polled by a single watch.
+
+    Returns:
+        List[~brut.config.WatchConfig]:
+            The watches to schedule.
+    """
+
+    watches: List[WatchConfig] = []
+    groups: Dict[str, Dict[str, WatchConfig]] = {}
+    for watch_config in watch_configs:
+        if (
+            watch_config.type.lower() != "subreddit"
+            or len(watch_config.args or []) != 1
+            or watch_config.kwargs
+        ):
+            watches.append(watch_config)
+            continue
+
+        group = groups.setdefault(get_schedule_key(watch_config.schedule), {})
+        subreddit = watch_config.args[0].lower()
+        if subreddit in group:
+            log.warning(
+                f"Skipping watch {watch_config.name!r} as {subreddit!r} is already "
+                f"watched by {group[subreddit].name!r} on the same schedule"
+            )
+            continue
+
+        group[subreddit] = watch_config
+
+    group_size = max(group_size, 1)
+    for schedule_key, group in groups.items():
+        # splitting buckets in two only moves subreddits into the new half
+        bucket_count = 1
+        while (
+            max(Counter(get_bucket(name, bucket_count) for name in group).values())
+            > group_size
+        ):
+            bucket_count *= 2
+
+        buckets: Dict[int, List[WatchConfig]] = {}
+        for name in sorted(group.keys()):
+            buckets.setdefault(get_bucket(name, bucket_count), []).append(group[name])
+
+        schedule_digest = sha1(schedule_key.encode("utf-8")).hexdigest()[:8]
+        for bucket, members in sorted(buckets.items()):
+            name = f"Reddit multireddit {schedule_digest}-{bucket}"
+            log.info(
+                f"Grouping watches {[member.name for member in members]!r} "
+                f"into multireddit watch {name!r}"
+            )
+            watches.append(
+                WatchConfig(
+                    name=name,
+                    type="multireddit",
+                    args=[member.args[0] for member in members],
+                    schedule=members[0].schedule,
+                )
+            )
+
+    return watches
+
+
+def get_schedule_key(schedule_config: ScheduleConfig) -> str:
+    """Get a key identifying the schedule of a given ScheduleConfig.
+
+    Args:
+        schedule_config (~brut.config.ScheduleConfig):
+            The schedule to get the key of.
+
+    Returns:
+        str:
+            The key of the schedule.
+    """
+
+    return json.dumps(
+        [
+            schedule_config.crontab,
+            (
+                file_config.to_dict(schedule_config.interval)
+                if schedule_config.interval
+                else None
+            ),
+            (
+                file_config.to_dict(schedule_config.adaptive)
+                if schedule_config.adaptive
+                else None
+            ),
+            schedule_config.immediate,
+        ],
+        sort_keys=True,
+    )
+
+
+def is_leader() -> bool:
+    """Check if this scheduler instance is still allowed to dispatch jobs.
+
+    Returns:
+        bool:
+            True if this instance holds the leader lock, or if no lock is used.
+    """
+
+    return context.lock is None or context.lock.check()
+
+
+def send_message(actor: dramatiq.Actor, *args, **kwargs):
+    """Send a message to an actor if this scheduler instance is still the leader.
+
+    Args:
+        actor (~dramatiq.Actor):
+            The actor to send the message to.
+    """
+
+    if not is_leader():
+        log.warning(
+            f"Skipping {actor.actor_name!r} message as this scheduler is no longer "
+            "the leader"
+        )
+        return
+
+    actor.send(*args, **kwargs)
+
+
+def run_task(name: str):
+    """Job sending a message to one of the maintenance task actors.
+
+    Args:
+        name (str):
+            The name of the task in :attr:`~TASKS`.
+    """
+
+    send_message(TASKS[name])
+
+
+def run_watch(name: str):
+    """Job polling a configured watch.
+
+    Watches of rate-limited watcher types are requested from the dispatcher, all
+    other watches are sent directly.
+    Watches with an adaptive schedule are rescheduled afterwards.
+
+    Args:
+        name (str):
+            The name of the watch.
+    """
+
+    watch_config = context.watches.get(name)
+    if watch_config is None:
+        log.warning(f"Skipping watch {name!r} as it is no longer configured")
+        return
+
+    args = watch_config.args or []
+    kwargs = watch_config.kwargs or {}
+
+    watcher = get_watcher(watch_config.type)
+    if watcher is not None and watcher.rate_limited and context.dispatcher:
+        context.dispatcher.request(name, watch_config.type, args, kwargs)
+    else:
+        send_message(watch, watch_config.type, *args, **kwargs)
+
+    adaptive_config = watch_config.schedule.adaptive
+    if adaptive_config is not None and context.scheduler is not None:
+        adapt_job(
+            context.scheduler,
+            get_watch_job_id(name),
+            get_watch_key(watch_config.type, args, kwargs),
+            adaptive_config,
+        )
+
+
+def dispatch_follow_ups():
+    """Job sending the follow-up page polls queued by watch workers.
+
+    Follow-ups of rate-limited watcher types are requested from the dispatcher, all
+    other follow-ups are sent directly.
+    Follow-ups are only taken from the queue while this instance is the leader, so a
+    standby never drops them.
+    """
+
+    if not is_leader():
+        return
+
+    for watcher_type, args, kwargs in pop_follow_ups(get_redis()):
+        watcher = get_watcher(watcher_type)
+        if watcher is not None and watcher.rate_limited and context.dispatcher:
+            name = (
+                f"follow-up:{get_watch_key(watcher_type, args, kwargs)}:"
+                f"{kwargs.get('after')}"
+            )
+            context.dispatcher.request(name, watcher_type, args, kwargs, follow_up=True)
+        else:
+            send_message(watch, watcher_type, *args, **kwargs)
+
+
+def get_watch_job_id(name: str) -> str:
+    """Get the job ID of a watch.
+
+    Args:
+        name (str):
+            The name of the watch.
+
+    Returns:
+        str:
+            The job ID of the watch.
+    """
+
+    return f"watch:{name}"
+
+
+def build_job_spec(
+    job_id: str,
+    func: Callable[[str], Any],
+    name: str,
+    schedule_config: ScheduleConfig,
+    scheduler_config: SchedulerConfig,
+) -> Optional[JobSpec]:
+    """Build the spec of a scheduled job.
+
+    Args:
+        job_id (str):
+            The ID of the job.
+        func (Callable[[str], Any]):
+            The module-level job function.
+        name (str):
+            The name passed to the job function.
+        schedule_config (~brut.config.ScheduleConfig):
+            The schedule of the job.
+        scheduler_config (~brut.config.SchedulerConfig):
+            The configuration of the scheduler.
+
+    Returns:
+        Optional[JobSpec]:
+            The spec of the job, or None if its trigger can't be determined.
+    """
+
+    trigger = get_trigger(schedule_config)
+    if trigger is None:
+        log.warning(
+            f"Trigger could not be determined for {schedule_config}, "
+            f"skipping adding {job_id!r}"
+        )
+        return None
+
+    digest = sha1(
+        json.dumps([get_schedule_key(schedule_config), scheduler_config.jitter]).encode(
+            "utf-8"
+        )
+    ).hexdigest()
+    return JobSpec(
+        id=job_id,
+        func=func,
+        name=name,
+        trigger=spread_trigger(trigger, job_id, scheduler_config.jitter),
+        digest=digest,
+        immediate=schedule_config.immediate,
+    )
+
+
+def get_watch_configs(brut_config: BrutConfig) -> Dict[str, WatchConfig]:
+    """Get the watches to schedule for the given BrutConfig by their name.
+
+    Args:
+        brut_config (~brut.config.BrutConfig):
+            The current Brut configuration.
+
+    Returns:
+        Dict[str, ~brut.config.WatchConfig]:
+            The watches to schedule.
+    """
+
+    watch_configs = brut_config.watch
+    if brut_config.watchers.reddit.group:
+        watch_configs = group_watches(
+            watch_configs, brut_config.watchers.reddit.group_size
+        )
+
+    return {watch_config.name: watch_config for watch_config in watch_configs}
+
+
+def get_job_specs(brut_config: BrutConfig) -> Dict[str, JobSpec]:
+    """Get the specs of the jobs to schedule for the given BrutConfig.
+
+    Args:
+        brut_config (~brut.config.BrutConfig):
+            The current Brut configuration.
+
+    Returns:
+        Dict[str, JobSpec]:
+            The specs of the jobs to schedule by their ID.
+    """
+
+    scheduler_config = get_scheduler_config(brut_config)
+    specs = [
+        build_job_spec(
+            get_watch_job_id(name),
+            run_watch,
+            name,
+            watch_config.schedule,
+            scheduler_config,
+        )
+        for name, watch_config in get_watch_configs(brut_config).items()
+    ]
+
+    # Add the enqueue job for fetched content
+    specs.append(
+        build_job_spec(
+            "enqueue", run_task, "enqueue", brut_config.enqueue, scheduler_config
+        )
+    )
+
+    # Add the tier job for compressing cold artifacts
+    if brut_config.tiering is not None:
+        specs.append(
+            build_job_spec(
+                "tier",
+                run_task,
+                "tier",
+                brut_config.tiering.schedule,
+                scheduler_config,
+            )
+        )
+
+    # Add the garbage collection job for orphaned store files
+    if brut_config.garbage is not None and brut_config.garbage.schedule is not None:
+        specs.append(
+            build_job_spec(
+                "collect",
+                run_task,
+                "collect",
+                brut_config.garbage.schedule,
+                scheduler_config,
+            )
+        )
+
+    return {spec.id: spec for spec in specs if spec is not None}
+
+
+def sync_jobs(
+    scheduler: BaseScheduler,
+    specs: Dict[str, JobSpec],
+    scheduler_config: SchedulerConfig,
+) -> Tuple[int, int, int]:
+    """Synchronize the persisted jobs of a scheduler with the given job specs.
+
+    Jobs whose spec is unchanged are kept as is so their persisted next run time is
+    resumed.
+    Watches that should be triggered immediately are only triggered when their job is
+    first added, and are ramped up one every ``startup_interval`` seconds rather than
+    being sent all at once.
+
+    Args:
+        scheduler (~apscheduler.schedulers.base.BaseScheduler):
+            The scheduler to synchronize the jobs of.
+        specs (Dict[str, JobSpec]):
+            The specs of the jobs to schedule by their ID.
+        scheduler_config (~brut.config.SchedulerConfig):
+            The configuration of the scheduler.
+
+    Returns:
+        Tuple[int, int, int]:
+            The number of added, removed, and rescheduled jobs.
+    """
+
+    redis = get_redis()
+    digests = {
+        key.decode("utf-8"): value.decode("utf-8")
+        for key, value in redis.hgetall(SPECS_KEY).items()
+    }
+    existing = {job.id for job in scheduler.get_jobs(jobstore=PERSISTENT_JOBSTORE)}
+
+    removed = 0
+    for job_id in existing - specs.keys():
+        log.info(f"Removing job {job_id!r} as it is no longer configured")
+        scheduler.remove_job(job_id, jobstore=PERSISTENT_JOBSTORE)
+        redis.hdel(SPECS_KEY, job_id)
+        removed += 1
+
+    added = rescheduled = immediate = 0
+    startup_at = datetime.now()
+    for spec in specs.values():
+        if spec.id in existing:
+            if digests.get(spec.id) == spec.digest:
+                continue
+
+            log.info(f"Rescheduling job {spec.id!r} using trigger {spec.trigger}")
+            scheduler.reschedule_job(
+                spec.id, jobstore=PERSISTENT_JOBSTORE, trigger=spec.trigger
+            )
+            rescheduled += 1
+        else:
+            log.info(f"Adding job {spec.id!r} using trigger {spec.trigger}")
+            options: Dict[str, Any] = {}
+            if spec.immediate:
+                options["next_run_time"] = startup_at + timedelta(
+                    seconds=immediate * scheduler_config.startup_interval
+                )
+                log.info(f"Immediately triggering {spec.id!r} at {options}")
+                immediate += 1
+
+            scheduler.add_job(
+                spec.func,
+                trigger=spec.trigger,
+                args=[spec.name],
+                id=spec.id,
+                name=spec.name,
+                jobstore=PERSISTENT_JOBSTORE,
+                replace_existing=True,
+                **options,
+            )
+            added += 1
+
+        redis.hset(SPECS_KEY, spec.id, spec.digest)
+
+    return added, removed, rescheduled
+
+
+def schedule_listener(event: JobExecutionEvent):
     """Schedule listener function responsible for reporting scheduler status.
 
+    The last successful run of each persisted job is recorded in Redis.
+
     Args:
-        event (~apscheduler.events.SchedulerEvent):
+        event (~apscheduler.events.JobExecutionEvent):
             The APScheduler event.
     """
 
@@ -59,54 +708,251 @@ def schedule_listener(event: SchedulerEvent):
         )
     else:
         log.debug(f"Scheduler successfully kicked off job {event.job_id!r}")
+        if event.jobstore == PERSISTENT_JOBSTORE:
+            get_redis().hset(
+                LAST_SUCCESS_KEY, event.job_id, event.scheduled_run_time.isoformat()
+            )
 
 
-def get_scheduler(brut_config: BrutConfig) -> BlockingScheduler:
-    """Build the blocking scheduler for the given BrutConfig.
+def get_scheduler_config(brut_config: BrutConfig) -> SchedulerConfig:
+    """Get the scheduler config, falling back to the defaults if not configured.
+
+    Args:
+        brut_config (~brut.config.BrutConfig):
+            The current Brut configuration.
+
+    Returns:
+        ~brut.config.SchedulerConfig:
+            The configured scheduler config.
+    """
+
+    return brut_config.scheduler or SchedulerConfig()
+
+
+def get_scheduler(brut_config: BrutConfig) -> BackgroundScheduler:
+    """Build the background scheduler for the given BrutConfig.
+
+    Jobs are persisted in Redis and only added once the scheduler is leading, see
+    :func:`~run_scheduler`.
 
     Parameters:
         brut_config (~brut.config.BrutConfig):
             The current Brut configuration.
 
     Returns:
-        ~apscheduler.schedulers.blocking.BlockingScheduler:
+        ~apscheduler.schedulers.background.BackgroundScheduler:
             The scheduler to use for running the configured Brut tasks.
     """
 
     log.info(
-        f"Constructing a blocking scheduler based on configuration from {brut_config}"
+        "Constructing a background scheduler based on configuration from "
+        f"{brut_config}"
+    )
+    scheduler_config = get_scheduler_config(brut_config)
+
+    # runs missed while a standby takes over from a lost leader must still start
+    misfire_grace_time = scheduler_config.misfire_grace_time
+    if misfire_grace_time is not None:
+        misfire_grace_time = max(
+            misfire_grace_time, math.ceil(get_failover_time(scheduler_config.lock_ttl))
+        )
+
+    # a slow run never overlaps the next one, and missed runs are merged into one
+    scheduler = BackgroundScheduler(
+        jobstores={
+            PERSISTENT_JOBSTORE: RedisJobStore(
+                jobs_key=JOBS_KEY,
+                run_times_key=RUN_TIMES_KEY,
+                connection_pool=get_redis().connection_pool,
+            ),
+            MEMORY_JOBSTORE: MemoryJobStore(),
+        },
+        job_defaults={
+            "coalesce": True,
+            "max_instances": 1,
+            "misfire_grace_time": misfire_grace_time,
+        },
     )
-    scheduler = BlockingScheduler()
     scheduler.add_listener(schedule_listener, EVENT_JOB_EXECUTED | EVENT_JOB_ERROR)
 
-    # add watch jobs for polling for new content
+    # rate-limited watches are paced by the dispatcher to fit within the API quota
+    dispatcher = WatchDispatcher(
+        partial(send_message, watch),
+        get_quota_tracker(),
+        brut_config.watchers.reddit.reserve,
+        send_many=partial(send_message, watch_many),
+    )
+    scheduler.add_job(
+        dispatch_follow_ups,
+        trigger=IntervalTrigger(seconds=DISPATCH_INTERVAL),
+        id="follow-ups",
+        jobstore=MEMORY_JOBSTORE,
+    )
+    scheduler.add_job(
+        dispatcher.tick,
+        trigger=IntervalTrigger(seconds=DISPATCH_INTERVAL),
+        id="dispatch",
+        jobstore=MEMORY_JOBSTORE,
+    )
+
+    context.scheduler = scheduler
+    context.dispatcher = dispatcher
+    context.watches = get_watch_configs(brut_config)
+    return scheduler
+
+
+def apply_jobs(scheduler: BaseScheduler, brut_config: BrutConfig):
+    """Synchronize the persisted jobs of a scheduler with the given BrutConfig.
+
+    Args:
+        scheduler (~apscheduler.schedulers.base.BaseScheduler):
+            The scheduler to synchronize the jobs of.
+        brut_config (~brut.config.BrutConfig):
+            The current Brut configuration.
+    """
+
+    added, removed, rescheduled = sync_jobs(
+        scheduler, get_job_specs(brut_config), get_scheduler_config(brut_config)
+    )
+    log.info(
+        f"Synchronized jobs, {added} added, {removed} removed, "
+        f"{rescheduled} rescheduled"
+    )
+
+
+def validate_config(brut_config: BrutConfig) -> List[str]:
+    """Validate the watches of a BrutConfig before they are scheduled.
+
+    Args:
+        brut_config (~brut.config.BrutConfig):
+            The Brut configuration to validate.
+
+    Returns:
+        List[str]:
+            The problems found with the configuration.
+    """
+
+    errors: List[str] = []
+    names = set()
     for watch_config in brut_config.watch:
-        trigger = get_trigger(watch_config.schedule)
-        if not trigger:
-            log.warning(
-                f"Trigger could not be determined for {watch_config.schedule}, "
-                f"skipping adding {watch_config.name!r}"
+        if watch_config.name in names:
+            errors.append(f"watch {watch_config.name!r} is configured more than once")
+        names.add(watch_config.name)
+
+        if get_watcher(watch_config.type) is None:
+            errors.append(
+                f"watch {watch_config.name!r} has unknown type {watch_config.type!r}"
             )
 
-        args = watch_config.args or []
-        kwargs = watch_config.kwargs or {}
-        log.info(f"Adding watch job {watch_config.name!r} using trigger {trigger}")
+        try:
+            if get_trigger(watch_config.schedule) is None:
+                errors.append(f"watch {watch_config.name!r} has no schedule")
+        except ValueError as exc:
+            errors.append(f"watch {watch_config.name!r} has invalid schedule, {exc}")
 
-        job = partial(
-            watch.send,
-            watch_config.type,
-            *args,
-            **kwargs,
-        )
+    return errors
 
-        scheduler.add_job(job, trigger=trigger)
-        if watch_config.schedule.immediate:
-            log.info(f"Immediately triggering {watch_config.name}")
-            job()
 
-    # Add the enqueue job for fetched content
-    enqueue_trigger = get_trigger(brut_config.enqueue)
-    log.info(f"Adding fetch enqueue job using trigger {enqueue_trigger}")
-    scheduler.add_job(enqueue.send, trigger=enqueue_trigger)
+def get_mtime(path: Path) -> Optional[float]:
+    """Get the modification time of a file.
 
-    return scheduler
+    Args:
+        path (~pathlib.Path):
+            The path of the file.
+
+    Returns:
+        Optional[float]:
+            The modification time of the file, or None if it doesn't exist.
+    """
+
+    try:
+        return path.stat().st_mtime
+    except FileNotFoundError:
+        return None
+
+
+def reload_config(config_path: Path) -> Optional[BrutConfig]:
+    """Load and validate a changed configuration file.
+
+    Args:
+        config_path (~pathlib.Path):
+            The path of the configuration file.
+
+    Returns:
+        Optional[~brut.config.BrutConfig]:
+            The changed configuration, or None if it is invalid.
+    """
+
+    try:
+        brut_config = get_config(config_path)
+    except Exception as exc:
+        log.error(f"Failed to reload configuration from {config_path}, {exc}")
+        return None
+
+    errors = validate_config(brut_config)
+    for error in errors:
+        log.error(f"Invalid configuration in {config_path}, {error}")
+
+    return brut_config if len(errors) == 0 else None
+
+
+def run_scheduler(brut_config: BrutConfig, config_path: Optional[Path] = None):
+    """Run the scheduler for the given BrutConfig while it holds the leader lock.
+
+    Instances that don't hold the lock stand by without dispatching, and take over
+    with the persisted schedule once the leading instance stops renewing it.
+
+    If a config path is given, it is polled for changes.
+    A changed configuration is validated and, if it is valid, only the jobs of added,
+    removed, or rescheduled watches are changed in the running scheduler.
+    Otherwise the current configuration is kept.
+
+    Args:
+        brut_config (~brut.config.BrutConfig):
+            The current Brut configuration.
+        config_path (Optional[~pathlib.Path], optional):
+            The path of the configuration file to reload changes from.
+            Defaults to None.
+    """
+
+    scheduler_config = get_scheduler_config(brut_config)
+    scheduler = get_scheduler(brut_config)
+    lock = LeaderLock(get_redis(), LEADER_KEY, scheduler_config.lock_ttl)
+    context.lock = lock
+    mtime = get_mtime(config_path) if config_path else None
+
+    leading = False
+    try:
+        while True:
+            if config_path is not None and get_mtime(config_path) != mtime:
+                mtime = get_mtime(config_path)
+                reloaded = reload_config(config_path)
+                if reloaded is not None:
+                    log.info(f"Reloaded configuration from {config_path}")
+                    brut_config = reloaded
+                    context.watches = get_watch_configs(brut_config)
+                    if leading:
+                        apply_jobs(scheduler, brut_config)
+
+            if lock.acquire():
+                if not leading:
+                    log.info("Leading the task scheduler, resuming persisted jobs")
+                    if scheduler.state == STATE_STOPPED:
+                        scheduler.start(paused=True)
+
+                    apply_jobs(scheduler, brut_config)
+                    scheduler.resume()
+                    leading = True
+            elif leading:
+                log.warning("Lost the leader lock, pausing the task scheduler")
+                scheduler.pause()
+                leading = False
+            else:
+                log.debug("Standing by for the leader lock")
+
+            time.sleep(get_renew_interval(scheduler_config.lock_ttl))
+    finally:
+        if scheduler.state != STATE_STOPPED:
+            scheduler.shutdown()
+
+        lock.release()
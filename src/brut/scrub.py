@@ -0,0 +1,336 @@
+# -*- encoding: utf-8 -*-
+# Copyright (c) 2021 Stephen Bunn <stephen@bunn.io>
+# ISC License <https://choosealicense.com/licenses/isc>
+
+"""Contains the store scrub which verifies artifacts against the artifact catalog.
+
+Artifacts are streamed from the database in order of their id and rehashed across a
+pool of processes.
+Each process throttles the bytes it reads so a scrub can run alongside the workers
+without saturating the store's disks.
+Progress is checkpointed after every batch of artifacts, so a scrub of a very large
+store can be run incrementally over several nights, continuing where the last run
+stopped.
+
+The scrub reports artifacts whose file is ``missing``, whose content no longer matches
+the fingerprint (``corrupt``), and, once a full pass over the catalog has completed,
+files in the store which have no artifact (``orphaned``).
+Findings are appended as JSON lines to a report file next to the checkpoint.
+The access and modification times of each verified file are restored after it is
+read, so a scrub doesn't make every artifact look recently used to tiering.
+
+Attributes:
+    SCRUB_DIRNAME (str):
+        The name of the directory in the primary store volume used for scrub state.
+    DEFAULT_BATCH_SIZE (int):
+        The default amount of artifacts verified between checkpoints.
+"""
+
+import json
+import os
+import time
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from dataclasses import asdict, dataclass, field
+from datetime import datetime
+from pathlib import Path
+from typing import Deque, Dict, Generator, Optional, Tuple
+
+from .db import Artifact, db_session
+from .garbage import index_store, iter_catalog_paths, iter_orphans
+from .hasher import DEFAULT_CHUNK_SIZE, HashType
+from .log import instance as log
+from .store import Store, get_store
+
+SCRUB_DIRNAME = ".scrub"
+CHECKPOINT_FILENAME = "checkpoint.json"
+REPORT_FILENAME = "report.jsonl"
+DEFAULT_BATCH_SIZE = 1000
+
+STATUS_OK = "ok"
+STATUS_MISSING = "missing"
+STATUS_CORRUPT = "corrupt"
+STATUS_ORPHANED = "orphaned"
+STATUS_UNKNOWN = "unknown"
+
+
+@dataclass
+class ScrubCheckpoint:
+    """Describes the progress of an incremental scrub."""
+
+    last_id: int = 0
+    passes: int = 0
+    started_at: Optional[str] = None
+    counts: Dict[str, int] = field(default_factory=dict)
+    last_counts: Dict[str, int] = field(default_factory=dict)
+
+    @classmethod
+    def load(cls, checkpoint_path: Path) -> "ScrubCheckpoint":
+        """Load a checkpoint from the given path.
+
+        Args:
+            checkpoint_path (~pathlib.Path):
+                The path to the checkpoint.
+
+        Returns:
+            ScrubCheckpoint:
+                The loaded checkpoint, or a fresh checkpoint if none exists.
+        """
+
+        if not checkpoint_path.is_file():
+            return cls()
+
+        return cls(**json.loads(checkpoint_path.read_text()))
+
+    def save(self, checkpoint_path: Path):
+        """Atomically save the checkpoint to the given path.
+
+        Args:
+            checkpoint_path (~pathlib.Path):
+                The path to the checkpoint.
+        """
+
+        temp_path = checkpoint_path.with_name(f"{checkpoint_path.name}.tmp")
+        temp_path.write_text(json.dumps(asdict(self)))
+        temp_path.replace(checkpoint_path)
+
+
+class Throttle:
+    """Limits the rate of bytes read by the current process."""
+
+    def __init__(self, rate: Optional[int]):
+        """Initialize the throttle.
+
+        Args:
+            rate (Optional[int]):
+                The maximum bytes per second, or None for no limit.
+        """
+
+        self.rate = rate
+        self.started_at = time.monotonic()
+        self.consumed = 0
+
+    def consume(self, size: int):
+        """Consume some amount of bytes, sleeping if the rate has been exceeded.
+
+        Args:
+            size (int):
+                The amount of bytes consumed.
+        """
+
+        if not self.rate:
+            return
+
+        self.consumed += size
+        expected_elapsed = self.consumed / self.rate
+        elapsed = time.monotonic() - self.started_at
+        if expected_elapsed > elapsed:
+            time.sleep(expected_elapsed - elapsed)
+
+
+# per-process throttle, shared by all artifacts a pool process verifies
+_throttle: Optional[Throttle] = None
+
+
+def _init_process(rate: Optional[int]):
+    global _throttle
+    _throttle = Throttle(rate)
+
+
+def verify_artifact(
+    store: Store,
+    artifact_id: int,
+    fingerprint: str,
+    relative_path: Optional[str],
+) -> Tuple[int, str, Optional[str]]:
+    """Rehash an artifact's file and compare it to the artifact's fingerprint.
+
+    Args:
+        store (~brut.store.Store):
+            The store the artifact is persisted to.
+        artifact_id (int):
+            The database ID of the artifact.
+        fingerprint (str):
+            The fingerprint of the artifact.
+        relative_path (Optional[str]):
+            The path of the artifact relative to a store volume, if known.
+
+    Returns:
+        Tuple[int, str, Optional[str]]:
+            The artifact ID, the verification status, and the located path.
+    """
+
+    if relative_path is None:
+        return artifact_id, STATUS_UNKNOWN, None
+
+    path = store.locate(fingerprint, Path(relative_path).name)
+    if path is None:
+        return artifact_id, STATUS_MISSING, None
+
+    hasher = HashType.XXHASH.hasher()
+    try:
+        stat = path.stat()
+        try:
+            with store.open_path(path) as artifact_io:
+                chunk = artifact_io.read(DEFAULT_CHUNK_SIZE)
+                while chunk:
+                    hasher.update(chunk)
+                    if _throttle is not None:
+                        _throttle.consume(len(chunk))
+                    chunk = artifact_io.read(DEFAULT_CHUNK_SIZE)
+        finally:
+            # reading the artifact must not make it look recently used to tiering
+            os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+    except OSError as exc:
+        # truncated or otherwise unreadable (compressed) artifacts are corrupt
+        log.debug(f"Failed to read artifact {artifact_id} at {path}, {exc}")
+        return artifact_id, STATUS_CORRUPT, path.as_posix()
+
+    status = STATUS_OK if hasher.hexdigest() == fingerprint else STATUS_CORRUPT
+    return artifact_id, status, path.as_posix()
+
+
+def iter_artifacts(
+    after_id: int, batch_size: int
+) -> Generator[Tuple[int, str, Optional[str]], None, None]:
+    """Stream artifacts from the database in order of their id.
+
+    Args:
+        after_id (int):
+            Only artifacts with an id greater than this are streamed.
+        batch_size (int):
+            The amount of artifacts fetched from the database at a time.
+
+    Yields:
+        Tuple[int, str, Optional[str]]:
+            The id, fingerprint, and relative path of each artifact.
+    """
+
+    with db_session(commit=False) as session:
+        yield from (
+            session.query(Artifact.id, Artifact.fingerprint, Artifact.path)
+            .filter(Artifact.id > after_id, Artifact.parent_id == None)  # noqa
+            .order_by(Artifact.id)
+            .yield_per(batch_size)
+        )
+
+
+def scrub(
+    processes: Optional[int] = None,
+    rate: Optional[int] = None,
+    max_duration: Optional[float] = None,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    store: Optional[Store] = None,
+) -> ScrubCheckpoint:
+    """Scrub the store, continuing from the last checkpoint.
+
+    Args:
+        processes (Optional[int], optional):
+            The number of processes used to rehash artifacts.
+            Defaults to the CPU count.
+        rate (Optional[int], optional):
+            The maximum bytes per second read by each process.
+            Defaults to no limit.
+        max_duration (Optional[float], optional):
+            The maximum seconds to scrub for before stopping at a checkpoint.
+            Defaults to no limit.
+        batch_size (int, optional):
+            The amount of artifacts verified between checkpoints.
+            Defaults to :attr:`~DEFAULT_BATCH_SIZE`.
+        store (Optional[~brut.store.Store], optional):
+            The store to scrub.
+            Defaults to the configured store.
+
+    Returns:
+        ScrubCheckpoint:
+            The checkpoint after this run of the scrub.
+    """
+
+    store = store or get_store()
+    scrub_dirpath = store.primary.path / SCRUB_DIRNAME
+    scrub_dirpath.mkdir(parents=True, exist_ok=True)
+    checkpoint_path = scrub_dirpath / CHECKPOINT_FILENAME
+    checkpoint = ScrubCheckpoint.load(checkpoint_path)
+    if checkpoint.started_at is None:
+        checkpoint.started_at = datetime.now().isoformat()
+
+    log.info(f"Starting scrub after artifact {checkpoint.last_id}")
+    started_at = time.monotonic()
+    completed = True
+
+    with (scrub_dirpath / REPORT_FILENAME).open("a") as report_io:
+
+        def record(status: str, **details):
+            checkpoint.counts[status] = checkpoint.counts.get(status, 0) + 1
+            if status != STATUS_OK:
+                log.warning(f"Scrub found {status} artifact {details}")
+                report_io.write(
+                    json.dumps(
+                        {"status": status, "at": datetime.now().isoformat(), **details}
+                    )
+                    + "\n"
+                )
+
+        with ProcessPoolExecutor(
+            max_workers=processes,
+            initializer=_init_process,
+            initargs=(rate,),
+        ) as executor:
+            pending: Deque[Future] = deque()
+            # the pool defaults to a process per CPU, keep each of them busy
+            window = (processes or os.cpu_count() or 1) * 4
+
+            def drain(count: int):
+                while len(pending) > count:
+                    artifact_id, status, path = pending.popleft().result()
+                    record(status, artifact_id=artifact_id, path=path)
+                    checkpoint.last_id = max(checkpoint.last_id, artifact_id)
+
+            verified = 0
+            for artifact_id, fingerprint, relative_path in iter_artifacts(
+                checkpoint.last_id, batch_size
+            ):
+                pending.append(
+                    executor.submit(
+                        verify_artifact, store, artifact_id, fingerprint, relative_path
+                    )
+                )
+                drain(window)
+
+                verified += 1
+                if verified % batch_size == 0:
+                    drain(0)
+                    report_io.flush()
+                    checkpoint.save(checkpoint_path)
+
+                    if (
+                        max_duration is not None
+                        and time.monotonic() - started_at > max_duration
+                    ):
+                        log.info(f"Pausing scrub at artifact {checkpoint.last_id}")
+                        completed = False
+                        break
+
+            drain(0)
+
+        if completed:
+            log.info("Scrub of artifact catalog completed, checking for orphans")
+            with db_session(commit=False) as session:
+                for entry in iter_orphans(
+                    index_store(store, workers=processes),
+                    iter_catalog_paths(session),
+                ):
+                    record(
+                        STATUS_ORPHANED,
+                        volume=entry.volume_path.as_posix(),
+                        path=entry.relative_path.as_posix(),
+                    )
+
+            log.info(f"Scrub pass completed with {checkpoint.counts!r}")
+            checkpoint = ScrubCheckpoint(
+                passes=checkpoint.passes + 1,
+                last_counts=checkpoint.counts,
+            )
+
+    checkpoint.save(checkpoint_path)
+    return checkpoint
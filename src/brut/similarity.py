@@ -0,0 +1,560 @@
+# -*- encoding: utf-8 -*-
+# Copyright (c) 2021 Stephen Bunn <stephen@bunn.io>
+# ISC License <https://choosealicense.com/licenses/isc>
+
+"""Contains perceptual hashing for detecting near-duplicate image artifacts.
+
+Reposted images are usually re-encoded, so their fingerprint differs even though the
+image is the same.
+A 64-bit perceptual hash (``ahash``, ``dhash``, or ``phash``) is computed from the
+downscaled grayscale pixels of image artifacts, and near-duplicates are images whose
+hashes differ by at most a few bits.
+
+Hashes are indexed with multi-index hashing (Norouzi et al.).
+Each 64-bit hash is split into four 16-bit chunks and, by the pigeonhole principle, any
+hash within a Hamming distance of ``r`` of a query matches at least one chunk within a
+distance of ``r // 4``.
+Each chunk is kept in a sorted NumPy array, so candidates are found with binary search
+and only the candidates are compared against the full hash, keeping lookups sublinear
+in the size of the archive with roughly 40 bytes of memory per indexed artifact.
+
+.. note:: Requires the optional ``similarity`` extra (``numpy`` and ``Pillow``).
+
+Attributes:
+    HASH_FUNCTIONS (Dict[str, Callable]):
+        The supported perceptual hash functions by name.
+    CHUNK_COUNT (int):
+        The number of 16-bit chunks each hash is split into for indexing.
+    REFRESH_MARGIN (int):
+        The number of artifact IDs below the newest loaded ID that are scanned again
+        on each refresh, so artifacts committed out of order are still loaded.
+"""
+
+from itertools import combinations
+from pathlib import Path
+from threading import Lock, RLock
+from typing import BinaryIO, Callable, Dict, List, Optional, Set, Tuple, Union
+
+from sqlalchemy.orm import Session
+
+from .config import SimilarityConfig
+from .config import instance as config
+from .db import Artifact
+from .log import instance as log
+
+try:
+    import numpy
+    from PIL import Image
+except ImportError:  # pragma: no cover
+    numpy = None
+    Image = None
+
+CHUNK_COUNT = 4
+CHUNK_BITS = 16
+PENDING_LIMIT = 4096
+REFRESH_MARGIN = 10000
+
+ImageSource_T = Union[Path, BinaryIO]
+
+POLICY_STORE = "store"
+POLICY_SKIP = "skip"
+POLICY_LINK = "link"
+
+
+def get_similarity_config() -> Optional[SimilarityConfig]:
+    """Get the similarity configuration if near-duplicate detection is enabled.
+
+    Returns:
+        Optional[~brut.config.SimilarityConfig]:
+            The similarity configuration, or None if it is not configured.
+    """
+
+    return config.similarity
+
+
+def is_available() -> bool:
+    """Check if the optional dependencies for perceptual hashing are installed.
+
+    Returns:
+        bool:
+            True if ``numpy`` and ``Pillow`` are available.
+    """
+
+    return numpy is not None and Image is not None
+
+
+def load_pixels(image_path: ImageSource_T, width: int, height: int) -> "numpy.ndarray":
+    """Load the downscaled grayscale pixels of an image.
+
+    Args:
+        image_path (Union[~pathlib.Path, BinaryIO]):
+            The path or stream of the image.
+        width (int):
+            The width to downscale the image to.
+        height (int):
+            The height to downscale the image to.
+
+    Returns:
+        numpy.ndarray:
+            The pixels as a ``(height, width)`` float array.
+    """
+
+    with Image.open(image_path) as image:
+        image.draft("L", (width * 4, height * 4))
+        return numpy.asarray(
+            image.convert("L").resize((width, height), Image.LANCZOS),
+            dtype=numpy.float32,
+        )
+
+
+def pack_bits(bits: "numpy.ndarray") -> int:
+    """Pack an array of 64 boolean bits into an integer hash.
+
+    Args:
+        bits (numpy.ndarray):
+            The bits of the hash.
+
+    Returns:
+        int:
+            The unsigned 64-bit hash.
+    """
+
+    return int.from_bytes(numpy.packbits(bits.flatten()).tobytes(), "big")
+
+
+def ahash(image_path: ImageSource_T) -> int:
+    """Compute the average hash of an image.
+
+    Args:
+        image_path (Union[~pathlib.Path, BinaryIO]):
+            The path or stream of the image.
+
+    Returns:
+        int:
+            The unsigned 64-bit hash.
+    """
+
+    pixels = load_pixels(image_path, 8, 8)
+    return pack_bits(pixels > pixels.mean())
+
+
+def dhash(image_path: ImageSource_T) -> int:
+    """Compute the difference hash of an image.
+
+    Args:
+        image_path (Union[~pathlib.Path, BinaryIO]):
+            The path or stream of the image.
+
+    Returns:
+        int:
+            The unsigned 64-bit hash.
+    """
+
+    pixels = load_pixels(image_path, 9, 8)
+    return pack_bits(pixels[:, 1:] > pixels[:, :-1])
+
+
+def get_dct_matrix(size: int) -> "numpy.ndarray":
+    """Get the orthonormal DCT-II matrix of a given size.
+
+    Args:
+        size (int):
+            The size of the matrix.
+
+    Returns:
+        numpy.ndarray:
+            The ``(size, size)`` DCT-II matrix.
+    """
+
+    index = numpy.arange(size)
+    matrix = numpy.cos(
+        numpy.pi * (2 * index[None, :] + 1) * index[:, None] / (2 * size)
+    )
+    matrix[0] *= numpy.sqrt(1 / size)
+    matrix[1:] *= numpy.sqrt(2 / size)
+    return matrix
+
+
+def phash(image_path: ImageSource_T) -> int:
+    """Compute the DCT based perceptual hash of an image.
+
+    Args:
+        image_path (Union[~pathlib.Path, BinaryIO]):
+            The path or stream of the image.
+
+    Returns:
+        int:
+            The unsigned 64-bit hash.
+    """
+
+    pixels = load_pixels(image_path, 32, 32)
+    dct_matrix = get_dct_matrix(32)
+    low_frequencies = (dct_matrix @ pixels @ dct_matrix.T)[:8, :8]
+    # the DC term is excluded from the median as it only reflects overall brightness
+    return pack_bits(low_frequencies > numpy.median(low_frequencies.flatten()[1:]))
+
+
+HASH_FUNCTIONS: Dict[str, Callable[[ImageSource_T], int]] = {
+    "ahash": ahash,
+    "dhash": dhash,
+    "phash": phash,
+}
+
+
+def to_signed(value: int) -> int:
+    """Convert an unsigned 64-bit hash to the signed value stored in the database.
+
+    Args:
+        value (int):
+            The unsigned 64-bit hash.
+
+    Returns:
+        int:
+            The signed 64-bit hash.
+    """
+
+    return value - (1 << 64) if value >= (1 << 63) else value
+
+
+def to_unsigned(value: int) -> int:
+    """Convert a signed 64-bit hash from the database to an unsigned hash.
+
+    Args:
+        value (int):
+            The signed 64-bit hash.
+
+    Returns:
+        int:
+            The unsigned 64-bit hash.
+    """
+
+    return value + (1 << 64) if value < 0 else value
+
+
+def get_chunk_variants(chunk: int, radius: int) -> List[int]:
+    """Get all chunk values within a Hamming distance of a chunk.
+
+    Args:
+        chunk (int):
+            The 16-bit chunk.
+        radius (int):
+            The maximum Hamming distance.
+
+    Returns:
+        List[int]:
+            The chunk values within the radius, including the chunk itself.
+    """
+
+    variants = [chunk]
+    for distance in range(1, radius + 1):
+        for bits in combinations(range(CHUNK_BITS), distance):
+            variant = chunk
+            for bit in bits:
+                variant ^= 1 << bit
+            variants.append(variant)
+
+    return variants
+
+
+# lookup table of the number of set bits of each byte
+POPCOUNT_TABLE = (
+    numpy.array([bin(value).count("1") for value in range(256)], dtype=numpy.uint8)
+    if numpy is not None
+    else None
+)
+
+
+def get_distances(hashes: "numpy.ndarray", value: int) -> "numpy.ndarray":
+    """Get the Hamming distances between an array of hashes and a hash.
+
+    Args:
+        hashes (numpy.ndarray):
+            The ``uint64`` array of hashes.
+        value (int):
+            The unsigned 64-bit hash to compare against.
+
+    Returns:
+        numpy.ndarray:
+            The Hamming distance of each hash.
+    """
+
+    differences = numpy.bitwise_xor(hashes, numpy.uint64(value))
+    return POPCOUNT_TABLE[differences.view(numpy.uint8)].reshape(-1, 8).sum(axis=1)
+
+
+class HashIndex:
+    """A multi-index hashing index of 64-bit perceptual hashes.
+
+    New hashes are buffered and compared linearly until the buffer is large enough to
+    be merged into the sorted chunk arrays.
+    A buffered run is sorted on its own and merged into the existing chunk arrays, so
+    loading ``n`` hashes never re-sorts the whole index more than once.
+
+    The index is shared by the threads of a worker process, so every access is
+    guarded by a lock.
+    """
+
+    def __init__(self):
+        """Initialize an empty index."""
+
+        self.hashes = numpy.empty(0, dtype=numpy.uint64)
+        self.ids = numpy.empty(0, dtype=numpy.int64)
+        self.chunks: List["numpy.ndarray"] = []
+        self.orders: List["numpy.ndarray"] = []
+        self.pending: List[Tuple[int, int]] = []
+        self.last_id = 0
+        # IDs loaded within the refresh margin, which may be scanned again
+        self.recent_ids: Set[int] = set()
+        self.lock = RLock()
+        self._build()
+
+    def __len__(self) -> int:
+        """Get the number of indexed hashes."""
+
+        return len(self.hashes) + len(self.pending)
+
+    def _get_chunk(self, hashes: "numpy.ndarray", index: int) -> "numpy.ndarray":
+        return (
+            (hashes >> numpy.uint64(index * CHUNK_BITS)) & numpy.uint64(0xFFFF)
+        ).astype(numpy.uint16)
+
+    def _build(self):
+        self.chunks = []
+        self.orders = []
+        for index in range(CHUNK_COUNT):
+            chunk = self._get_chunk(self.hashes, index)
+            order = numpy.argsort(chunk, kind="stable").astype(numpy.uint32)
+            self.chunks.append(chunk[order])
+            self.orders.append(order)
+
+    def _merge(self, hashes: "numpy.ndarray", offset: int):
+        for index in range(CHUNK_COUNT):
+            chunk = self._get_chunk(hashes, index)
+            order = numpy.argsort(chunk, kind="stable").astype(numpy.uint32)
+            chunk = chunk[order]
+            # equal chunks of the new run are placed after the existing ones
+            positions = numpy.searchsorted(self.chunks[index], chunk, side="right")
+            self.chunks[index] = numpy.insert(self.chunks[index], positions, chunk)
+            self.orders[index] = numpy.insert(
+                self.orders[index], positions, order + numpy.uint32(offset)
+            )
+
+    def flush(self):
+        """Merge buffered hashes into the sorted chunk arrays."""
+
+        with self.lock:
+            if len(self.pending) == 0:
+                return
+
+            artifact_ids, hashes = zip(*self.pending)
+            new_hashes = numpy.array(hashes, dtype=numpy.uint64)
+            offset = len(self.hashes)
+            self.hashes = numpy.concatenate([self.hashes, new_hashes])
+            self.ids = numpy.concatenate(
+                [self.ids, numpy.array(artifact_ids, dtype=numpy.int64)]
+            )
+            self.pending = []
+            if offset == 0:
+                self._build()
+            else:
+                self._merge(new_hashes, offset)
+
+    def add(self, artifact_id: int, value: int):
+        """Add a hash to the index.
+
+        Args:
+            artifact_id (int):
+                The database ID of the artifact the hash belongs to.
+            value (int):
+                The unsigned 64-bit hash.
+        """
+
+        with self.lock:
+            self._add(artifact_id, value)
+            if len(self.pending) >= PENDING_LIMIT:
+                self.flush()
+
+    def _add(self, artifact_id: int, value: int) -> bool:
+        if artifact_id in self.recent_ids or artifact_id <= self.get_lower_id():
+            return False
+
+        self.pending.append((artifact_id, value))
+        self.recent_ids.add(artifact_id)
+        self.last_id = max(self.last_id, artifact_id)
+        return True
+
+    def get_lower_id(self) -> int:
+        """Get the ID below which artifacts are never scanned again on refresh.
+
+        Returns:
+            int:
+                The lowest artifact ID that may not have been loaded yet, minus one.
+        """
+
+        return max(self.last_id - REFRESH_MARGIN, 0)
+
+    def search(self, value: int, distance: int) -> List[Tuple[int, int]]:
+        """Find all indexed hashes within a Hamming distance of a hash.
+
+        Args:
+            value (int):
+                The unsigned 64-bit hash to search for.
+            distance (int):
+                The maximum Hamming distance.
+
+        Returns:
+            List[Tuple[int, int]]:
+                The artifact ID and distance of each match, closest first.
+        """
+
+        with self.lock:
+            radius = distance // CHUNK_COUNT
+            candidates: List["numpy.ndarray"] = []
+            for index in range(CHUNK_COUNT):
+                chunk = (value >> (index * CHUNK_BITS)) & 0xFFFF
+                variants = numpy.array(
+                    get_chunk_variants(chunk, radius), dtype=numpy.uint16
+                )
+                starts = numpy.searchsorted(self.chunks[index], variants, side="left")
+                ends = numpy.searchsorted(self.chunks[index], variants, side="right")
+                for start, end in zip(starts, ends):
+                    if end > start:
+                        candidates.append(self.orders[index][start:end])
+
+            matches: List[Tuple[int, int]] = []
+            if len(candidates) > 0:
+                positions = numpy.unique(numpy.concatenate(candidates))
+                distances = get_distances(self.hashes[positions], value)
+                within = distances <= distance
+                matches.extend(
+                    zip(
+                        self.ids[positions][within].tolist(),
+                        distances[within].tolist(),
+                    )
+                )
+
+            for artifact_id, pending_value in self.pending:
+                pending_distance = bin(pending_value ^ value).count("1")
+                if pending_distance <= distance:
+                    matches.append((artifact_id, pending_distance))
+
+        return sorted(matches, key=lambda match: (match[1], match[0]))
+
+    def refresh(self, session: Session):
+        """Load hashes of artifacts added since the index was last refreshed.
+
+        Artifacts within :attr:`~REFRESH_MARGIN` IDs of the newest loaded artifact are
+        scanned again, so artifacts committed after others with a greater ID are
+        still loaded, and artifacts that were already loaded are skipped.
+
+        Args:
+            session (~sqlalchemy.orm.Session):
+                The session to query the artifact catalog with.
+        """
+
+        with self.lock:
+            lower_id = self.get_lower_id()
+
+        # the catalog is queried outside the lock so lookups aren't blocked by it
+        rows = (
+            session.query(Artifact.id, Artifact.phash)
+            .filter(
+                Artifact.id > lower_id,
+                Artifact.phash != None,  # noqa
+                Artifact.parent_id == None,  # noqa
+            )
+            .order_by(Artifact.id)
+            .all()
+        )
+
+        with self.lock:
+            # buffer the whole load so it is merged into the index only once
+            loaded = sum(
+                self._add(artifact_id, to_unsigned(value))
+                for artifact_id, value in rows
+            )
+            lower_id = self.get_lower_id()
+            self.recent_ids = {
+                artifact_id for artifact_id in self.recent_ids if artifact_id > lower_id
+            }
+            if len(self.pending) >= PENDING_LIMIT:
+                self.flush()
+
+        if loaded > 0:
+            log.debug(f"Loaded {loaded} perceptual hashes into the index")
+
+
+# per-process index, refreshed from the catalog before each lookup
+_index: Optional[HashIndex] = None
+_index_lock = Lock()
+
+
+def get_index(session: Session) -> HashIndex:
+    """Get the up-to-date perceptual hash index of the current process.
+
+    Args:
+        session (~sqlalchemy.orm.Session):
+            The session to query the artifact catalog with.
+
+    Returns:
+        HashIndex:
+            The perceptual hash index.
+    """
+
+    global _index
+    with _index_lock:
+        if _index is None:
+            _index = HashIndex()
+
+    _index.refresh(session)
+    return _index
+
+
+def compute_hash(image_path: ImageSource_T, hash_type: str) -> Optional[int]:
+    """Compute the perceptual hash of an image, if possible.
+
+    Args:
+        image_path (Union[~pathlib.Path, BinaryIO]):
+            The path or stream of the image.
+        hash_type (str):
+            The name of the perceptual hash function to use.
+
+    Returns:
+        Optional[int]:
+            The unsigned 64-bit hash, or None if the image could not be hashed.
+    """
+
+    if not is_available():
+        log.warning("Skipping perceptual hashing as numpy and Pillow are not installed")
+        return None
+
+    try:
+        return HASH_FUNCTIONS[hash_type](image_path)
+    except (OSError, ValueError, Image.DecompressionBombError) as exc:
+        log.debug(f"Failed to compute perceptual hash of {image_path}, {exc}")
+        return None
+    finally:
+        if not isinstance(image_path, Path):
+            image_path.seek(0)
+
+
+def find_near_duplicate(
+    session: Session, value: int, distance: int
+) -> Optional[Tuple[int, int]]:
+    """Find the closest near-duplicate of a perceptual hash in the catalog.
+
+    Args:
+        session (~sqlalchemy.orm.Session):
+            The session to query the artifact catalog with.
+        value (int):
+            The unsigned 64-bit hash to search for.
+        distance (int):
+            The maximum Hamming distance of a near-duplicate.
+
+    Returns:
+        Optional[Tuple[int, int]]:
+            The artifact ID and distance of the closest near-duplicate, if any.
+    """
+
+    matches = get_index(session).search(value, distance)
+    return matches[0] if len(matches) > 0 else None
@@ -0,0 +1,48 @@
+# -*- encoding: utf-8 -*-
+# Copyright (c) 2021 Stephen Bunn <stephen@bunn.io>
+# ISC License <https://choosealicense.com/licenses/isc>
+
+"""Contains access to state shared between workers through Redis.
+
+Attributes:
+    KEY_PREFIX (str):
+        The prefix used for all keys written by Brut.
+"""
+
+from functools import lru_cache
+
+from redis import Redis
+
+from .config import instance as config
+from .constants import APP_NAME
+from .log import instance as log
+
+KEY_PREFIX = APP_NAME
+
+
+def build_key(*parts: str) -> str:
+    """Build a namespaced Redis key from the given parts.
+
+    >>> from brut.state import build_key
+    >>> build_key("capacity", "reservations")
+    'brut:capacity:reservations'
+
+    Returns:
+        str:
+            The namespaced key.
+    """
+
+    return ":".join((KEY_PREFIX, *parts))
+
+
+@lru_cache
+def get_redis() -> Redis:
+    """Get the Redis client used for shared state.
+
+    Returns:
+        ~redis.Redis:
+            The Redis client for the configured Redis URL.
+    """
+
+    log.info(f"Constructing a Redis client from {config.redis!r}")
+    return Redis.from_url(config.redis)
@@ -0,0 +1,718 @@
+# -*- encoding: utf-8 -*-
+# Copyright (c) 2021 Stephen Bunn <stephen@bunn.io>
+# ISC License <https://choosealicense.com/licenses/isc>
+
+"""Contains the store abstraction artifacts are persisted to.
+
+Artifacts are placed in a tree of fan-out directories built from the leading
+characters of their checksum.
+The fan-out is configured as a list of directory name widths, for example the default
+fan-out of ``[1, 2]`` places an artifact with the checksum ``59af876b8f4b8998`` at
+``5/9a/FILENAME`` which gives 4096 leaf directories.
+Larger stores should use more or wider levels (such as ``[2, 2, 2]``) to keep the
+amount of entries per directory low.
+
+The store can be spread over multiple volumes.
+Leaf directories are placed on volumes either by weighted rendezvous hashing of the leaf
+directory (``hash``), which only moves the minimal amount of artifacts when volumes are
+added or removed, or by free space weighting (``free``).
+
+Cold artifacts may be compressed in place (see :mod:`brut.compression`), in which case
+their filename gets the ``.zst`` suffix.
+Use :meth:`Store.open` to read artifacts, which decompresses them transparently.
+
+>>> from pathlib import Path
+>>> from brut.store import Store, Volume
+>>> store = Store([Volume(Path("/data/a")), Volume(Path("/data/b"))], fanout=[2, 2])
+>>> store.get_relative_path("59af876b8f4b8998", "abc.mp4")
+PosixPath('59/af/abc.mp4')
+
+Attributes:
+    DEFAULT_FANOUT (List[int]):
+        The default fan-out widths of the store layout.
+    PLACEMENT_HASH (str):
+        The placement strategy using weighted rendezvous hashing.
+    PLACEMENT_FREE (str):
+        The placement strategy using free space weighting.
+    DEFAULT_WRITE_SIZE (int):
+        The default size in bytes of reads when writing streams to the store.
+    DEFAULT_REBALANCE_BATCH (int):
+        The default number of moved artifacts updated in the catalog per commit.
+"""
+
+import math
+import os
+import random
+import shutil
+from dataclasses import dataclass
+from functools import lru_cache
+from pathlib import Path
+from typing import BinaryIO, Dict, Generator, List, Optional, Set, Tuple
+
+import xxhash
+from sqlalchemy.orm import Session
+
+from .compression import (
+    COMPRESSED_SUFFIX,
+    DEFAULT_FRAME_SIZE,
+    DEFAULT_LEVEL,
+    compress_file,
+    open_compressed,
+)
+from .config import BrutConfig
+from .config import instance as config
+from .db import TIER_COMPRESSED, Artifact
+from .hasher import HashType, hash_io
+from .log import instance as log
+
+DEFAULT_FANOUT = [1, 2]
+PLACEMENT_HASH = "hash"
+PLACEMENT_FREE = "free"
+
+HASH_SCALE = float(2 ** 52)
+DEFAULT_WRITE_SIZE = 2 ** 23
+DEFAULT_REBALANCE_BATCH = 100
+
+
+@dataclass
+class Volume:
+    """Describes a single volume of the store."""
+
+    path: Path
+    weight: float = 1.0
+
+
+class Store:
+    """The store artifacts are persisted to."""
+
+    def __init__(
+        self,
+        volumes: List[Volume],
+        fanout: Optional[List[int]] = None,
+        placement: str = PLACEMENT_HASH,
+    ):
+        """Initialize the store.
+
+        Args:
+            volumes (List[Volume]):
+                The volumes of the store, the first volume is the primary volume.
+            fanout (Optional[List[int]], optional):
+                The widths of each level of fan-out directories.
+                Defaults to :attr:`~DEFAULT_FANOUT`.
+            placement (str, optional):
+                The placement strategy of leaf directories on volumes.
+                Defaults to :attr:`~PLACEMENT_HASH`.
+
+        Raises:
+            ValueError:
+                If no volumes, an invalid fan-out, or an unknown placement is given.
+        """
+
+        if len(volumes) <= 0:
+            raise ValueError("Store requires at least one volume")
+
+        fanout = fanout or DEFAULT_FANOUT
+        if any(width <= 0 for width in fanout) or sum(fanout) > 16:
+            raise ValueError(f"Invalid store fan-out {fanout!r}")
+
+        if placement not in (PLACEMENT_HASH, PLACEMENT_FREE):
+            raise ValueError(f"Unknown store placement {placement!r}")
+
+        self.volumes = volumes
+        self.fanout = fanout
+        self.placement = placement
+
+    @classmethod
+    def from_config(cls, brut_config: BrutConfig) -> "Store":
+        """Build the store described by the given BrutConfig.
+
+        Args:
+            brut_config (~brut.config.BrutConfig):
+                The current Brut configuration.
+
+        Returns:
+            Store:
+                The store described by the configuration.
+        """
+
+        storage_config = brut_config.storage
+        if storage_config is None:
+            return cls([Volume(Path(brut_config.store))])
+
+        volumes = [Volume(Path(brut_config.store))]
+        for volume_config in storage_config.volumes or []:
+            if Path(volume_config.path) == volumes[0].path:
+                volumes[0].weight = volume_config.weight
+            else:
+                volumes.append(Volume(Path(volume_config.path), volume_config.weight))
+
+        return cls(
+            volumes,
+            fanout=storage_config.fanout or None,
+            placement=storage_config.placement,
+        )
+
+    @property
+    def primary(self) -> Volume:
+        """The primary volume of the store."""
+
+        return self.volumes[0]
+
+    def get_relative_dirpath(self, checksum: str) -> Path:
+        """Get the leaf directory of a checksum relative to a volume.
+
+        Args:
+            checksum (str):
+                The checksum of the artifact.
+
+        Returns:
+            ~pathlib.Path:
+                The relative leaf directory.
+        """
+
+        parts = []
+        offset = 0
+        for width in self.fanout:
+            parts.append(checksum[offset : offset + width])
+            offset += width
+
+        return Path(*parts)
+
+    def get_relative_path(self, checksum: str, filename: str) -> Path:
+        """Get the path of an artifact relative to a volume.
+
+        Args:
+            checksum (str):
+                The checksum of the artifact.
+            filename (str):
+                The filename of the artifact.
+
+        Returns:
+            ~pathlib.Path:
+                The relative path of the artifact.
+        """
+
+        return self.get_relative_dirpath(checksum) / filename
+
+    def get_placement_volume(self, relative_dirpath: Path) -> Optional[Volume]:
+        """Get the volume a leaf directory is placed on by consistent hashing.
+
+        Args:
+            relative_dirpath (~pathlib.Path):
+                The relative leaf directory.
+
+        Returns:
+            Optional[Volume]:
+                The volume the leaf directory belongs to, or None if the placement
+                strategy does not deterministically place leaf directories.
+        """
+
+        if self.placement != PLACEMENT_HASH:
+            return None
+
+        if len(self.volumes) == 1:
+            return self.primary
+
+        # weighted rendezvous hashing, the volume with the highest score wins
+        key = relative_dirpath.as_posix()
+        best_volume, best_score = self.primary, -math.inf
+        for volume in self.volumes:
+            digest = xxhash.xxh64_intdigest(
+                f"{volume.path.as_posix()}:{key}".encode("utf-8")
+            )
+            # map the digest into the open interval (0, 1) while avoiding float rounding
+            score = -volume.weight / math.log(((digest >> 12) + 0.5) / HASH_SCALE)
+            if score > best_score:
+                best_volume, best_score = volume, score
+
+        return best_volume
+
+    def get_volume_usage(self) -> List[Tuple[int, int]]:
+        """Get the total and free bytes of each device new artifacts are written to.
+
+        Volumes without any weight never receive new artifacts, unless no volume
+        has any weight and everything is written to the primary volume.
+
+        Returns:
+            List[Tuple[int, int]]:
+                The total bytes and free bytes of each distinct device.
+        """
+
+        volumes = [volume for volume in self.volumes if volume.weight > 0]
+        devices: Dict[int, Tuple[int, int]] = {}
+        for volume in volumes or [self.primary]:
+            volume.path.mkdir(parents=True, exist_ok=True)
+            usage = shutil.disk_usage(volume.path)
+            devices[volume.path.stat().st_dev] = (usage.total, usage.free)
+
+        return list(devices.values())
+
+    def choose_volume(self, relative_dirpath: Path) -> Volume:
+        """Choose the volume a new artifact in the given leaf directory is written to.
+
+        Args:
+            relative_dirpath (~pathlib.Path):
+                The relative leaf directory.
+
+        Returns:
+            Volume:
+                The volume the artifact should be written to.
+        """
+
+        volume = self.get_placement_volume(relative_dirpath)
+        if volume is not None:
+            return volume
+
+        weights = []
+        for candidate in self.volumes:
+            candidate.path.mkdir(parents=True, exist_ok=True)
+            weights.append(shutil.disk_usage(candidate.path).free * candidate.weight)
+
+        if sum(weights) <= 0:
+            return self.primary
+
+        return random.choices(self.volumes, weights=weights)[0]
+
+    def locate(self, checksum: str, filename: str) -> Optional[Path]:
+        """Locate an existing artifact in the store.
+
+        Args:
+            checksum (str):
+                The checksum of the artifact.
+            filename (str):
+                The filename of the artifact.
+
+        Returns:
+            Optional[~pathlib.Path]:
+                The path of the artifact, if it exists in the store.
+        """
+
+        relative_path = self.get_relative_path(checksum, filename)
+        placement_volume = self.get_placement_volume(relative_path.parent)
+
+        # check the volume the artifact should be on before any other volumes
+        volumes = self.volumes
+        if placement_volume is not None:
+            volumes = [placement_volume] + [
+                volume for volume in self.volumes if volume is not placement_volume
+            ]
+
+        compressed_path = relative_path.with_name(
+            f"{relative_path.name}{COMPRESSED_SUFFIX}"
+        )
+        for volume in volumes:
+            for path in (volume.path / relative_path, volume.path / compressed_path):
+                if path.is_file():
+                    return path
+
+        return None
+
+    def open_path(self, path: Path) -> BinaryIO:
+        """Open an artifact path in the store for reading its content.
+
+        Compressed artifacts are transparently decompressed.
+
+        Args:
+            path (~pathlib.Path):
+                The path of the artifact.
+
+        Returns:
+            BinaryIO:
+                A readable binary stream of the artifact's content.
+        """
+
+        if path.suffix == COMPRESSED_SUFFIX:
+            return open_compressed(path)
+
+        return path.open("rb")
+
+    def open(self, checksum: str, filename: str) -> BinaryIO:
+        """Open an artifact in the store for reading its content.
+
+        Args:
+            checksum (str):
+                The checksum of the artifact.
+            filename (str):
+                The filename of the artifact.
+
+        Raises:
+            FileNotFoundError:
+                If the artifact does not exist in the store.
+
+        Returns:
+            BinaryIO:
+                A readable binary stream of the artifact's content.
+        """
+
+        path = self.locate(checksum, filename)
+        if path is None:
+            raise FileNotFoundError(f"No artifact {filename!r} ({checksum}) exists")
+
+        return self.open_path(path)
+
+    def hash_path(self, path: Path, types: Set[HashType]) -> Dict[HashType, str]:
+        """Calculate the requested hash types for the content of an artifact path.
+
+        Args:
+            path (~pathlib.Path):
+                The path of the artifact.
+            types (Set[~brut.hasher.HashType]):
+                The set of hash types to calculate.
+
+        Returns:
+            Dict[~brut.hasher.HashType, str]:
+                A dictionary of hash types and the calculated hexdigest of the hash.
+        """
+
+        with self.open_path(path) as artifact_io:
+            return hash_io(artifact_io, types)
+
+    def compress(
+        self,
+        path: Path,
+        level: int = DEFAULT_LEVEL,
+        frame_size: int = DEFAULT_FRAME_SIZE,
+        max_ratio: float = 1.0,
+    ) -> Optional[int]:
+        """Replace an uncompressed artifact in the store with a compressed artifact.
+
+        Args:
+            path (~pathlib.Path):
+                The path of the uncompressed artifact.
+            level (int, optional):
+                The zstd compression level.
+                Defaults to :attr:`~brut.compression.DEFAULT_LEVEL`.
+            frame_size (int, optional):
+                The decompressed size in bytes of each independent frame.
+                Defaults to :attr:`~brut.compression.DEFAULT_FRAME_SIZE`.
+            max_ratio (float, optional):
+                The maximum ratio of compressed to uncompressed size for the compressed
+                artifact to be kept.
+                Defaults to 1.0.
+
+        Returns:
+            Optional[int]:
+                The size of the compressed artifact, or None if the artifact did not
+                compress well enough and was left uncompressed.
+        """
+
+        stat = path.stat()
+        to_path = path.with_name(f"{path.name}{COMPRESSED_SUFFIX}")
+        temp_path = path.with_name(f".{to_path.name}.tmp")
+
+        log.debug(f"Compressing artifact {path!s} to {to_path!s}")
+        compressed_size = compress_file(
+            path, temp_path, level=level, frame_size=frame_size
+        )
+        if compressed_size > stat.st_size * max_ratio:
+            log.debug(
+                f"Leaving artifact {path!s} uncompressed as it only compressed from "
+                f"{stat.st_size} to {compressed_size} bytes"
+            )
+            temp_path.unlink()
+            return None
+
+        os.utime(temp_path, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+        os.replace(temp_path, to_path)
+        path.unlink()
+        return compressed_size
+
+    def get_put_path(self, checksum: str, filename: str) -> Tuple[Path, Optional[Path]]:
+        """Get the path a new artifact should be written to.
+
+        Args:
+            checksum (str):
+                The checksum of the artifact.
+            filename (str):
+                The filename of the artifact.
+
+        Returns:
+            Tuple[~pathlib.Path, Optional[~pathlib.Path]]:
+                The path to write the artifact to and the path of the existing copy of
+                the artifact, if any.
+        """
+
+        relative_path = self.get_relative_path(checksum, filename)
+        existing_path = self.locate(checksum, filename)
+        if existing_path is not None:
+            to_path = existing_path.with_name(filename)
+        else:
+            to_path = self.choose_volume(relative_path.parent).path / relative_path
+
+        if not to_path.parent.is_dir():
+            log.info(f"Creating store fragment directory at {to_path.parent}")
+            to_path.parent.mkdir(parents=True)
+
+        return to_path, existing_path
+
+    def commit_put(self, temp_path: Path, to_path: Path, existing_path: Optional[Path]):
+        """Atomically move a written temporary file to its artifact path.
+
+        Args:
+            temp_path (~pathlib.Path):
+                The path of the written temporary file.
+            to_path (~pathlib.Path):
+                The path of the artifact.
+            existing_path (Optional[~pathlib.Path]):
+                The path of the existing copy of the artifact, if any.
+        """
+
+        os.replace(temp_path, to_path)
+
+        # a rewritten artifact replaces any compressed copy of the same artifact
+        if existing_path is not None and existing_path != to_path:
+            existing_path.unlink()
+
+    def put(self, from_path: Path, checksum: str, filename: str) -> Path:
+        """Write a file to the store as an artifact.
+
+        The file is first copied next to its destination and then atomically renamed
+        so that partially written artifacts never appear in the store.
+
+        Args:
+            from_path (~pathlib.Path):
+                The path of the file to write to the store.
+            checksum (str):
+                The checksum of the artifact.
+            filename (str):
+                The filename of the artifact.
+
+        Returns:
+            ~pathlib.Path:
+                The path the artifact was written to.
+        """
+
+        to_path, existing_path = self.get_put_path(checksum, filename)
+        log.debug(f"Copying {from_path!s} to store at {to_path!s}")
+        temp_path = to_path.with_name(f".{to_path.name}.tmp")
+        shutil.copy(from_path, temp_path)
+        self.commit_put(temp_path, to_path, existing_path)
+        return to_path
+
+    def put_io(
+        self,
+        from_io: BinaryIO,
+        checksum: str,
+        filename: str,
+        buffer_size: int = DEFAULT_WRITE_SIZE,
+    ) -> Path:
+        """Write a readable stream to the store as an artifact.
+
+        Streams smaller than the buffer size are written with a single write.
+
+        Args:
+            from_io (BinaryIO):
+                The stream to write to the store, read from its current position.
+            checksum (str):
+                The checksum of the artifact.
+            filename (str):
+                The filename of the artifact.
+            buffer_size (int, optional):
+                The size in bytes of reads from the stream.
+                Defaults to :attr:`~DEFAULT_WRITE_SIZE`.
+
+        Returns:
+            ~pathlib.Path:
+                The path the artifact was written to.
+        """
+
+        to_path, existing_path = self.get_put_path(checksum, filename)
+        log.debug(f"Writing stream to store at {to_path!s}")
+        temp_path = to_path.with_name(f".{to_path.name}.tmp")
+        with temp_path.open("wb") as to_io:
+            shutil.copyfileobj(from_io, to_io, buffer_size)
+        self.commit_put(temp_path, to_path, existing_path)
+        return to_path
+
+    def iter_files(
+        self, volume: Optional[Volume] = None
+    ) -> Generator[Tuple[Volume, Path], None, None]:
+        """Iterate over all artifact files in the store.
+
+        Hidden files and directories (such as the partial download area) are skipped.
+
+        Args:
+            volume (Optional[Volume], optional):
+                Only iterate over the files of the given volume.
+                Defaults to None.
+
+        Yields:
+            Tuple[Volume, ~pathlib.Path]:
+                The volume and path of each artifact relative to the volume.
+        """
+
+        for current_volume in [volume] if volume else self.volumes:
+            if not current_volume.path.is_dir():
+                continue
+
+            for dirpath, dirnames, filenames in os.walk(current_volume.path):
+                dirnames[:] = [name for name in dirnames if not name.startswith(".")]
+                for filename in filenames:
+                    if filename.startswith("."):
+                        continue
+
+                    yield current_volume, Path(dirpath, filename).relative_to(
+                        current_volume.path
+                    )
+
+    def is_current_layout(self, relative_path: Path) -> bool:
+        """Check if a relative artifact path matches the current fan-out layout.
+
+        Args:
+            relative_path (~pathlib.Path):
+                The artifact path relative to its volume.
+
+        Returns:
+            bool:
+                True if the path's directories match the configured fan-out.
+        """
+
+        parts = relative_path.parent.parts
+        return len(parts) == len(self.fanout) and all(
+            len(part) == width for part, width in zip(parts, self.fanout)
+        )
+
+    def move(self, volume: Volume, from_path: Path, to_path: Path):
+        """Move an artifact within the store.
+
+        Fan-out directories left empty by the move are removed.
+
+        Args:
+            volume (Volume):
+                The volume the artifact is moved from.
+            from_path (~pathlib.Path):
+                The current path of the artifact.
+            to_path (~pathlib.Path):
+                The path to move the artifact to.
+        """
+
+        to_path.parent.mkdir(parents=True, exist_ok=True)
+        shutil.move(from_path.as_posix(), to_path.as_posix())
+
+        parent = from_path.parent
+        while parent != volume.path:
+            try:
+                parent.rmdir()
+            except OSError:
+                break
+            parent = parent.parent
+
+    def update_catalog(
+        self, session: Session, checksum: str, relative_path: Path, path: Path
+    ):
+        """Update the catalog entry of an artifact that was moved to a new path.
+
+        Args:
+            session (~sqlalchemy.orm.Session):
+                The session to update the catalog with.
+            checksum (str):
+                The checksum of the artifact.
+            relative_path (~pathlib.Path):
+                The new path of the artifact relative to its volume.
+            path (~pathlib.Path):
+                The new path of the artifact.
+        """
+
+        db_artifact = (
+            session.query(Artifact)
+            .filter(Artifact.fingerprint == checksum)
+            .one_or_none()
+        )
+        if db_artifact is None:
+            log.warning(f"No artifact is cataloged for moved file {path} ({checksum})")
+            return
+
+        # compressed artifacts are cataloged by the path of their uncompressed file
+        compressed = relative_path.suffix == COMPRESSED_SUFFIX
+        db_artifact.path = (
+            relative_path.with_suffix("") if compressed else relative_path
+        ).as_posix()
+        db_artifact.stored_size = path.stat().st_size
+        if compressed:
+            db_artifact.tier = TIER_COMPRESSED
+
+    def rebalance(
+        self,
+        dry_run: bool = False,
+        session: Optional[Session] = None,
+        batch_size: int = DEFAULT_REBALANCE_BATCH,
+    ) -> int:
+        """Move artifacts to where the current layout and volumes place them.
+
+        Artifacts written with a different fan-out are rehashed to determine their new
+        location.
+        With the ``free`` placement only the layout is migrated, artifacts are not
+        moved between volumes.
+
+        If a session is given, the catalog path of each artifact moved to a new
+        layout is updated along with its move, and committed every ``batch_size``
+        moves so the catalog never falls far behind the store.
+
+        Args:
+            dry_run (bool, optional):
+                If True, only log the moves that would be made.
+                Defaults to False.
+            session (Optional[~sqlalchemy.orm.Session], optional):
+                The session to update the catalog with.
+                Defaults to None.
+            batch_size (int, optional):
+                The number of moved artifacts updated in the catalog per commit.
+                Defaults to :attr:`~DEFAULT_REBALANCE_BATCH`.
+
+        Returns:
+            int:
+                The number of artifacts that were (or would be) moved.
+        """
+
+        moves: List[Tuple[Volume, Path, Path, Path, Optional[str]]] = []
+        for volume, relative_path in self.iter_files():
+            from_path = volume.path / relative_path
+            target_path, checksum = relative_path, None
+            if not self.is_current_layout(relative_path):
+                checksum = self.hash_path(from_path, {HashType.XXHASH})[HashType.XXHASH]
+                target_path = self.get_relative_path(checksum, relative_path.name)
+
+            target_volume = self.get_placement_volume(target_path.parent) or volume
+            to_path = target_volume.path / target_path
+            if to_path != from_path:
+                moves.append((volume, from_path, to_path, target_path, checksum))
+
+        pending = 0
+        for volume, from_path, to_path, target_path, checksum in moves:
+            log.info(f"Moving artifact {from_path} to {to_path}")
+            if dry_run:
+                continue
+
+            self.move(volume, from_path, to_path)
+
+            # only a layout change moves an artifact's path relative to its volume
+            if session is None or checksum is None:
+                continue
+
+            self.update_catalog(session, checksum, target_path, to_path)
+            pending += 1
+            if pending >= batch_size:
+                session.commit()
+                pending = 0
+
+        if session is not None and pending > 0:
+            session.commit()
+
+        return len(moves)
+
+
+@lru_cache
+def get_store() -> Store:
+    """Get the store described by the current configuration.
+
+    Returns:
+        Store:
+            The configured store.
+    """
+
+    store = Store.from_config(config)
+    log.info(
+        f"Constructed store over volumes {[volume.path for volume in store.volumes]} "
+        f"with fan-out {store.fanout!r} and placement {store.placement!r}"
+    )
+    return store
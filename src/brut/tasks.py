@@ -4,55 +4,199 @@
 
 """Contains executable tasks for the application."""
 
-import shutil
-from datetime import datetime
+import mimetypes
+import time
+from contextlib import nullcontext
+from datetime import datetime, timedelta
 from pathlib import Path
+from tempfile import SpooledTemporaryFile
+from typing import (
+    Any,
+    BinaryIO,
+    Callable,
+    Dict,
+    Iterable,
+    List,
+    Optional,
+    Sequence,
+    Tuple,
+    Union,
+)
 
 import dramatiq
-from dramatiq.brokers.redis import RedisBroker
-from dramatiq.results import Results
-from dramatiq.results.backends import RedisBackend
 from megu.filters import best_content
 from megu.helpers import temporary_directory
+from megu.models import Content as MeguContent
+from megu.models import HttpResource
+from megu.plugin.base import BasePlugin
 from megu.plugin.generic import GenericPlugin
 from megu.services import get_downloader, get_plugin, iter_content, merge_manifest
-
+from sqlalchemy import or_
+from sqlalchemy.orm import Session
+
+from .adaptive import get_watch_key, record_poll
+from .broker import get_broker
+from .cache import get_response_cache
+from .capacity import AdmissionDeferred, get_capacity_config, reservation
+from .compression import COMPRESSED_SUFFIX
+from .config import FetchConfig, TieringConfig
 from .config import instance as config
-from .db import Artifact, Content, db_session
+from .db import TIER_COMPRESSED, TIER_HOT, TIER_RAW, Artifact, Content, db_session
+from .dispatch import queue_follow_up
+from .download import (
+    PARTIAL_DIRNAME,
+    TRANSIENT_ERRORS,
+    download_content,
+    remove_partials,
+    stage_resource,
+)
+from .garbage import TEMPORARY_PREFIX, CleanupMiddleware, collect_garbage
 from .hasher import HashType, hash_file
-from .helpers import setup_logging
+from .helpers import parse_size, setup_logging
 from .log import instance as log
+from .poll import poll_many
+from .preflight import Identifier_T, find_archived, probe_content, record_identifiers
+from .similarity import (
+    POLICY_LINK,
+    POLICY_SKIP,
+    compute_hash,
+    find_near_duplicate,
+    get_similarity_config,
+    to_signed,
+)
+from .state import get_redis
+from .store import Store, get_store
 from .watchers import get_watcher
 
 # brut.tasks is an entrypoint for workers, ensure logging is setup early
 setup_logging()
 
-# setup backend and broker for dramatiq actors prior to defining actors
-# must occur before the @dramatiq.actor decorator is used or you will never get task
-# messages being read from Redis
-redis_backend = RedisBackend()
-redis_broker = RedisBroker(url=config.redis)
-redis_broker.add_middleware(Results(backend=redis_backend))
+# setup the broker for dramatiq actors prior to defining actors
+redis_broker = get_broker()
+
+# default queue names and priorities for each actor, lower priorities are handled first
+# so watches are never stuck behind a large backlog of fetches
+DEFAULT_QUEUES: Dict[str, Tuple[str, int]] = {
+    "watch": ("watch", 0),
+    "enqueue": ("enqueue", 10),
+    "fetch": ("fetch", 20),
+    "maintenance": ("maintenance", 30),
+}
+
+# maintenance jobs walk the entire store or catalog, so they run well past dramatiq's
+# default time limit and are not retried as they run again on their next schedule
+DEFAULT_LIMITS: Dict[str, Dict[str, int]] = {
+    "maintenance": {"time_limit": 21600, "max_retries": 0},
+}
+
+# content of a batch failing with a transient error is retried with a backoff, as
+# dramatiq would retry a single fetch
+TRANSIENT_RETRIES = 5
+TRANSIENT_BACKOFF = 15000
+
+
+def get_partial_dirpath() -> Path:
+    """Get the root of the partial download area.
+
+    Returns:
+        ~pathlib.Path:
+            The configured partial download directory, or a directory within the
+            primary store volume.
+    """
 
-dramatiq.set_broker(redis_broker)
+    partial_dir = get_fetch_config().partial_dir
+    return (
+        Path(partial_dir) if partial_dir else get_store().primary.path / PARTIAL_DIRNAME
+    )
 
 
-@dramatiq.actor
-def watch(watcher_type: str, *args, **kwargs):
-    """Job responsible for getting new content entries and adding them to the db.
+# remove temporary data and partial downloads left behind by workers that died
+redis_broker.add_middleware(CleanupMiddleware(get_partial_dirpath))
+
+
+def get_actor_options(actor_type: str) -> Dict[str, Any]:
+    """Get the dramatiq actor options for a given actor type.
 
     Args:
-        watcher_type (str):
-            The type of watcher to use for extracting content.]
+        actor_type (str):
+            The type of actor to get options for (``watch``, ``enqueue``, ``fetch``,
+            or ``maintenance``).
+
+    Returns:
+        Dict[str, Any]:
+            The ``queue_name`` and ``priority`` options for the actor, along with
+            its ``time_limit`` in milliseconds and ``max_retries`` if limited.
     """
 
-    watcher = get_watcher(watcher_type)
-    if watcher is None:
-        log.error(f"Failed to determine the appropriate watcher for {watcher_type!r}")
-        return None
+    queue_name, priority = DEFAULT_QUEUES[actor_type]
+    limits = dict(DEFAULT_LIMITS.get(actor_type, {}))
+    queue_config = getattr(config.queues, actor_type, None) if config.queues else None
+    if queue_config is not None:
+        if queue_config.name is not None:
+            queue_name = queue_config.name
+        if queue_config.priority is not None:
+            priority = queue_config.priority
+        if queue_config.time_limit is not None:
+            limits["time_limit"] = queue_config.time_limit
+        if queue_config.max_retries is not None:
+            limits["max_retries"] = queue_config.max_retries
+
+    options: Dict[str, Any] = {"queue_name": queue_name, "priority": priority}
+    if "time_limit" in limits:
+        options["time_limit"] = limits["time_limit"] * 1000
+    if "max_retries" in limits:
+        options["max_retries"] = limits["max_retries"]
+
+    return options
+
+
+def get_fetch_config() -> FetchConfig:
+    """Get the fetch configuration, falling back to defaults if not configured.
+
+    Returns:
+        ~brut.config.FetchConfig:
+            The fetch configuration to use.
+    """
+
+    return config.fetch or FetchConfig()
+
+
+def add_content(
+    watcher_type: str,
+    args: Sequence[Any],
+    kwargs: Dict[str, Any],
+    contents: Iterable[Content],
+    cursor: Callable[[], Optional[str]],
+    save_state: Optional[Callable[[], None]] = None,
+):
+    """Add newly polled content of a watch to the db and dispatch follow-up work.
+
+    The state collected by the watcher's poll is only persisted once the content
+    has been committed, so content that failed to be added is polled again.
+
+    Args:
+        watcher_type (str):
+            The type of watcher the content was polled with.
+        args (Sequence[Any]):
+            The arguments of the watch.
+        kwargs (Dict[str, Any]):
+            The keyword arguments of the watch.
+        contents (Iterable[~brut.db.Content]):
+            The polled content of the watch.
+        cursor (Callable[[], Optional[str]]):
+            A function getting the cursor of the following page once the content
+            has been iterated.
+        save_state (Optional[Callable[[], None]], optional):
+            A function persisting the state of the watcher's poll.
+            Defaults to None.
+    """
 
+    added: List[Content] = []
+    polled = 0
+    on_watch = get_fetch_config().on_watch
     with db_session() as session:
-        for content in watcher().iter_content(*args, **kwargs):
+        for content in contents:
+            polled += 1
 
             # skip content if content matching the fingerprint already exists
             if session.query(
@@ -67,27 +211,530 @@ def watch(watcher_type: str, *args, **kwargs):
                 continue
 
             log.info(f"Adding content {content.url} ({content.fingerprint})")
+            if on_watch:
+                content.dispatched_at = datetime.now()
+
             session.add(content)
+            added.append(content)
 
+        # capture identifiers before commit expires the added content instances
+        session.flush()
+        entries = [(content.id, content.url) for content in added]
         session.commit()
 
+    if save_state is not None:
+        save_state()
+
+    # a full page of only new content likely means more new content was missed, the
+    # follow-up is sent by the leading scheduler to pace it within the API quota
+    after = cursor()
+    if after is not None and len(entries) == polled:
+        log.info(
+            f"Queuing follow-up {watcher_type!r} watch after {after!r} "
+            "for a full page of new content"
+        )
+        queue_follow_up(
+            get_redis(), watcher_type, list(args), {**kwargs, "after": after}
+        )
+
+    record_poll(
+        get_watch_key(watcher_type, list(args), kwargs),
+        len(entries),
+        follow_up="after" in kwargs,
+    )
+
+    # dispatch only after commit so fetch workers can always see the new content
+    if on_watch and len(entries) > 0:
+        log.info(f"Dispatching fetch for {len(entries)} newly added content entries")
+        send_fetch(entries)
+
+
+@dramatiq.actor(**get_actor_options("watch"))
+def watch(watcher_type: str, *args, **kwargs):
+    """Job responsible for getting new content entries and adding them to the db.
+
+    Args:
+        watcher_type (str):
+            The type of watcher to use for extracting content.
+    """
+
+    watcher = get_watcher(watcher_type)
+    if watcher is None:
+        log.error(f"Failed to determine the appropriate watcher for {watcher_type!r}")
+        return None
+
+    instance = watcher()
+    add_content(
+        watcher_type,
+        args,
+        kwargs,
+        instance.iter_content(*args, **kwargs),
+        lambda: instance.cursor,
+        instance.save_state,
+    )
+
+
+@dramatiq.actor(**get_actor_options("watch"))
+def watch_many(watches: List[Tuple[str, List[Any], Dict[str, Any]]]):
+    """Job responsible for polling many watches concurrently from a single worker.
+
+    Watches are polled on an event loop with at most ``watchers.concurrency``
+    watches in flight, then their new content is added to the db one watch at a
+    time, so a watch failing to be added doesn't affect the others.
+
+    Args:
+        watches (List[Tuple[str, List[Any], Dict[str, Any]]]):
+            The watcher type, arguments, and keyword arguments of each watch.
+    """
+
+    for poll in poll_many(watches, config.watchers.concurrency):
+        if poll.error is not None:
+            log.error(f"Failed to poll {poll.type!r} watch {poll.args!r}, {poll.error}")
+            continue
+
+        # a watch failing to be added must not drop the polls of the other watches
+        try:
+            add_content(
+                poll.type,
+                poll.args,
+                poll.kwargs,
+                poll.contents,
+                lambda: poll.cursor,
+                poll.save_state,
+            )
+        except Exception as exc:
+            log.exception(
+                f"Failed to add content of {poll.type!r} watch {poll.args!r}, {exc}"
+            )
+
+
+def send_fetch(entries: Iterable[Tuple[int, str]]):
+    """Send fetch messages for the given content entries.
+
+    Entries are sent as :func:`~fetch_batch` messages when the configured
+    ``fetch.batch_size`` is greater than 1, otherwise as individual :func:`~fetch`
+    messages.
+
+    Args:
+        entries (Iterable[Tuple[int, str]]):
+            The database ID and URL of each content entry that should be fetched.
+    """
+
+    batch_size = max(get_fetch_config().batch_size, 1)
+    batch: List[int] = []
+    for content_id, content_url in entries:
+        if batch_size <= 1:
+            fetch.send(content_id, content_url)
+            continue
+
+        batch.append(content_id)
+        if len(batch) >= batch_size:
+            fetch_batch.send(batch)
+            batch = []
+
+    if len(batch) > 0:
+        fetch_batch.send(batch)
+
+
+def mark_dispatched(session: Session, content_ids: List[int]):
+    """Record that the given content entries were just dispatched to be fetched.
+
+    Args:
+        session (~sqlalchemy.orm.Session):
+            The database session to record the dispatch in.
+        content_ids (List[int]):
+            The database IDs of the dispatched content entries.
+    """
+
+    if len(content_ids) == 0:
+        return
+
+    session.query(Content).filter(Content.id.in_(content_ids)).update(
+        {Content.dispatched_at: datetime.now()}, synchronize_session=False
+    )
+
 
-@dramatiq.actor
+@dramatiq.actor(**get_actor_options("enqueue"))
 def enqueue():
-    """Job responsible for enqueuing non-processed content to be fetched."""
+    """Job responsible for enqueuing non-processed content to be fetched.
 
+    Content dispatched within the configured ``fetch.sweep_grace`` is skipped, as
+    it was already sent on watch or is still being deferred or retried by a fetch
+    worker.
+    """
+
+    dispatched_before = datetime.now() - timedelta(
+        seconds=get_fetch_config().sweep_grace
+    )
     with db_session() as session:
-        for content in session.query(Content).filter(
-            Content.processed_at == None  # noqa
+        entries: List[Tuple[int, str]] = []
+        for content_id, content_url, content_fingerprint in session.query(
+            Content.id, Content.url, Content.fingerprint
+        ).filter(
+            Content.processed_at == None,  # noqa
+            or_(
+                Content.dispatched_at == None,  # noqa
+                Content.dispatched_at < dispatched_before,
+            ),
         ):
             log.debug(
-                f"Enqueuing content {content.url} ({content.fingerprint}) to be fetched"
+                f"Enqueuing content {content_url} ({content_fingerprint}) to be fetched"
             )
+            entries.append((content_id, content_url))
+
+        mark_dispatched(session, [content_id for content_id, _ in entries])
+
+    # dispatch only after commit so the next sweep can see the dispatch
+    send_fetch(entries)
+
 
-            fetch.send(content.id, content.url)
+def persist_content(
+    session: Session,
+    db_content: Content,
+    plugin: BasePlugin,
+    content: MeguContent,
+    store: Store,
+    checksum: str,
+    size: int,
+    staged: Union[Path, BinaryIO],
+    identifiers: Optional[List[Identifier_T]] = None,
+):
+    """Persist downloaded content to the store and record it as an artifact.
+
+    Args:
+        session (~sqlalchemy.orm.Session):
+            The database session the content entry is bound to.
+        db_content (~brut.db.Content):
+            The content entry the extracted content belongs to.
+        plugin (~megu.plugin.base.BasePlugin):
+            The plugin that extracted the content.
+        content (~megu.models.Content):
+            The extracted content that was downloaded.
+        store (~brut.store.Store):
+            The store to persist the content to.
+        checksum (str):
+            The xxhash checksum of the downloaded content.
+        size (int):
+            The size in bytes of the downloaded content.
+        staged (Union[~pathlib.Path, BinaryIO]):
+            The path or stream of the downloaded content.
+        identifiers (Optional[List[Identifier_T]], optional):
+            The preflight identifiers to record against the stored artifact.
+            Defaults to None.
+    """
+
+    existing_path = store.locate(checksum, content.filename)
+    if existing_path is not None:
+        if len(content.checksums) > 0:
+            first_checksum = content.checksums[0]
+            hash_type = HashType(first_checksum.type)
+            if (
+                store.hash_path(existing_path, {hash_type})[hash_type]
+                == first_checksum.hash
+            ):
+                log.warning(
+                    f"Skipping content since {existing_path} already exists "
+                    f"and checksum {first_checksum.hash} verified"
+                )
+                db_content.processed_message = "skipped"
+                return
+
+    mimetype = content.type or mimetypes.guess_type(content.filename)[0]
+    phash, parent_id = None, None
+    similarity_config = get_similarity_config()
+    if (
+        similarity_config is not None
+        and mimetype is not None
+        and mimetype.startswith("image/")
+    ):
+        phash = compute_hash(staged, similarity_config.hash)
+        duplicate = (
+            find_near_duplicate(session, phash, similarity_config.distance)
+            if phash is not None
+            else None
+        )
+        if duplicate is not None:
+            duplicate_id, distance = duplicate
+            log.info(
+                f"Content {content.filename} is a near-duplicate of artifact "
+                f"{duplicate_id} (distance {distance})"
+            )
+            if similarity_config.policy == POLICY_SKIP:
+                db_content.processed_message = f"near-duplicate of {duplicate_id}"
+                return
+            elif similarity_config.policy == POLICY_LINK:
+                parent_id = duplicate_id
+
+    # linked near-duplicates are recorded without persisting their file
+    path, stored_size = None, 0
+    if parent_id is None:
+        to_path = (
+            store.put(staged, checksum, content.filename)
+            if isinstance(staged, Path)
+            else store.put_io(staged, checksum, content.filename)
+        )
+        path = store.get_relative_path(checksum, content.filename).as_posix()
+        stored_size = to_path.stat().st_size
+
+    db_content.processed_message = None
+
+    db_artifact = (
+        session.query(Artifact).filter(Artifact.fingerprint == checksum).one_or_none()
+    )
+    if db_artifact is None:
+        # setup artifact in the database
+        db_artifact = Artifact(
+            created_at=datetime.now(),
+            fingerprint=checksum,
+            stored_size=stored_size,
+            size=size,
+            path=path,
+            mimetype=mimetype,
+            plugin=plugin.name,
+            phash=to_signed(phash) if phash is not None else None,
+            parent_id=parent_id,
+        )
+        db_artifact.content_id = db_content.id
+        session.add(db_artifact)
+        session.flush()
+    else:
+        log.warning(
+            f"Encountered pre-existing artifact with checksum {checksum}, "
+            "skipping adding artifact"
+        )
+
+    if identifiers:
+        record_identifiers(session, db_artifact.id, identifiers)
+
+
+def can_stage(
+    content: MeguContent,
+    plugin: BasePlugin,
+    size: Optional[int],
+    threshold: int,
+    staging_plugins: List[str],
+) -> bool:
+    """Check if some content is small enough to be staged in memory.
+
+    Staged content skips the plugin's manifest merge, so only plugins configured as
+    storing their single resource unmodified are staged.
+
+    Args:
+        content (~megu.models.Content):
+            The extracted content to download.
+        plugin (~megu.plugin.base.BasePlugin):
+            The plugin that extracted the content.
+        size (Optional[int]):
+            The expected size in bytes of the content, if known.
+        threshold (int):
+            The maximum size in bytes of staged content.
+        staging_plugins (List[str]):
+            The names of plugins whose content may be staged.
+
+    Returns:
+        bool:
+            True if the content is a single HTTP resource within the threshold from a
+            plugin allowed to stage content.
+    """
 
+    return (
+        plugin.name in staging_plugins
+        and size is not None
+        and size <= threshold
+        and len(content.resources) == 1
+        and isinstance(content.resources[0], HttpResource)
+    )
+
+
+def store_content(
+    session: Session,
+    db_content: Content,
+    plugin: BasePlugin,
+    content: MeguContent,
+    store: Store,
+    size: Optional[int] = None,
+    identifiers: Optional[List[Identifier_T]] = None,
+):
+    """Download some extracted content and persist it to the store.
+
+    Small single resource content of plugins allowed to stage content is staged in a
+    spooled temporary file which only spills to the staging directory if the content
+    grows past the staging threshold, unless a response cache is configured.
+    Any other content is downloaded resumably and merged in a temporary directory.
 
-@dramatiq.actor
+    Args:
+        session (~sqlalchemy.orm.Session):
+            The database session the content entry is bound to.
+        db_content (~brut.db.Content):
+            The content entry the extracted content belongs to.
+        plugin (~megu.plugin.base.BasePlugin):
+            The plugin that extracted the content.
+        content (~megu.models.Content):
+            The extracted content to download.
+        store (~brut.store.Store):
+            The store to persist the content to.
+        size (Optional[int], optional):
+            The expected size in bytes of the content, if known.
+            Defaults to None.
+        identifiers (Optional[List[Identifier_T]], optional):
+            The preflight identifiers to record against the stored artifact.
+            Defaults to None.
+    """
+
+    fetch_config = get_fetch_config()
+    staging_threshold = parse_size(fetch_config.staging_threshold)
+    cache = get_response_cache()
+    # staged content is neither revalidated with nor written to the response cache
+    if cache is None and can_stage(
+        content, plugin, size, staging_threshold, fetch_config.staging_plugins or []
+    ):
+        with SpooledTemporaryFile(
+            max_size=staging_threshold,
+            prefix=TEMPORARY_PREFIX,
+            dir=fetch_config.staging_dir,
+        ) as staged_io:
+            checksum, size = stage_resource(content.resources[0], staged_io)
+            persist_content(
+                session,
+                db_content,
+                plugin,
+                content,
+                store,
+                checksum,
+                size,
+                staged_io,  # type: ignore
+                identifiers=identifiers,
+            )
+        return
+
+    partial_dirpath = get_partial_dirpath()
+    manifest = download_content(
+        db_content.id,
+        content,
+        plugin,
+        partial_dirpath,
+        cache=cache,
+    )
+    if manifest is None:
+        downloader = get_downloader(content)
+        manifest = downloader.download_content(content)
+
+    with temporary_directory(TEMPORARY_PREFIX) as temp_dir:
+        temp_path = temp_dir / content.filename
+        merge_manifest(plugin, manifest, temp_path)
+
+        checksum = hash_file(temp_path, {HashType.XXHASH})[HashType.XXHASH]
+        persist_content(
+            session,
+            db_content,
+            plugin,
+            content,
+            store,
+            checksum,
+            temp_path.stat().st_size,
+            temp_path,
+            identifiers=identifiers,
+        )
+        remove_partials(db_content.id, content.url, partial_dirpath)
+
+
+def fetch_content(session: Session, db_content: Content):
+    """Evaluate and fetch a single content entry to persist it to the store.
+
+    Errors encountered while downloading or storing the content are recorded in the
+    content's ``processed_message``.
+    Transient network errors and any other errors are raised to the caller so the
+    content can be retried, resuming any partial downloads.
+
+    Args:
+        session (~sqlalchemy.orm.Session):
+            The database session the content entry is bound to.
+        db_content (~brut.db.Content):
+            The content entry that needs to be evaluated.
+
+    Raises:
+        ~brut.capacity.AdmissionDeferred:
+            If the store does not have the capacity to fetch the content right now.
+    """
+
+    url = db_content.url
+    db_content.processed_at = datetime.now()
+    plugin = get_plugin(url)
+    if not plugin or isinstance(plugin, GenericPlugin):
+        db_content.processed_message = "unhandled"
+        return
+
+    store = get_store()
+    preflight = get_fetch_config().preflight
+    try:
+        for content in best_content(iter_content(url, plugin)):
+            probe = probe_content(content, remote=preflight)
+            db_artifact = find_archived(session, probe.identifiers, store)
+            if db_artifact is not None:
+                log.info(
+                    f"Skipping download of {content.url} as it matches archived "
+                    f"artifact {db_artifact.id}"
+                )
+                db_content.processed_message = f"duplicate of {db_artifact.id}"
+                continue
+
+            with (
+                reservation(db_content.id, content, store, size=probe.size)
+                if config.capacity is not None
+                else nullcontext()
+            ):
+                store_content(
+                    session,
+                    db_content,
+                    plugin,
+                    content,
+                    store,
+                    size=probe.size,
+                    identifiers=probe.identifiers,
+                )
+
+    except AdmissionDeferred:
+        raise
+    except TRANSIENT_ERRORS as exc:
+        # leave the content unprocessed so the retry resumes the partial download
+        log.warning(f"Transient error while fetching content {db_content.id}, {exc}")
+        raise
+    except Exception as exc:
+        log.exception(str(exc))
+        db_content.processed_message = str(exc)
+
+
+def get_defer_delay() -> int:
+    """Get the delay in milliseconds before a deferred fetch is attempted again.
+
+    Returns:
+        int:
+            The delay in milliseconds.
+    """
+
+    return get_capacity_config().retry_delay * 1000
+
+
+def get_retry_delay(retries: int) -> int:
+    """Get the delay in milliseconds before a transiently failed fetch is retried.
+
+    >>> from brut.tasks import get_retry_delay
+    >>> [get_retry_delay(retries) for retries in range(3)]
+    [15000, 30000, 60000]
+
+    Args:
+        retries (int):
+            The number of times the fetch has already been retried.
+
+    Returns:
+        int:
+            The delay in milliseconds.
+    """
+
+    return TRANSIENT_BACKOFF * 2 ** retries
+
+
+@dramatiq.actor(**get_actor_options("fetch"))
 def fetch(content_id: int, url: str):
     """Evaluate and fetch content to persist it to the store.
 
@@ -104,76 +751,232 @@ def fetch(content_id: int, url: str):
             log.error(f"Could not find content {content_id} in the database")
             return
 
-        db_content.processed_at = datetime.now()
-        plugin = get_plugin(url)
-        if not plugin or isinstance(plugin, GenericPlugin):
-            db_content.processed_message = "unhandled"
+        if db_content.processed_at is not None:
+            log.debug(f"Skipping content {content_id} as it was already processed")
             return
 
-        store_path = Path(config.store)
-        if not store_path.is_dir():
-            log.info(f"Creating store directory at {store_path}")
-            store_path.mkdir()
-
         try:
-            for content in best_content(iter_content(url, plugin)):
-                downloader = get_downloader(content)
-                manifest = downloader.download_content(content)
-
-                with temporary_directory("brut") as temp_dir:
-                    temp_path = temp_dir / content.filename
-                    merge_manifest(plugin, manifest, temp_path)
-
-                    checksum = hash_file(temp_path, {HashType.XXHASH})[HashType.XXHASH]
-                    fragment_path = Path(checksum[0]) / Path(checksum[1:3])
-
-                    to_path = store_path / fragment_path / content.filename
-                    if to_path.exists():
-                        if len(content.checksums) > 0:
-                            first_checksum = content.checksums[0]
-                            hash_type = HashType(first_checksum.type)
-                            if (
-                                hash_file(to_path, {hash_type})[hash_type]
-                                == first_checksum.hash
-                            ):
-                                log.warning(
-                                    f"Skipping content since {to_path} already exists "
-                                    f"and checksum {first_checksum.hash} verified"
-                                )
-                                db_content.processed_message = "skipped"
-                                continue
-
-                    if not to_path.parent.is_dir():
-                        log.info(
-                            f"Creating store fragment directory at {to_path.parent}"
-                        )
-                        to_path.parent.mkdir(parents=True)
-
-                    log.debug(
-                        f"Copying downloaded content at {temp_path!s} to {to_path!s}"
-                    )
-                    shutil.copy(temp_path, to_path)
-
-                    db_content.processed_message = None
-
-                    if not session.query(
-                        session.query(Artifact)
-                        .filter(Artifact.fingerprint == checksum)
-                        .exists()
-                    ).scalar():
-                        # setup artifact in the database
-                        db_artifact = Artifact(
-                            created_at=datetime.now(),
-                            fingerprint=checksum,
-                        )
-                        db_artifact.content_id = content_id
-                        session.add(db_artifact)
-                    else:
-                        log.warning(
-                            "Encountered pre-existing artifact with checksum ",
-                            f"{checksum}, skipping adding artifact",
-                        )
+            fetch_content(session, db_content)
+        except AdmissionDeferred as exc:
+            log.warning(f"Deferring fetch of content {content_id}, {exc}")
+            session.rollback()
+            mark_dispatched(session, [content_id])
+            fetch.send_with_options(args=(content_id, url), delay=get_defer_delay())
 
-        except Exception as exc:
-            log.exception(str(exc))
-            db_content.processed_message = str(exc)
+
+def retry_batch(deferred_ids: List[int], failed_ids: List[int], retries: int):
+    """Send the deferred and transiently failed content of a batch again.
+
+    Args:
+        deferred_ids (List[int]):
+            The database IDs of the content deferred for lack of store capacity.
+        failed_ids (List[int]):
+            The database IDs of the content that failed with a transient error.
+        retries (int):
+            The number of times the batch has already been retried.
+    """
+
+    if len(deferred_ids) > 0:
+        fetch_batch.send_with_options(
+            args=(deferred_ids, retries), delay=get_defer_delay()
+        )
+
+    if len(failed_ids) == 0:
+        return
+
+    if retries >= TRANSIENT_RETRIES:
+        log.error(
+            f"Giving up on content {failed_ids!r} after {retries} retries, "
+            "leaving it for the next enqueue"
+        )
+        return
+
+    fetch_batch.send_with_options(
+        args=(failed_ids, retries + 1), delay=get_retry_delay(retries)
+    )
+
+
+@dramatiq.actor(**get_actor_options("fetch"))
+def fetch_batch(content_ids: List[int], retries: int = 0):
+    """Evaluate and fetch many content entries within a single database session.
+
+    Depending on the configured ``fetch.commit`` mode, changes are either committed
+    after each content entry (``item``) or once for the entire batch (``batch``).
+    In both modes, a failure for one content entry only rolls back the changes for
+    that entry, leaving it unprocessed so it is picked up by the next enqueue.
+    Content entries failing with a transient error are sent again as a new batch
+    after a backoff, up to :attr:`~TRANSIENT_RETRIES` times.
+
+    Args:
+        content_ids (List[int]):
+            The database IDs of the content that needs to be evaluated.
+        retries (int, optional):
+            The number of times the content has already been retried.
+            Defaults to 0.
+    """
+
+    commit_batch = get_fetch_config().commit == "batch"
+    with db_session() as session:
+        db_contents = (
+            session.query(Content)
+            .filter(Content.id.in_(content_ids))
+            .order_by(Content.id)
+            .all()
+        )
+
+        missing_ids = set(content_ids) - {db_content.id for db_content in db_contents}
+        for content_id in sorted(missing_ids):
+            log.error(f"Could not find content {content_id} in the database")
+
+        deferred_ids: List[int] = []
+        failed_ids: List[int] = []
+        for db_content in db_contents:
+            if len(deferred_ids) > 0:
+                # the store is already out of capacity, defer the rest of the batch
+                deferred_ids.append(db_content.id)
+                continue
+
+            if db_content.processed_at is not None:
+                log.debug(
+                    f"Skipping content {db_content.id} as it was already processed"
+                )
+                continue
+
+            log.debug(f"Fetching content {db_content.id} from batch {content_ids!r}")
+            try:
+                if commit_batch:
+                    with session.begin_nested():
+                        fetch_content(session, db_content)
+                else:
+                    fetch_content(session, db_content)
+                    session.commit()
+            except AdmissionDeferred as exc:
+                log.warning(f"Deferring fetch of content {db_content.id}, {exc}")
+                deferred_ids.append(db_content.id)
+                if not commit_batch:
+                    session.rollback()
+            except TRANSIENT_ERRORS as exc:
+                log.warning(
+                    f"Transient error while fetching content {db_content.id} "
+                    f"from batch, {exc}"
+                )
+                failed_ids.append(db_content.id)
+                if not commit_batch:
+                    session.rollback()
+            except Exception as exc:
+                log.exception(
+                    f"Failed to fetch content {db_content.id} from batch, {exc}"
+                )
+                if not commit_batch:
+                    session.rollback()
+
+        mark_dispatched(
+            session,
+            deferred_ids + (failed_ids if retries < TRANSIENT_RETRIES else []),
+        )
+
+    retry_batch(deferred_ids, failed_ids, retries)
+
+
+def tier_artifact(
+    store: Store,
+    tiering_config: TieringConfig,
+    cutoff: float,
+    frame_size: int,
+    db_artifact: Artifact,
+):
+    """Compress a single hot artifact if it was not accessed since the cutoff.
+
+    Args:
+        store (~brut.store.Store):
+            The store containing the artifact.
+        tiering_config (~brut.config.TieringConfig):
+            The tiering configuration to compress the artifact with.
+        cutoff (float):
+            The timestamp the artifact must not have been accessed after.
+        frame_size (int):
+            The size of independently compressed frames in bytes.
+        db_artifact (~brut.db.Artifact):
+            The catalog entry of the artifact whose tier is updated.
+    """
+
+    path = store.locate(db_artifact.fingerprint, Path(db_artifact.path).name)
+    if path is None:
+        return
+
+    if path.suffix == COMPRESSED_SUFFIX:
+        # compressed by a previous run that failed to record the new tier
+        db_artifact.tier = TIER_COMPRESSED
+        db_artifact.stored_size = path.stat().st_size
+        return
+
+    stat = path.stat()
+    if max(stat.st_atime, stat.st_mtime) > cutoff:
+        return
+
+    compressed_size = store.compress(
+        path,
+        level=tiering_config.level,
+        frame_size=frame_size,
+        max_ratio=tiering_config.max_ratio,
+    )
+    if compressed_size is None:
+        db_artifact.tier = TIER_RAW
+        db_artifact.stored_size = stat.st_size
+    else:
+        log.info(
+            f"Compressed artifact {path} from {stat.st_size} to "
+            f"{compressed_size} bytes"
+        )
+        db_artifact.tier = TIER_COMPRESSED
+        db_artifact.stored_size = compressed_size
+
+
+@dramatiq.actor(**get_actor_options("maintenance"))
+def tier():
+    """Job responsible for compressing artifacts that have not been accessed recently.
+
+    Artifacts that do not compress below the configured ratio are left uncompressed
+    and marked as raw so they are not attempted again. The tier of artifacts is
+    committed every ``tiering.batch_size`` artifacts so an interrupted run keeps
+    its progress.
+    """
+
+    tiering_config = config.tiering
+    if tiering_config is None:
+        log.warning("Skipping tiering as no tiering is configured")
+        return
+
+    store = get_store()
+    cutoff = time.time() - tiering_config.age * 86400
+    frame_size = parse_size(tiering_config.frame_size)
+    batch_size = max(tiering_config.batch_size, 1)
+    last_id = 0
+    with db_session() as session:
+        while True:
+            db_artifacts = (
+                session.query(Artifact)
+                .filter(
+                    Artifact.tier == TIER_HOT,
+                    Artifact.path != None,  # noqa
+                    Artifact.id > last_id,
+                )
+                .order_by(Artifact.id)
+                .limit(batch_size)
+                .all()
+            )
+            if len(db_artifacts) == 0:
+                break
+
+            for db_artifact in db_artifacts:
+                tier_artifact(store, tiering_config, cutoff, frame_size, db_artifact)
+
+            last_id = db_artifacts[-1].id
+            session.commit()
+
+
+@dramatiq.actor(**get_actor_options("maintenance"))
+def collect():
+    """Job responsible for collecting orphaned files in the store."""
+
+    collect_garbage()
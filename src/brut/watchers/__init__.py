@@ -2,16 +2,182 @@
 # Copyright (c) 2021 Stephen Bunn <stephen@bunn.io>
 # ISC License <https://choosealicense.com/licenses/isc>
 
-"""Contains watchers and helper methods to get desired watchers."""
+"""Contains watchers and helper methods to get desired watchers.
 
-from itertools import groupby
-from typing import Optional, Type
+Watchers are discovered from the ``brut.watchers`` entry point group, where each
+entry point is named after the watcher type it provides, for example:
+
+.. code-block:: toml
+    [tool.poetry.plugins."brut.watchers"]
+    subreddit = "brut.watchers.reddit:SubredditWatcher"
+
+The builtin watchers are always available, even if the package metadata isn't
+installed.
+Watcher modules are only imported once a watcher of their type is first requested, so
+third-party watchers don't add their import cost to every worker.
+
+Attributes:
+    ENTRY_POINT_GROUP (str):
+        The entry point group watchers are discovered from.
+"""
+
+from importlib import import_module
+from importlib.metadata import entry_points
+from inspect import isclass
+from threading import Lock
+from typing import Any, Dict, Optional, Type
 
 from ..log import instance as log
 from .base import BaseWatcher
-from .reddit import SubredditWatcher
 
-ALL_WATCHERS = [SubredditWatcher]
+ENTRY_POINT_GROUP = "brut.watchers"
+
+# the import path of each builtin watcher by its type
+BUILTIN_WATCHERS: Dict[str, str] = {
+    "feed": "brut.watchers.feed:FeedWatcher",
+    "subreddit": "brut.watchers.reddit:SubredditWatcher",
+    "multireddit": "brut.watchers.reddit:MultiredditWatcher",
+}
+
+
+def load_watcher(path: str) -> Type[BaseWatcher]:
+    """Import a watcher class from its import path.
+
+    Args:
+        path (str):
+            The import path of the watcher in the form ``module:class``.
+
+    Returns:
+        Type[BaseWatcher]:
+            The class of the watcher.
+    """
+
+    module_name, class_name = path.split(":", 1)
+    log.debug(f"Importing watcher {class_name!r} from {module_name!r}")
+    return getattr(import_module(module_name), class_name)
+
+
+class WatcherRegistry:
+    """A registry of watchers by their type that only imports a watcher when used."""
+
+    def __init__(self, group: str, builtin: Dict[str, str]):
+        """Initialize the registry.
+
+        Args:
+            group (str):
+                The entry point group to discover watchers from.
+            builtin (Dict[str, str]):
+                The import path of each builtin watcher by its type.
+        """
+
+        self.group = group
+        self.builtin = builtin
+        self.paths: Optional[Dict[str, str]] = None
+        self.watchers: Dict[str, Optional[Type[BaseWatcher]]] = {}
+        self.lock = Lock()
+
+    def discover(self) -> Dict[str, str]:
+        """Discover the import path of each available watcher by its type.
+
+        If many watchers provide the same type, the builtin or first discovered
+        watcher is used.
+
+        Returns:
+            Dict[str, str]:
+                The import path of each available watcher by its type.
+        """
+
+        paths = {type.lower(): path for type, path in self.builtin.items()}
+
+        discovered = entry_points()
+        if hasattr(discovered, "select"):
+            group = discovered.select(group=self.group)
+        else:
+            group = discovered.get(self.group, [])  # type: ignore
+
+        for entry_point in group:
+            type = entry_point.name.lower()
+            existing = paths.get(type)
+            if existing is None:
+                paths[type] = entry_point.value
+            elif existing != entry_point.value:
+                log.warning(
+                    f"Watcher type {type!r} has many matches "
+                    f"{[existing, entry_point.value]!r}, using {existing!r}"
+                )
+
+        log.debug(f"Discovered watchers {paths!r}")
+        return paths
+
+    def get_paths(self) -> Dict[str, str]:
+        """Get the import path of each available watcher, discovering them once.
+
+        Returns:
+            Dict[str, str]:
+                The import path of each available watcher by its type.
+        """
+
+        if self.paths is None:
+            with self.lock:
+                if self.paths is None:
+                    self.paths = self.discover()
+
+        return self.paths
+
+    def load(self, type: str, path: str) -> Optional[Type[BaseWatcher]]:
+        """Import the watcher of a given type.
+
+        Args:
+            type (str):
+                The type of the watcher.
+            path (str):
+                The import path of the watcher.
+
+        Returns:
+            Optional[Type[BaseWatcher]]:
+                The class of the watcher, or None if it can't be imported.
+        """
+
+        try:
+            watcher = load_watcher(path)
+        except (ImportError, AttributeError, ValueError) as exc:
+            log.error(f"Failed to import watcher {path!r} for type {type!r}, {exc}")
+            return None
+
+        if not isclass(watcher) or not issubclass(watcher, BaseWatcher):
+            log.error(f"Watcher {path!r} for type {type!r} is not a watcher")
+            return None
+
+        return watcher
+
+    def get(self, type: str) -> Optional[Type[BaseWatcher]]:
+        """Get the watcher of a given type, importing it on first use.
+
+        Args:
+            type (str):
+                The type of the watcher.
+
+        Returns:
+            Optional[Type[BaseWatcher]]:
+                The class of the watcher, if available.
+        """
+
+        type = type.lower()
+        if type in self.watchers:
+            return self.watchers[type]
+
+        path = self.get_paths().get(type)
+        if path is None:
+            return None
+
+        with self.lock:
+            if type not in self.watchers:
+                self.watchers[type] = self.load(type, path)
+
+        return self.watchers[type]
+
+
+registry = WatcherRegistry(ENTRY_POINT_GROUP, BUILTIN_WATCHERS)
 
 
 def get_watcher(type: str) -> Optional[Type[BaseWatcher]]:
@@ -26,21 +192,30 @@ def get_watcher(type: str) -> Optional[Type[BaseWatcher]]:
             The class of the desired watcher, if discovered.
     """
 
-    type = type.lower()
-    for watcher_type, watcher_iterator in groupby(ALL_WATCHERS, key=lambda w: w.type):
-        if watcher_type.lower() != type:
-            continue
-        else:
-            watchers = list(watcher_iterator)
-            if len(watchers) > 1:
-                log.warning(
-                    f"Watcher type {type!r} has many matches {watchers!r}, "
-                    "using the first one"
-                )
+    return registry.get(type)
+
+
+def __getattr__(name: str) -> Any:
+    """Lazily import the builtin watcher classes exported by this module.
+
+    Args:
+        name (str):
+            The name of the exported watcher class.
+
+    Raises:
+        AttributeError:
+            If the name is not an exported watcher class.
+
+    Returns:
+        Any:
+            The watcher class.
+    """
 
-            return watchers[0]
+    for path in BUILTIN_WATCHERS.values():
+        if path.endswith(f":{name}"):
+            return load_watcher(path)
 
-    return None
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 
-__all__ = ["SubredditWatcher"]
+__all__ = ["FeedWatcher", "MultiredditWatcher", "SubredditWatcher"]
@@ -5,13 +5,39 @@
 """Contains abstractions for other watchers."""
 
 import abc
-from typing import Generator
+import asyncio
+from contextlib import suppress
+from typing import AsyncGenerator, Generator, Optional
 
 from ..db import Content
 
 
 class BaseWatcher(abc.ABC):
-    """The abstract base watcher class that concrete watcher classes should extend."""
+    """The abstract base watcher class that concrete watcher classes should extend.
+
+    Watchers that poll a rate-limited API should set :attr:`~rate_limited` so their
+    polls are paced by the scheduler to fit within the tracked API quota.
+
+    Paginated watchers should set :attr:`~cursor` when :meth:`~iter_content` reaches
+    the end of a full page, and accept it as the ``after`` keyword argument to
+    continue from the following page.
+    If every entry of a full page is new, a follow-up poll is sent for the following
+    page immediately.
+
+    Watchers keeping state between polls, such as high-water marks, should only
+    collect the new state while iterating and persist it in :meth:`~save_state`,
+    which is called once the polled content has been committed, so content that
+    failed to be committed is polled again.
+
+    Watchers polling with an async client may override :meth:`~aiter_content` so
+    many watches can be polled concurrently from a single worker, otherwise the
+    synchronous :meth:`~iter_content` is run in a thread.
+    The builtin watchers are all synchronous, so each of their polls occupies a
+    thread until it completes.
+    """
+
+    rate_limited: bool = False
+    cursor: Optional[str] = None
 
     @abc.abstractproperty
     def type(self) -> str:
@@ -47,3 +73,34 @@ class BaseWatcher(abc.ABC):
         """
 
         raise NotImplementedError()
+
+    def save_state(self):
+        """Persist the state collected by the last poll once its content is committed.
+
+        By default, watchers keep no state between polls.
+        """
+
+    async def aiter_content(self, *args, **kwargs) -> AsyncGenerator[Content, None]:
+        """Asynchronously iterate over the available content from this watcher.
+
+        By default, this steps through :meth:`~iter_content` in a worker thread so
+        synchronous watchers never block the event loop.
+
+        Yields:
+            ~brut.db.Content: The discovered content from the watcher.
+        """
+
+        # StopIteration can't be raised through a future, so a sentinel ends the loop
+        sentinel = object()
+        iterator = self.iter_content(*args, **kwargs)
+        try:
+            while True:
+                content = await asyncio.to_thread(next, iterator, sentinel)
+                if content is sentinel:
+                    break
+
+                yield content  # type: ignore
+        finally:
+            # a cancelled poll may still be stepping the iterator in its thread
+            with suppress(ValueError):
+                iterator.close()
@@ -0,0 +1,388 @@
+# -*- encoding: utf-8 -*-
+# Copyright (c) 2021 Stephen Bunn <stephen@bunn.io>
+# ISC License <https://choosealicense.com/licenses/isc>
+
+"""Contains RSS and Atom feed based watchers.
+
+The ``ETag`` and ``Last-Modified`` validators of each feed are kept in Redis and sent
+back as a conditional request, so a feed that hasn't changed since the last poll is
+answered with an empty ``304 Not Modified`` response instead of the whole document.
+
+Feeds are parsed incrementally while they are downloaded, and each entry is released
+once it has been yielded, so large feeds are never held in memory as a whole tree.
+The publish time of the newest seen entry is kept as the feed's high-water mark, and
+entries published before it are skipped.
+Entries published at the mark itself are yielded again, as a new entry may share the
+publish time of the newest seen entry, and are deduplicated by their fingerprint.
+
+Attributes:
+    FEED_KEY (str):
+        The prefix of the Redis hash keeping the state of each feed.
+    REQUEST_TIMEOUT (float):
+        The timeout in seconds for connecting to and reading from a feed.
+    CHUNK_SIZE (int):
+        The number of bytes of the feed fed to the parser at once.
+"""
+
+import json
+import os
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from hashlib import sha1
+from threading import Lock
+from typing import Dict, Generator, List, Optional, Tuple, Union
+from xml.etree.ElementTree import Element, ParseError, XMLPullParser
+
+import requests
+
+from ..constants import APP_NAME, APP_VERSION
+from ..db import Content
+from ..log import instance as log
+from ..state import build_key, get_redis
+from .base import BaseWatcher
+
+SOURCE = "feed"
+FEED_KEY = build_key("feed")
+REQUEST_TIMEOUT = 30.0
+CHUNK_SIZE = 16384
+
+# local names of the elements describing a single entry in RSS and Atom feeds
+ENTRY_TAGS = {"item", "entry"}
+
+_sessions: Dict[int, requests.Session] = {}
+_sessions_lock = Lock()
+
+
+def get_session() -> requests.Session:
+    """Get the HTTP session shared by the current process.
+
+    Returns:
+        ~requests.Session: The HTTP session for requesting feeds.
+    """
+
+    pid = os.getpid()
+    session = _sessions.get(pid)
+    if session is not None:
+        return session
+
+    with _sessions_lock:
+        if pid not in _sessions:
+            log.info(f"Building feed HTTP session for process {pid}")
+            session = requests.Session()
+            session.headers["User-Agent"] = f"{APP_NAME}/{APP_VERSION}"
+            _sessions[pid] = session
+
+        return _sessions[pid]
+
+
+def reset_sessions():
+    """Drop the HTTP sessions inherited from a parent process."""
+
+    global _sessions_lock
+
+    _sessions.clear()
+    _sessions_lock = Lock()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=reset_sessions)
+
+
+def get_local_name(tag: str) -> str:
+    """Get the local name of a possibly namespaced element tag.
+
+    >>> from brut.watchers.feed import get_local_name
+    >>> get_local_name("{http://www.w3.org/2005/Atom}entry")
+    'entry'
+
+    Args:
+        tag (str):
+            The tag of the element.
+
+    Returns:
+        str:
+            The tag without its namespace.
+    """
+
+    return tag.rsplit("}", 1)[-1]
+
+
+def parse_date(value: Optional[str]) -> Optional[datetime]:
+    """Parse the RFC 822 or ISO 8601 date of a feed entry.
+
+    Dates without a timezone are assumed to be UTC.
+
+    >>> from brut.watchers.feed import parse_date
+    >>> parse_date("Tue, 10 Jun 2003 04:00:00 GMT").isoformat()
+    '2003-06-10T04:00:00+00:00'
+    >>> parse_date("2003-12-13T18:30:02Z").isoformat()
+    '2003-12-13T18:30:02+00:00'
+
+    Args:
+        value (Optional[str]):
+            The date of the entry.
+
+    Returns:
+        Optional[datetime]:
+            The timezone aware date, or None if the date can't be parsed.
+    """
+
+    if not value:
+        return None
+
+    value = value.strip()
+    try:
+        parsed = parsedate_to_datetime(value)
+    except (TypeError, ValueError, IndexError):
+        try:
+            parsed = datetime.fromisoformat(value.replace("Z", "+00:00"))
+        except ValueError:
+            return None
+
+    return parsed if parsed.tzinfo is not None else parsed.replace(tzinfo=timezone.utc)
+
+
+class FeedWatcher(BaseWatcher):
+    """The RSS and Atom feed watcher.
+
+    Watches for new entries from a given feed URL.
+    """
+
+    type: str = "feed"
+
+    def __init__(self):
+        """Initialize the watcher without any feed state to persist."""
+
+        self.pending_state: Optional[Tuple[str, Dict[str, Union[str, float]]]] = None
+
+    def get_key(self, url: str) -> str:
+        """Get the Redis key keeping the state of a feed.
+
+        Args:
+            url (str):
+                The URL of the feed.
+
+        Returns:
+            str:
+                The Redis key of the feed.
+        """
+
+        return f"{FEED_KEY}:{sha1(url.encode('utf-8')).hexdigest()}"
+
+    def get_state(self, url: str) -> Dict[str, str]:
+        """Get the validators and high-water mark of a feed.
+
+        Args:
+            url (str):
+                The URL of the feed.
+
+        Returns:
+            Dict[str, str]:
+                The ``etag``, ``last_modified``, and ``high_water`` of the feed, if
+                the feed has been polled before.
+        """
+
+        return {
+            key.decode("utf-8"): value.decode("utf-8")
+            for key, value in get_redis().hgetall(self.get_key(url)).items()
+        }
+
+    def iter_entries(
+        self, response: requests.Response
+    ) -> Generator[Dict[str, Optional[str]], None, None]:
+        """Incrementally parse the entries of a feed as it is downloaded.
+
+        Args:
+            response (~requests.Response):
+                The streamed response of the feed.
+
+        Yields:
+            Dict[str, Optional[str]]:
+                The ``id``, ``link``, ``title``, and ``published`` of an entry.
+        """
+
+        parser = XMLPullParser(events=("start", "end"))
+        parents: List[Element] = []
+        for chunk in response.iter_content(CHUNK_SIZE):
+            parser.feed(chunk)
+            for event, element in parser.read_events():
+                if event == "start":
+                    parents.append(element)
+                    continue
+
+                parents.pop()
+                if get_local_name(element.tag) not in ENTRY_TAGS:
+                    continue
+
+                yield self.parse_entry(element)
+
+                # release the entry so the tree never grows past a single entry
+                element.clear()
+                if len(parents) > 0:
+                    parents[-1].remove(element)
+
+        parser.close()
+
+    def parse_entry(self, element: Element) -> Dict[str, Optional[str]]:
+        """Parse a single RSS item or Atom entry.
+
+        Args:
+            element (~xml.etree.ElementTree.Element):
+                The element of the entry.
+
+        Returns:
+            Dict[str, Optional[str]]:
+                The ``id``, ``link``, ``title``, and ``published`` of the entry.
+        """
+
+        entry: Dict[str, Optional[str]] = {}
+        for child in element:
+            name = get_local_name(child.tag)
+            text = child.text.strip() if child.text else None
+            if name == "link":
+                # atom links are given as attributes, only the alternate is the entry
+                if child.get("href") is not None:
+                    if child.get("rel", "alternate") == "alternate":
+                        entry["link"] = child.get("href")
+                elif text:
+                    entry["link"] = text
+            elif name in ("guid", "id"):
+                entry["id"] = text
+            elif name == "title":
+                entry["title"] = text
+            elif name in ("pubDate", "published", "updated", "date"):
+                # prefer the original publish time over the last update time
+                if name != "updated" or "published" not in entry:
+                    entry["published"] = text
+
+        return entry
+
+    def iter_content(self, url: str) -> Generator[Content, None, None]:  # type: ignore
+        """Iterate over the new entries of a given feed to produce content entries.
+
+        The feed's validators and high-water mark are only collected once the whole
+        feed has been iterated, and are persisted by :meth:`~save_state` once the
+        content has been committed, so an interrupted poll is retried in full.
+
+        Args:
+            url (str):
+                The URL of the feed to iterate over new content.
+
+        Yields:
+            ~brut.db.Content:
+                The extracted content from the feed.
+        """
+
+        state = self.get_state(url)
+        headers = {}
+        if "etag" in state:
+            headers["If-None-Match"] = state["etag"]
+        if "last_modified" in state:
+            headers["If-Modified-Since"] = state["last_modified"]
+
+        high_water = float(state.get("high_water", 0))
+        newest = high_water
+        count = 0
+
+        log.debug(f"Requesting feed {url!r} with validators {headers!r}")
+        with get_session().get(
+            url, headers=headers, stream=True, timeout=REQUEST_TIMEOUT
+        ) as response:
+            if response.status_code == 304:
+                log.debug(f"Feed {url!r} has not been modified")
+                return
+
+            response.raise_for_status()
+            try:
+                for entry in self.iter_entries(response):
+                    link = entry.get("link")
+                    if not link:
+                        continue
+
+                    published = parse_date(entry.get("published"))
+                    timestamp = published.timestamp() if published else None
+                    if timestamp is not None:
+                        # feeds aren't always sorted, so older entries don't end it
+                        if timestamp < high_water:
+                            continue
+
+                        newest = max(newest, timestamp)
+
+                    count += 1
+                    yield self.build_content(url, link, entry, published)
+            except ParseError as exc:
+                log.error(f"Failed to parse feed {url!r}, {exc}")
+                return
+
+            validators = {
+                "etag": response.headers.get("ETag"),
+                "last_modified": response.headers.get("Last-Modified"),
+            }
+
+        log.debug(f"Found {count} new entries from feed {url!r}")
+        self.pending_state = (
+            self.get_key(url),
+            {
+                "high_water": newest,
+                **{name: value for name, value in validators.items() if value},
+            },
+        )
+
+    def save_state(self):
+        """Persist the validators and high-water mark of the last poll."""
+
+        if self.pending_state is None:
+            return
+
+        key, mapping = self.pending_state
+        pipeline = get_redis().pipeline()
+        pipeline.hdel(key, "etag", "last_modified")
+        pipeline.hset(key, mapping=mapping)
+        pipeline.execute()
+        self.pending_state = None
+
+    def build_content(
+        self,
+        url: str,
+        link: str,
+        entry: Dict[str, Optional[str]],
+        published: Optional[datetime],
+    ) -> Content:
+        """Build the content entry for a given feed entry.
+
+        Args:
+            url (str):
+                The URL of the feed the entry was published to.
+            link (str):
+                The link of the entry.
+            entry (Dict[str, Optional[str]]):
+                The parsed feed entry.
+            published (Optional[datetime]):
+                The publish time of the entry, if known.
+
+        Returns:
+            ~brut.db.Content:
+                The extracted content of the feed entry.
+        """
+
+        log.debug(f"Building content entry for {link!r} from feed {url!r}")
+
+        return Content(
+            created_at=(
+                published.astimezone().replace(tzinfo=None)
+                if published
+                else datetime.now()
+            ),
+            source=SOURCE,
+            source_id=entry.get("id") or link,
+            fingerprint=Content.build_fingerprint(link),
+            url=link,
+            data=json.dumps(
+                {
+                    "feed": url,
+                    "id": entry.get("id"),
+                    "title": entry.get("title"),
+                    "published": published.isoformat() if published else None,
+                }
+            ),
+        )
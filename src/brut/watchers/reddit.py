@@ -2,56 +2,101 @@
 # Copyright (c) 2021 Stephen Bunn <stephen@bunn.io>
 # ISC License <https://choosealicense.com/licenses/isc>
 
-"""Contains Reddit.com based watchers."""
+"""Contains Reddit.com based watchers.
+
+PRAW is not thread-safe, so each poll checks out an authenticated Reddit client from a
+per-process pool and returns it once the poll is done.
+Consecutive polls reuse the pooled clients' tokens and keep-alive HTTP sessions while
+concurrent polls never share a client.
+The pool is keyed by process ID and is cleared in forked children, as sockets and
+locks inherited from the parent can't be safely reused.
+
+Attributes:
+    SUBREDDIT_CACHE_SIZE (int):
+        The maximum number of subreddit instances cached per client.
+    POOL_SIZE (int):
+        The maximum number of pooled connections kept for the Reddit API.
+    PAGE_SIZE (int):
+        The number of submissions requested per listing page.
+    HIGH_WATER_KEY (str):
+        The Redis hash of the newest seen submission time of grouped subreddits.
+    HIGH_WATER_MARGIN (int):
+        The seconds below the high-water marks that submissions are still polled.
+"""
 
 import json
+import os
+from collections import OrderedDict, defaultdict
+from contextlib import contextmanager
 from datetime import datetime
-from functools import lru_cache
-from typing import Generator
+from threading import Lock
+from typing import Dict, Generator, List, Optional
 
-from cached_property import cached_property
+import requests
 from praw import Reddit
 from praw.models import Submission, Subreddit
+from requests.adapters import HTTPAdapter
 
 from ..config import instance as config
 from ..db import Content
 from ..log import instance as log
+from ..quota import record_response
+from ..state import build_key, get_redis
 from .base import BaseWatcher
 
 SOURCE = "reddit"
+SUBREDDIT_CACHE_SIZE = 1024
+POOL_SIZE = 4
+PAGE_SIZE = 100
+HIGH_WATER_KEY = build_key("reddit", "high-water")
+HIGH_WATER_MARGIN = 600
 
+_clients: Dict[int, List["RedditClient"]] = {}
+_clients_lock = Lock()
 
-class SubredditWatcher(BaseWatcher):
-    """The Reddit subreddit watcher.
 
-    Watches for new content from a given Reddit subreddit.
+def build_reddit() -> Reddit:
+    """Build a new read-only Reddit client with a pooled HTTP session.
+
+    Returns:
+        ~praw.Reddit: The PRAW Reddit instance.
     """
 
-    type: str = "subreddit"
+    log.info(
+        "Building read-only Reddit instance using client "
+        f"{config.watchers.reddit.client_id!r} for process {os.getpid()}"
+    )
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=POOL_SIZE, pool_maxsize=POOL_SIZE)
+    session.mount("https://", adapter)
+    session.hooks["response"].append(record_response)
 
-    @cached_property
-    def reddit(self) -> Reddit:
-        """Read-only Reddit connection client.
+    reddit = Reddit(
+        client_id=config.watchers.reddit.client_id,
+        client_secret=config.watchers.reddit.client_secret,
+        user_agent=config.watchers.reddit.user_agent,
+        requestor_kwargs={"session": session},
+    )
+    reddit.read_only = True
+    return reddit
 
-        Returns:
-            ~praw.Reddit: The PRAW Reddit instance.
+
+class RedditClient:
+    """A Reddit client used by a single poll at a time."""
+
+    def __init__(self, reddit: Reddit):
+        """Initialize the client.
+
+        Args:
+            reddit (~praw.Reddit):
+                The PRAW Reddit instance.
         """
 
-        log.info(
-            "Building read-only Reddit instance using client "
-            f"{config.watchers.reddit.client_id!r}"
-        )
-        reddit = Reddit(
-            client_id=config.watchers.reddit.client_id,
-            client_secret=config.watchers.reddit.client_secret,
-            user_agent=config.watchers.reddit.user_agent,
-        )
-        reddit.read_only = True
-        return reddit
+        self.reddit = reddit
+        self.subreddits: "OrderedDict[str, Subreddit]" = OrderedDict()
 
-    @lru_cache
     def get_subreddit(self, subreddit: str) -> Subreddit:
-        """Get a specific subreddit instance.
+        """Get a specific subreddit instance of the client.
 
         Args:
             subreddit (str): The name of the subreddit to fetch.
@@ -60,15 +105,81 @@ class SubredditWatcher(BaseWatcher):
             ~praw.models.Subreddit: The PRAW Subreddit instance.
         """
 
+        instance = self.subreddits.get(subreddit)
+        if instance is not None:
+            self.subreddits.move_to_end(subreddit)
+            return instance
+
         log.debug(f"Fetching subreddit instance for subreddit {subreddit!r}")
-        return self.reddit.subreddit(subreddit)
+        instance = self.reddit.subreddit(subreddit)
+        self.subreddits[subreddit] = instance
+        if len(self.subreddits) > SUBREDDIT_CACHE_SIZE:
+            self.subreddits.popitem(last=False)
+
+        return instance
+
+
+@contextmanager
+def checkout_client() -> Generator[RedditClient, None, None]:
+    """Check out an idle Reddit client of the current process for a single poll.
+
+    A new client is built if all of the process' clients are in use.
+
+    Yields:
+        RedditClient: The Reddit client to poll with.
+    """
+
+    pid = os.getpid()
+    with _clients_lock:
+        idle = _clients.get(pid)
+        client = idle.pop() if idle else None
+
+    if client is None:
+        client = RedditClient(build_reddit())
 
-    def iter_subreddit(self, subreddit: str) -> Generator[Submission, None, None]:
-        """Iterate over submissions from a given subreddit.
+    try:
+        yield client
+    finally:
+        with _clients_lock:
+            _clients.setdefault(pid, []).append(client)
+
+
+def reset_clients():
+    """Drop the Reddit clients inherited from a parent process."""
+
+    global _clients_lock
+
+    _clients.clear()
+    _clients_lock = Lock()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=reset_clients)
+
+
+class SubredditWatcher(BaseWatcher):
+    """The Reddit subreddit watcher.
+
+    Watches for new content from a given Reddit subreddit.
+    """
+
+    type: str = "subreddit"
+    rate_limited: bool = True
+
+    def iter_subreddit(
+        self, subreddit: str, after: Optional[str] = None
+    ) -> Generator[Submission, None, None]:
+        """Iterate over a page of new submissions from a given subreddit.
+
+        If the page is full, :attr:`~cursor` is set to the fullname of its last
+        submission so the following page can be requested.
 
         Args:
             subreddit (str):
                 The subreddit to iterate submissions.
+            after (Optional[str], optional):
+                The fullname of the submission preceding the page.
+                Defaults to None.
 
         Yields:
             ~praw.models.Submission:
@@ -76,42 +187,184 @@ class SubredditWatcher(BaseWatcher):
         """
 
         log.debug(f"Iterating over new submissions from subreddit {subreddit!r}")
-        return self.get_subreddit(subreddit).new()
+        self.cursor = None
+        params = {"after": after} if after is not None else {}
+        with checkout_client() as client:
+            for index, submission in enumerate(
+                client.get_subreddit(subreddit).new(limit=PAGE_SIZE, params=params), 1
+            ):
+                if index == PAGE_SIZE:
+                    self.cursor = submission.name
+
+                yield submission
 
     def iter_content(  # type: ignore
-        self, subreddit: str
+        self, subreddit: str, after: Optional[str] = None
     ) -> Generator[Content, None, None]:
         """Iterate over a given subreddit submissions to produce content entries.
 
         Args:
             subreddit (str):
                 The subreddit to iterate over new content.
+            after (Optional[str], optional):
+                The fullname of the submission preceding the page to iterate.
+                Defaults to None.
 
         Yields:
             ~brut.db.Content:
                 The extracted content from the subreddit.
         """
 
-        for submission in self.iter_subreddit(subreddit):
-            log.debug(
-                f"Building content entry for submission {submission.id!r} "
-                f"from subreddit {subreddit!r}"
+        for submission in self.iter_subreddit(subreddit, after=after):
+            yield self.build_content(submission, subreddit)
+
+    def build_content(self, submission: Submission, subreddit: str) -> Content:
+        """Build the content entry for a given submission.
+
+        Args:
+            submission (~praw.models.Submission):
+                The submission to build the content entry for.
+            subreddit (str):
+                The subreddit the submission was posted to.
+
+        Returns:
+            ~brut.db.Content:
+                The extracted content of the submission.
+        """
+
+        log.debug(
+            f"Building content entry for submission {submission.id!r} "
+            f"from subreddit {subreddit!r}"
+        )
+
+        return Content(
+            created_at=datetime.fromtimestamp(submission.created_utc),
+            source=SOURCE,
+            source_id=submission.id,
+            fingerprint=Content.build_fingerprint(submission.url),
+            url=submission.url,
+            data=json.dumps(
+                {
+                    "id": submission.id,
+                    "is_self": submission.is_self,
+                    "name": submission.name,
+                    "title": submission.title,
+                    "created_utc": submission.created_utc,
+                    "permalink": submission.permalink,
+                }
+            ),
+        )
+
+
+class MultiredditWatcher(SubredditWatcher):
+    """The Reddit multireddit watcher.
+
+    Watches for new content from many subreddits through a single combined
+    ``a+b+c`` listing.
+    Submissions are demultiplexed back to the subreddit they were posted to and the
+    creation time of the newest seen submission of each subreddit is kept in Redis as
+    its high-water mark, so submissions that were already seen are skipped.
+    The high-water marks of a poll are only persisted once its content is committed.
+
+    Submissions can appear in a listing after newer ones, for example once they are
+    approved by a moderator, so submissions within :data:`HIGH_WATER_MARGIN` below
+    the marks are still polled and left to be deduplicated by their fingerprint.
+    Submissions appearing later than the margin are still missed.
+    """
+
+    type: str = "multireddit"
+
+    def __init__(self):
+        """Initialize the watcher without any high-water marks to persist."""
+
+        self.pending_high_water: Dict[str, float] = {}
+
+    def get_high_water(self, subreddits: List[str]) -> Dict[str, float]:
+        """Get the high-water marks of the given subreddits.
+
+        Args:
+            subreddits (List[str]):
+                The lowercased names of the subreddits.
+
+        Returns:
+            Dict[str, float]:
+                The creation time of the newest seen submission of each subreddit
+                that has been polled before.
+        """
+
+        return {
+            subreddit: float(value)
+            for subreddit, value in zip(
+                subreddits, get_redis().hmget(HIGH_WATER_KEY, subreddits)
+            )
+            if value is not None
+        }
+
+    def iter_content(  # type: ignore
+        self, *subreddits: str, after: Optional[str] = None
+    ) -> Generator[Content, None, None]:
+        """Iterate over the combined submissions of many subreddits.
+
+        Follow-up pages requested with ``after`` are older than the high-water marks
+        set by the page preceding them, so they are neither filtered by nor update
+        the high-water marks.
+
+        Args:
+            subreddits (str):
+                The subreddits to iterate over new content.
+            after (Optional[str], optional):
+                The fullname of the submission preceding the page to iterate.
+                Defaults to None.
+
+        Yields:
+            ~brut.db.Content:
+                The extracted content from the subreddits.
+        """
+
+        names = [subreddit.lower() for subreddit in subreddits]
+        high_water = self.get_high_water(names) if after is None else {}
+        # the listing is sorted by newest, so nothing past the lowest mark is new
+        low_water = min(high_water.values()) if len(high_water) == len(names) else None
+        if low_water is not None:
+            low_water -= HIGH_WATER_MARGIN
+
+        newest: Dict[str, float] = {}
+        counts: Dict[str, int] = defaultdict(int)
+        for submission in self.iter_subreddit("+".join(names), after=after):
+            if low_water is not None and submission.created_utc < low_water:
+                break
+
+            subreddit = submission.subreddit.display_name.lower()
+            if subreddit not in names:
+                log.warning(
+                    f"Skipping submission {submission.id!r} from unexpected "
+                    f"subreddit {subreddit!r}"
+                )
+                continue
+
+            mark = high_water.get(subreddit)
+            if mark is not None and submission.created_utc < mark - HIGH_WATER_MARGIN:
+                continue
+
+            # submissions within the margin never lower the mark
+            newest[subreddit] = max(
+                newest.get(subreddit, mark or 0), submission.created_utc
             )
+            counts[subreddit] += 1
+            yield self.build_content(submission, subreddit)
 
-            yield Content(
-                created_at=datetime.fromtimestamp(submission.created_utc),
-                source=SOURCE,
-                source_id=submission.id,
-                fingerprint=Content.build_fingerprint(submission.url),
-                url=submission.url,
-                data=json.dumps(
-                    {
-                        "id": submission.id,
-                        "is_self": submission.is_self,
-                        "name": submission.name,
-                        "title": submission.title,
-                        "created_utc": submission.created_utc,
-                        "permalink": submission.permalink,
-                    }
-                ),
+        for subreddit in names:
+            log.debug(
+                f"Found {counts[subreddit]} new submissions from subreddit "
+                f"{subreddit!r}"
             )
+
+        if after is None:
+            self.pending_high_water = newest
+
+    def save_state(self):
+        """Persist the high-water marks of the last poll."""
+
+        if len(self.pending_high_water) > 0:
+            get_redis().hset(HIGH_WATER_KEY, mapping=self.pending_high_water)
+            self.pending_high_water = {}
@@ -0,0 +1,112 @@
+# -*- encoding: utf-8 -*-
+# Copyright (c) 2021 Stephen Bunn <stephen@bunn.io>
+# ISC License <https://choosealicense.com/licenses/isc>
+
+"""This module contains fixtures shared by project tests.
+
+Tests of shared state run against a local Redis server given by the
+``BRUT_TEST_REDIS`` environment variable, and are skipped if it isn't reachable.
+Modules defining task actors load the app config when imported, so tests run with a
+generated config using the same Redis server and a temporary store.
+"""
+
+import os
+import shutil
+import tempfile
+from pathlib import Path
+from typing import Generator
+
+import pytest
+from _pytest.config import Config
+from redis import Redis
+from redis.exceptions import RedisError
+from sqlalchemy.engine import create_engine
+from sqlalchemy.orm import Session
+
+from brut.db import orm_registry
+
+from .helpers import LocalServer
+
+REDIS_URL_ENV = "BRUT_TEST_REDIS"
+DEFAULT_REDIS_URL = "redis://localhost:6379/15"
+CONFIG_PATH_ENV = "APP_CONFIG_PATH"
+
+TEST_CONFIG = """
+db: sqlite://
+redis: {redis_url}
+store: {dirpath}/store
+log:
+  dir: {dirpath}/logs
+  record: false
+  level: WARNING
+watchers:
+  reddit:
+    client_id: test
+    client_secret: test
+    user_agent: test
+watch: []
+enqueue:
+  interval:
+    minutes: 5
+"""
+
+
+def pytest_configure(config: Config):
+    """Generate the app config used by tests within a temporary directory."""
+
+    dirpath = tempfile.mkdtemp(prefix="brut-test-")
+    config_path = Path(dirpath, "brut.yml")
+    config_path.write_text(
+        TEST_CONFIG.format(
+            redis_url=os.environ.get(REDIS_URL_ENV, DEFAULT_REDIS_URL),
+            dirpath=dirpath,
+        )
+    )
+    os.environ[CONFIG_PATH_ENV] = config_path.as_posix()
+
+
+def pytest_unconfigure(config: Config):
+    """Remove the temporary directory of the generated app config."""
+
+    config_path = os.environ.pop(CONFIG_PATH_ENV, None)
+    if config_path is not None:
+        shutil.rmtree(Path(config_path).parent, ignore_errors=True)
+
+
+@pytest.fixture
+def http_server() -> Generator[LocalServer, None, None]:
+    """Serve routes registered by a test from a local HTTP server."""
+
+    server = LocalServer()
+    try:
+        yield server
+    finally:
+        server.close()
+
+
+@pytest.fixture
+def session() -> Generator[Session, None, None]:
+    """Provide a session to an in-memory catalog."""
+
+    engine = create_engine("sqlite://")
+    orm_registry.metadata.create_all(engine)
+    with Session(engine) as session:
+        yield session
+
+
+@pytest.fixture
+def redis() -> Generator[Redis, None, None]:
+    """Provide a client to an emptied database of the local Redis server."""
+
+    client = Redis.from_url(os.environ.get(REDIS_URL_ENV, DEFAULT_REDIS_URL))
+    try:
+        client.ping()
+    except RedisError as exc:
+        pytest.skip(f"No local Redis server is available, {exc}")
+
+    client.flushdb()
+    try:
+        yield client
+    finally:
+        client.flushdb()
+        client.close()
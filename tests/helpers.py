@@ -0,0 +1,217 @@
+# -*- encoding: utf-8 -*-
+# Copyright (c) 2021 Stephen Bunn <stephen@bunn.io>
+# ISC License <https://choosealicense.com/licenses/isc>
+
+"""This module contains helpers shared by project tests."""
+
+import os
+import re
+import threading
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, List, NamedTuple, Optional
+
+from sqlalchemy.orm import Session
+
+from brut.db import TIER_COMPRESSED, TIER_HOT, Artifact
+from brut.hasher import HashType
+from brut.store import Store
+
+Route_T = Callable[[BaseHTTPRequestHandler], None]
+
+RANGE_PATTERN = re.compile(r"^bytes=(?P<start>\d+)-$")
+
+
+class ServedRequest(NamedTuple):
+    """Describes a request received by the local HTTP server."""
+
+    method: str
+    path: str
+    headers: Dict[str, str]
+
+
+class LocalServer:
+    """A local HTTP server serving routes registered by tests."""
+
+    def __init__(self):
+        """Initialize and start the server on a free local port."""
+
+        self.routes: Dict[str, Route_T] = {}
+        self.requests: List[ServedRequest] = []
+
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def handle_route(self):
+                server.requests.append(
+                    ServedRequest(self.command, self.path, dict(self.headers.items()))
+                )
+                route = server.routes.get(self.path)
+                if route is None:
+                    self.send_error(404)
+                    return
+
+                route(self)
+
+            do_GET = do_HEAD = handle_route
+
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self.thread.start()
+
+    def url(self, path: str) -> str:
+        """Get the URL of a path on the server.
+
+        Args:
+            path (str):
+                The path on the server.
+
+        Returns:
+            str:
+                The URL of the path.
+        """
+
+        return f"http://127.0.0.1:{self.httpd.server_port}{path}"
+
+    def get_requests(self, path: str) -> List[ServedRequest]:
+        """Get the requests received for a path.
+
+        Args:
+            path (str):
+                The path on the server.
+
+        Returns:
+            List[ServedRequest]:
+                The received requests in order.
+        """
+
+        return [request for request in self.requests if request.path == path]
+
+    def close(self):
+        """Stop the server."""
+
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+def serve_bytes(
+    body: bytes,
+    etag: Optional[str] = None,
+    last_modified: Optional[str] = None,
+    ranges: bool = True,
+    content_type: str = "application/octet-stream",
+) -> Route_T:
+    """Build a route serving some bytes with validators and range support.
+
+    Conditional requests matching the validators are answered with ``304``, and
+    ranges past the end of the body are answered with ``416``.
+
+    Args:
+        body (bytes):
+            The body to serve.
+        etag (Optional[str], optional):
+            The ETag of the body.
+            Defaults to None.
+        last_modified (Optional[str], optional):
+            The Last-Modified date of the body.
+            Defaults to None.
+        ranges (bool, optional):
+            If False, range requests are answered with the whole body.
+            Defaults to True.
+        content_type (str, optional):
+            The media type of the body.
+            Defaults to "application/octet-stream".
+
+    Returns:
+        Route_T:
+            The route serving the body.
+    """
+
+    def route(handler: BaseHTTPRequestHandler):
+        if (etag is not None and handler.headers.get("If-None-Match") == etag) or (
+            last_modified is not None
+            and handler.headers.get("If-Modified-Since") == last_modified
+        ):
+            handler.send_response(304)
+            handler.end_headers()
+            return
+
+        start = 0
+        match = RANGE_PATTERN.match(handler.headers.get("Range", ""))
+        if_range = handler.headers.get("If-Range")
+        if ranges and match and if_range in (None, etag, last_modified):
+            start = int(match.group("start"))
+            if start >= len(body):
+                handler.send_response(416)
+                handler.send_header("Content-Range", f"bytes */{len(body)}")
+                handler.end_headers()
+                return
+
+        handler.send_response(206 if start > 0 else 200)
+        handler.send_header("Content-Type", content_type)
+        handler.send_header("Content-Length", str(len(body) - start))
+        handler.send_header("Accept-Ranges", "bytes" if ranges else "none")
+        if start > 0:
+            handler.send_header(
+                "Content-Range", f"bytes {start}-{len(body) - 1}/{len(body)}"
+            )
+        if etag is not None:
+            handler.send_header("ETag", etag)
+        if last_modified is not None:
+            handler.send_header("Last-Modified", last_modified)
+        handler.end_headers()
+        if handler.command != "HEAD":
+            handler.wfile.write(body[start:])
+
+    return route
+
+
+def put_artifact(
+    store: Store, session: Session, filename: str, compress: bool = False
+) -> Artifact:
+    """Write a random artifact to the store and catalog it.
+
+    Args:
+        store (~brut.store.Store):
+            The store to write the artifact to.
+        session (~sqlalchemy.orm.Session):
+            The session to catalog the artifact with.
+        filename (str):
+            The filename of the artifact.
+        compress (bool, optional):
+            If True, the artifact is compressed in the store.
+            Defaults to False.
+
+    Returns:
+        ~brut.db.Artifact:
+            The cataloged artifact.
+    """
+
+    body = os.urandom(2 ** 12)
+    hasher = HashType.XXHASH.hasher()
+    hasher.update(body)
+    checksum = hasher.hexdigest()
+
+    relative_path = store.get_relative_path(checksum, filename)
+    path = store.volumes[0].path / relative_path
+    path.parent.mkdir(parents=True)
+    path.write_bytes(body)
+
+    stored_size = len(body)
+    if compress:
+        stored_size = store.compress(path, max_ratio=2.0)
+
+    artifact = Artifact(
+        created_at=datetime.now(),
+        fingerprint=checksum,
+        tier=TIER_COMPRESSED if compress else TIER_HOT,
+        stored_size=stored_size,
+        size=len(body),
+        path=relative_path.as_posix(),
+    )
+    session.add(artifact)
+    session.commit()
+    return artifact
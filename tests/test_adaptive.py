@@ -0,0 +1,115 @@
+# -*- encoding: utf-8 -*-
+# Copyright (c) 2021 Stephen Bunn <stephen@bunn.io>
+# ISC License <https://choosealicense.com/licenses/isc>
+
+"""This module tests adapting watch schedules to the rate of new content."""
+
+from typing import Generator
+
+import pytest
+from apscheduler.jobstores.memory import MemoryJobStore
+from apscheduler.schedulers.background import BackgroundScheduler
+from apscheduler.triggers.interval import IntervalTrigger
+from redis import Redis
+
+from brut.adaptive import (
+    MAX_STEP,
+    SMOOTHING,
+    get_adapted_interval,
+    get_velocity,
+    record_poll,
+)
+from brut.config import AdaptiveConfig
+
+WATCH_KEY = "watch"
+
+
+@pytest.fixture
+def scheduler() -> Generator[BackgroundScheduler, None, None]:
+    """Provide a paused scheduler keeping its jobs in memory."""
+
+    scheduler = BackgroundScheduler(jobstores={"default": MemoryJobStore()})
+    scheduler.start(paused=True)
+    try:
+        yield scheduler
+    finally:
+        scheduler.shutdown(wait=False)
+
+
+def test_get_adapted_interval():
+    """Ensure intervals move towards the target within their step and bounds."""
+
+    adaptive_config = AdaptiveConfig(min_interval=60, max_interval=3600, target=25)
+
+    # 25 entries every 500 seconds
+    assert get_adapted_interval(400, 0.05, adaptive_config) == 500
+    # a quiet watch is stretched by at most a single step
+    assert get_adapted_interval(400, 0, adaptive_config) == 400 * MAX_STEP
+    assert get_adapted_interval(400, 0.0001, adaptive_config) == 400 * MAX_STEP
+    # a busy watch is shrunk by at most a single step, and never below the minimum
+    assert get_adapted_interval(400, 100, adaptive_config) == 400 / MAX_STEP
+    assert get_adapted_interval(100, 100, adaptive_config) == 60
+    assert get_adapted_interval(3000, 0, adaptive_config) == 3600
+
+
+def test_record_poll(redis: Redis):
+    """Ensure polls are recorded as a moving average of new entries per second."""
+
+    velocity = record_poll(WATCH_KEY, 10, polled_at=1000.0)
+    assert velocity is not None
+    assert velocity.rate is None and velocity.samples == 0
+    # follow-ups of the first poll have no elapsed time to form a rate with
+    assert record_poll(WATCH_KEY, 10, follow_up=True) == velocity
+
+    velocity = record_poll(WATCH_KEY, 20, polled_at=1100.0)
+    assert velocity is not None
+    assert velocity.rate == pytest.approx(0.2)
+    assert velocity.samples == 1
+
+    velocity = record_poll(WATCH_KEY, 40, polled_at=1200.0)
+    assert velocity is not None
+    assert velocity.rate == pytest.approx(SMOOTHING * 0.4 + (1 - SMOOTHING) * 0.2)
+    assert velocity.samples == 2
+
+    # a follow-up page adds its entries to the same sample
+    velocity = record_poll(WATCH_KEY, 60, follow_up=True)
+    assert velocity is not None
+    assert velocity.rate == pytest.approx(SMOOTHING * 1.0 + (1 - SMOOTHING) * 0.2)
+    assert velocity.samples == 2 and velocity.polled_at == 1200.0
+    assert get_velocity(WATCH_KEY) == velocity
+
+    # polls without any elapsed time don't change the rate
+    assert record_poll(WATCH_KEY, 100, polled_at=1200.0) == velocity
+
+
+def test_adapt_job(redis: Redis, scheduler: BackgroundScheduler):
+    """Ensure a watch job is rescheduled once for each sample of its rate."""
+
+    from brut.schedule import adapt_job, context
+
+    context.adapted.clear()
+    adaptive_config = AdaptiveConfig(min_interval=60, max_interval=3600, target=25)
+    scheduler.add_job(print, trigger=IntervalTrigger(seconds=400), id="job")
+
+    # a watch without a rate is left alone
+    record_poll(WATCH_KEY, 25, polled_at=1000.0)
+    adapt_job(scheduler, "job", WATCH_KEY, adaptive_config)
+    assert scheduler.get_job("job").trigger.interval.total_seconds() == 400
+
+    record_poll(WATCH_KEY, 25, polled_at=1500.0)
+    adapt_job(scheduler, "job", WATCH_KEY, adaptive_config)
+    assert scheduler.get_job("job").trigger.interval.total_seconds() == 500
+
+    # the same sample never compounds
+    adapt_job(scheduler, "job", WATCH_KEY, adaptive_config)
+    assert scheduler.get_job("job").trigger.interval.total_seconds() == 500
+
+    # a quiet poll lowers the average rate, stretching the interval
+    record_poll(WATCH_KEY, 0, polled_at=2000.0)
+    adapt_job(scheduler, "job", WATCH_KEY, adaptive_config)
+    assert scheduler.get_job("job").trigger.interval.total_seconds() == pytest.approx(
+        25 / ((1 - SMOOTHING) * 0.05), abs=1e-3
+    )
+
+    # missing jobs are ignored
+    adapt_job(scheduler, "missing", WATCH_KEY, adaptive_config)
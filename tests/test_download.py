@@ -0,0 +1,113 @@
+# -*- encoding: utf-8 -*-
+# Copyright (c) 2021 Stephen Bunn <stephen@bunn.io>
+# ISC License <https://choosealicense.com/licenses/isc>
+
+"""This module tests resumable downloads against a local HTTP server."""
+
+import os
+from pathlib import Path
+
+import requests
+from megu.models import HttpResource
+
+from brut.download import STATE_SUFFIX, download_resource, read_state, write_state
+from brut.hasher import HashType
+
+from .helpers import LocalServer, serve_bytes
+
+BODY = os.urandom(2 ** 16)
+ETAG = '"body"'
+
+
+def write_partial(partial_path: Path, url: str, prefix: bytes, **state):
+    """Write a checkpointed partial download of a given prefix."""
+
+    hasher = HashType.XXHASH.hasher()
+    hasher.update(prefix)
+    partial_path.write_bytes(prefix)
+    write_state(
+        partial_path.with_name(f"{partial_path.name}{STATE_SUFFIX}"),
+        {"url": url, "offset": len(prefix), "checksum": hasher.hexdigest(), **state},
+    )
+
+
+def test_download_resource(http_server: LocalServer, tmp_path: Path):
+    """Ensure a resource is downloaded and its state is marked complete."""
+
+    http_server.routes["/body"] = serve_bytes(BODY, etag=ETAG)
+    url = http_server.url("/body")
+    partial_path = tmp_path / "body.part"
+
+    download_resource(
+        requests.Session(),
+        HttpResource(method="GET", url=url),
+        partial_path,
+        checkpoint_size=2 ** 12,
+    )
+
+    assert partial_path.read_bytes() == BODY
+    state = read_state(partial_path.with_name(f"{partial_path.name}{STATE_SUFFIX}"))
+    assert state["complete"]
+    assert state["offset"] == len(BODY)
+    assert state["etag"] == ETAG
+
+
+def test_download_resource_resumes_range(http_server: LocalServer, tmp_path: Path):
+    """Ensure a partial download is resumed from its checkpoint with a range."""
+
+    http_server.routes["/body"] = serve_bytes(BODY, etag=ETAG)
+    url = http_server.url("/body")
+    partial_path = tmp_path / "body.part"
+    write_partial(partial_path, url, BODY[:1000], etag=ETAG)
+
+    # bytes written after the last checkpoint are dropped before resuming
+    with partial_path.open("ab") as partial_io:
+        partial_io.write(b"garbage")
+
+    download_resource(
+        requests.Session(), HttpResource(method="GET", url=url), partial_path
+    )
+
+    assert partial_path.read_bytes() == BODY
+    (request,) = http_server.get_requests("/body")
+    assert request.headers["Range"] == "bytes=1000-"
+    assert request.headers["If-Range"] == ETAG
+
+
+def test_download_resource_restarts_on_416(http_server: LocalServer, tmp_path: Path):
+    """Ensure a download restarts when the server rejects the resume range."""
+
+    # the resource shrank below the checkpoint since the partial download
+    http_server.routes["/body"] = serve_bytes(BODY[:500])
+    url = http_server.url("/body")
+    partial_path = tmp_path / "body.part"
+    write_partial(partial_path, url, BODY[:1000])
+
+    download_resource(
+        requests.Session(), HttpResource(method="GET", url=url), partial_path
+    )
+
+    assert partial_path.read_bytes() == BODY[:500]
+    first, second = http_server.get_requests("/body")
+    assert first.headers["Range"] == "bytes=1000-"
+    assert "Range" not in second.headers
+
+
+def test_download_resource_restarts_on_changed_resource(
+    http_server: LocalServer, tmp_path: Path
+):
+    """Ensure a download restarts when the resource changed since the checkpoint."""
+
+    changed = os.urandom(len(BODY))
+    http_server.routes["/body"] = serve_bytes(changed, etag='"changed"')
+    url = http_server.url("/body")
+    partial_path = tmp_path / "body.part"
+    write_partial(partial_path, url, BODY[:1000], etag=ETAG)
+
+    download_resource(
+        requests.Session(), HttpResource(method="GET", url=url), partial_path
+    )
+
+    assert partial_path.read_bytes() == changed
+    (request,) = http_server.get_requests("/body")
+    assert request.headers["If-Range"] == ETAG
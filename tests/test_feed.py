@@ -0,0 +1,115 @@
+# -*- encoding: utf-8 -*-
+# Copyright (c) 2021 Stephen Bunn <stephen@bunn.io>
+# ISC License <https://choosealicense.com/licenses/isc>
+
+"""This module tests conditional polling of feeds against a local HTTP server."""
+
+from typing import List
+
+import pytest
+from redis import Redis
+
+from brut.watchers import feed
+from brut.watchers.feed import FeedWatcher
+
+from .helpers import LocalServer, serve_bytes
+
+ETAG = '"feed"'
+LAST_MODIFIED = "Tue, 10 Jun 2003 09:41:01 GMT"
+
+
+def build_feed(*items: str) -> bytes:
+    """Build an RSS feed of items published at the given dates."""
+
+    return (
+        '<?xml version="1.0"?><rss version="2.0"><channel><title>Feed</title>'
+        + "".join(
+            f"<item><title>Item {index}</title><link>https://example.com/{index}</link>"
+            f"<guid>{index}</guid><pubDate>{published}</pubDate></item>"
+            for index, published in enumerate(items)
+        )
+        + "</channel></rss>"
+    ).encode("utf-8")
+
+
+def poll(url: str) -> List[str]:
+    """Poll a feed and persist its state as if its content was committed."""
+
+    watcher = FeedWatcher()
+    urls = [content.url for content in watcher.iter_content(url)]
+    watcher.save_state()
+    return urls
+
+
+@pytest.fixture(autouse=True)
+def feed_redis(redis: Redis, monkeypatch: pytest.MonkeyPatch) -> Redis:
+    """Keep the state of feeds in the local Redis server."""
+
+    monkeypatch.setattr(feed, "get_redis", lambda: redis)
+    return redis
+
+
+def test_feed_not_modified(http_server: LocalServer):
+    """Ensure an unchanged feed is answered with 304 once its ETag is known."""
+
+    http_server.routes["/feed"] = serve_bytes(
+        build_feed("Tue, 10 Jun 2003 04:00:00 GMT"),
+        etag=ETAG,
+        last_modified=LAST_MODIFIED,
+        content_type="application/rss+xml",
+    )
+    url = http_server.url("/feed")
+
+    assert poll(url) == ["https://example.com/0"]
+    assert poll(url) == []
+
+    first, second = http_server.get_requests("/feed")
+    assert "If-None-Match" not in first.headers
+    assert second.headers["If-None-Match"] == ETAG
+    assert second.headers["If-Modified-Since"] == LAST_MODIFIED
+
+
+def test_feed_state_saved_after_commit(http_server: LocalServer):
+    """Ensure the state of a feed isn't persisted before its content is committed."""
+
+    http_server.routes["/feed"] = serve_bytes(
+        build_feed("Tue, 10 Jun 2003 04:00:00 GMT"), etag=ETAG
+    )
+    url = http_server.url("/feed")
+
+    # the content of the first poll is never committed, so it is polled again
+    watcher = FeedWatcher()
+    assert len(list(watcher.iter_content(url))) == 1
+    assert watcher.get_state(url) == {}
+
+    assert poll(url) == ["https://example.com/0"]
+    assert FeedWatcher().get_state(url)["etag"] == ETAG
+
+
+def test_feed_high_water(http_server: LocalServer):
+    """Ensure entries published before the high-water mark are skipped."""
+
+    http_server.routes["/feed"] = serve_bytes(
+        build_feed("Tue, 10 Jun 2003 04:00:00 GMT", "Mon, 09 Jun 2003 04:00:00 GMT"),
+        etag=ETAG,
+    )
+    url = http_server.url("/feed")
+    assert poll(url) == ["https://example.com/0", "https://example.com/1"]
+
+    # a changed feed is downloaded again, entries published at the high-water mark
+    # may be new and are left to be deduplicated by their fingerprint
+    http_server.routes["/feed"] = serve_bytes(
+        build_feed(
+            "Tue, 10 Jun 2003 04:00:00 GMT",
+            "Mon, 09 Jun 2003 04:00:00 GMT",
+            "Wed, 11 Jun 2003 04:00:00 GMT",
+            "Tue, 10 Jun 2003 04:00:00 GMT",
+        ),
+        etag='"changed"',
+    )
+    assert poll(url) == [
+        "https://example.com/0",
+        "https://example.com/2",
+        "https://example.com/3",
+    ]
+    assert FeedWatcher().get_state(url)["etag"] == '"changed"'
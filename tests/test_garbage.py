@@ -0,0 +1,156 @@
+# -*- encoding: utf-8 -*-
+# Copyright (c) 2021 Stephen Bunn <stephen@bunn.io>
+# ISC License <https://choosealicense.com/licenses/isc>
+
+"""This module tests collecting orphaned files of the store against its catalog."""
+
+import os
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+
+import pytest
+from sqlalchemy.orm import Session
+
+from brut import garbage
+from brut.config import GarbageConfig
+from brut.db import Artifact
+from brut.garbage import (
+    QUARANTINE_DIRNAME,
+    collect_garbage,
+    index_store,
+    iter_catalog_paths,
+    iter_orphans,
+    purge_quarantine,
+    quarantine,
+)
+from brut.store import Store, Volume
+
+from .helpers import put_artifact
+
+# older than the default grace period of 24 hours
+EXPIRED_AGE = 48 * 3600
+
+
+def put_orphan(store: Store, checksum: str, filename: str, age: float = 0) -> Path:
+    """Write a file to the store that has no artifact in the catalog."""
+
+    path = store.volumes[0].path / store.get_relative_path(checksum, filename)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_bytes(os.urandom(2 ** 10))
+    if age > 0:
+        mtime = time.time() - age
+        os.utime(path, (mtime, mtime))
+
+    return path
+
+
+@pytest.fixture
+def store(tmp_path: Path) -> Store:
+    """Provide an empty store within a temporary directory."""
+
+    return Store([Volume(tmp_path / "store")])
+
+
+@pytest.fixture(autouse=True)
+def catalog(session: Session, monkeypatch: pytest.MonkeyPatch):
+    """Collect garbage against the in-memory catalog with the default config."""
+
+    @contextmanager
+    def db_session(*args, **kwargs):
+        yield session
+
+    monkeypatch.setattr(garbage, "db_session", db_session)
+    monkeypatch.setattr(garbage, "get_garbage_config", GarbageConfig)
+
+
+def test_iter_orphans(store: Store, session: Session):
+    """Ensure only uncataloged and temporary files of the store are orphans."""
+
+    for index in range(4):
+        put_artifact(store, session, f"{index}.bin")
+    put_artifact(store, session, "4.bin", compress=True)
+    orphan_path = put_orphan(store, "0" * 16, "orphan.bin")
+    temporary_path = orphan_path.parent / ".orphan.bin.tmp"
+    temporary_path.write_bytes(b"partial")
+    (orphan_path.parent / ".hidden").write_bytes(b"ignored")
+
+    orphans = iter_orphans(index_store(store, workers=2), iter_catalog_paths(session))
+
+    assert sorted(
+        (entry.volume_path / entry.relative_path, entry.temporary) for entry in orphans
+    ) == [(temporary_path, True), (orphan_path, False)]
+
+
+def test_collect_after_grace(store: Store, session: Session):
+    """Ensure orphaned files are only quarantined once past the grace period."""
+
+    artifact = put_artifact(store, session, "artifact.bin")
+    recent_path = put_orphan(store, "1" * 16, "recent.bin")
+    expired_path = put_orphan(store, "2" * 16, "expired.bin", age=EXPIRED_AGE)
+
+    counts = collect_garbage(store, action="quarantine")
+
+    assert counts == {"orphaned": 2, "pending": 1, "collected": 1, "purged": 0}
+    assert recent_path.is_file()
+    assert not expired_path.exists()
+    volume_path = store.volumes[0].path
+    assert (
+        volume_path / QUARANTINE_DIRNAME / expired_path.relative_to(volume_path)
+    ).is_file()
+    assert store.locate(artifact.fingerprint, "artifact.bin") is not None
+
+
+def test_collect_dry_run_and_remove(store: Store):
+    """Ensure a dry run leaves orphans in place and removal skips the quarantine."""
+
+    expired_path = put_orphan(store, "3" * 16, "expired.bin", age=EXPIRED_AGE)
+
+    counts = collect_garbage(store, action="remove", dry_run=True)
+    assert counts["orphaned"] == 1 and counts["collected"] == 0
+    assert expired_path.is_file()
+
+    counts = collect_garbage(store, action="remove")
+    assert counts["collected"] == 1
+    assert not expired_path.exists()
+    assert not (store.volumes[0].path / QUARANTINE_DIRNAME).exists()
+
+    with pytest.raises(ValueError):
+        collect_garbage(store, action="delete")
+
+
+def test_collect_guards_uncataloged(store: Store, session: Session):
+    """Ensure nothing is collected while some artifact has no cataloged path."""
+
+    session.add(Artifact(created_at=datetime.now(), fingerprint="4" * 16))
+    session.commit()
+    expired_path = put_orphan(store, "4" * 16, "expired.bin", age=EXPIRED_AGE)
+
+    counts = collect_garbage(store, action="quarantine")
+
+    assert counts["orphaned"] == 1 and counts["collected"] == 0
+    assert expired_path.is_file()
+
+
+def test_purge_quarantine(store: Store):
+    """Ensure quarantined files are purged only once past the retention."""
+
+    volume_path = store.volumes[0].path
+    kept_path = put_orphan(store, "5" * 16, "kept.bin")
+    purged_path = put_orphan(store, "6" * 16, "purged.bin")
+    for path in (kept_path, purged_path):
+        quarantine(volume_path, path.relative_to(volume_path))
+
+    quarantined_path = (
+        volume_path / QUARANTINE_DIRNAME / purged_path.relative_to(volume_path)
+    )
+    mtime = time.time() - 31 * 86400
+    os.utime(quarantined_path, (mtime, mtime))
+
+    assert purge_quarantine(store, 30) == 1
+    assert not quarantined_path.exists()
+    assert not quarantined_path.parent.exists()
+    assert (
+        volume_path / QUARANTINE_DIRNAME / kept_path.relative_to(volume_path)
+    ).is_file()
@@ -0,0 +1,112 @@
+# -*- encoding: utf-8 -*-
+# Copyright (c) 2021 Stephen Bunn <stephen@bunn.io>
+# ISC License <https://choosealicense.com/licenses/isc>
+
+"""This module guards the startup cost of importing Brut modules.
+
+Each module is imported in a fresh interpreter through ``python -X importtime`` without
+an ``APP_CONFIG_PATH``, so importing must never parse the configuration, configure
+logging, build the broker, or import watcher backends.
+"""
+
+import os
+import subprocess
+import sys
+from pathlib import Path
+from typing import Dict, NamedTuple
+
+import pytest
+
+SOURCE_DIRPATH = Path(__file__).parent.parent.joinpath("src")
+
+# modules that must be importable without a config file
+MODULES = [
+    "brut.adaptive",
+    "brut.cache",
+    "brut.config",
+    "brut.db",
+    "brut.helpers",
+    "brut.log",
+    "brut.poll",
+    "brut.quota",
+    "brut.state",
+    "brut.store",
+    "brut.watchers",
+]
+
+# the total time in microseconds spent importing Brut's own modules
+IMPORT_BUDGET = 500_000
+
+
+class ImportTime(NamedTuple):
+    """Describes the import time of a module in microseconds."""
+
+    self: int
+    cumulative: int
+
+
+def get_import_times(module: str) -> Dict[str, ImportTime]:
+    """Import a module in a fresh interpreter and collect the import times.
+
+    Args:
+        module (str):
+            The name of the module to import.
+
+    Returns:
+        Dict[str, ImportTime]:
+            The import time of each imported module by its name.
+    """
+
+    env = {key: value for key, value in os.environ.items() if key != "APP_CONFIG_PATH"}
+    env["PYTHONPATH"] = os.pathsep.join(
+        [SOURCE_DIRPATH.as_posix(), *filter(None, [env.get("PYTHONPATH")])]
+    )
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        env=env,
+        capture_output=True,
+        text=True,
+    )
+    assert result.returncode == 0, result.stderr
+
+    times: Dict[str, ImportTime] = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+
+        self_time, cumulative_time, name = line[len("import time:") :].split("|")
+        times[name.strip()] = ImportTime(int(self_time), int(cumulative_time))
+
+    return times
+
+
+@pytest.mark.parametrize("module", MODULES)
+def test_import_without_config(module: str):
+    """Ensure modules import without a config file within the startup budget."""
+
+    times = get_import_times(module)
+    assert module in times
+
+    brut_time = sum(
+        import_time.self
+        for name, import_time in times.items()
+        if name == "brut" or name.startswith("brut.")
+    )
+    assert brut_time < IMPORT_BUDGET
+
+
+def test_watchers_import_backends_lazily():
+    """Ensure importing the watchers doesn't import watcher backends."""
+
+    times = get_import_times("brut.watchers")
+    assert "praw" not in times
+    assert "brut.watchers.reddit" not in times
+
+
+@pytest.mark.parametrize("module", ["brut.db", "brut.store"])
+def test_modules_import_broker_lazily(module: str):
+    """Ensure modules used by scripts don't import the task broker."""
+
+    times = get_import_times(module)
+    assert "dramatiq" not in times
+    assert "brut.broker" not in times
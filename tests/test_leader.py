@@ -0,0 +1,124 @@
+# -*- encoding: utf-8 -*-
+# Copyright (c) 2021 Stephen Bunn <stephen@bunn.io>
+# ISC License <https://choosealicense.com/licenses/isc>
+
+"""This module tests electing a single leading scheduler against a local Redis."""
+
+import time
+from datetime import datetime, timedelta
+from typing import List
+
+from apscheduler.jobstores.redis import RedisJobStore
+from apscheduler.schedulers.background import BackgroundScheduler
+from apscheduler.triggers.date import DateTrigger
+from redis import Redis
+
+from brut.config import SchedulerConfig
+from brut.leader import LeaderLock, get_renew_interval
+
+LOCK_KEY = "brut:test:leader"
+JOBS_KEY = "brut:test:jobs"
+RUN_TIMES_KEY = "brut:test:run-times"
+
+# runs of the persisted job, which must be a module-level function to be pickled
+RUNS: List[datetime] = []
+
+
+def record_run():
+    """Record a run of the persisted job."""
+
+    RUNS.append(datetime.now())
+
+
+def build_scheduler(redis: Redis) -> BackgroundScheduler:
+    """Build a scheduler persisting its jobs in the local Redis with default options."""
+
+    return BackgroundScheduler(
+        jobstores={
+            "default": RedisJobStore(
+                jobs_key=JOBS_KEY,
+                run_times_key=RUN_TIMES_KEY,
+                connection_pool=redis.connection_pool,
+            )
+        },
+        job_defaults={
+            "coalesce": True,
+            "max_instances": 1,
+            "misfire_grace_time": SchedulerConfig().misfire_grace_time,
+        },
+    )
+
+
+def test_single_leader(redis: Redis):
+    """Ensure only a single instance holds the lock until it is released."""
+
+    leader = LeaderLock(redis, LOCK_KEY, 30)
+    standby = LeaderLock(redis, LOCK_KEY, 30)
+
+    assert leader.acquire()
+    assert not standby.acquire()
+    assert leader.acquire()
+    assert leader.check()
+    assert not standby.check()
+
+    leader.release()
+    assert not leader.check()
+    assert standby.acquire()
+    assert standby.token is not None and standby.token > 1
+
+
+def test_fencing_lost_lock(redis: Redis):
+    """Ensure a leader that lost its lock to a successor stops leading."""
+
+    leader = LeaderLock(redis, LOCK_KEY, 30)
+    standby = LeaderLock(redis, LOCK_KEY, 30)
+    assert leader.acquire()
+    token = leader.token
+
+    # the leader stalled past its TTL and the lock expired
+    redis.delete(LOCK_KEY)
+    assert standby.acquire()
+    assert standby.token is not None and token is not None
+    assert standby.token > token
+
+    assert not leader.check()
+    assert not leader.renew()
+    assert leader.token is None
+    assert standby.check()
+
+
+def test_failover_runs_missed_job(redis: Redis):
+    """Ensure a run missed while a standby takes over still runs on the standby."""
+
+    RUNS.clear()
+    ttl = 1
+    leader = LeaderLock(redis, LOCK_KEY, ttl)
+    standby = LeaderLock(redis, LOCK_KEY, ttl)
+    assert leader.acquire()
+
+    scheduler = build_scheduler(redis)
+    scheduler.start(paused=True)
+    scheduler.add_job(
+        record_run,
+        trigger=DateTrigger(datetime.now() + timedelta(milliseconds=100)),
+        id="job",
+    )
+    # the leader crashes before the run is due, without releasing its lock
+    scheduler.shutdown(wait=False)
+
+    started_at = time.monotonic()
+    while not standby.acquire():
+        assert time.monotonic() - started_at < 10
+        time.sleep(get_renew_interval(ttl))
+
+    successor = build_scheduler(redis)
+    successor.start()
+    try:
+        started_at = time.monotonic()
+        while len(RUNS) == 0 and time.monotonic() - started_at < 10:
+            time.sleep(0.1)
+    finally:
+        successor.shutdown()
+
+    assert len(RUNS) == 1
+    assert not leader.check()
@@ -0,0 +1,166 @@
+# -*- encoding: utf-8 -*-
+# Copyright (c) 2021 Stephen Bunn <stephen@bunn.io>
+# ISC License <https://choosealicense.com/licenses/isc>
+
+"""This module tests polling many watches concurrently on an event loop."""
+
+import asyncio
+import threading
+import time
+from datetime import datetime
+from typing import AsyncGenerator, Generator
+
+import pytest
+
+from brut import poll
+from brut.db import Content
+from brut.poll import poll_many
+from brut.watchers.base import BaseWatcher
+
+
+def build_content(name: str, index: int) -> Content:
+    """Build a content entry polled by a watch."""
+
+    return Content(
+        created_at=datetime.now(),
+        source="test",
+        source_id=f"{name}-{index}",
+        fingerprint=f"{name}-{index}",
+        url=f"https://example.com/{name}/{index}",
+        data="{}",
+    )
+
+
+class InFlight:
+    """Counts the watches polled at once."""
+
+    def __init__(self):
+        """Initialize the counter without any watch in flight."""
+
+        self.current = 0
+        self.peak = 0
+        self.lock = threading.Lock()
+
+    def __enter__(self):
+        with self.lock:
+            self.current += 1
+            self.peak = max(self.peak, self.current)
+
+    def __exit__(self, *args):
+        with self.lock:
+            self.current -= 1
+
+
+in_flight = InFlight()
+
+
+class AsyncWatcher(BaseWatcher):
+    """A watcher polling natively on the event loop."""
+
+    type = "async"
+
+    def iter_content(self, name: str, delay: float):  # type: ignore
+        raise NotImplementedError()
+
+    async def aiter_content(  # type: ignore
+        self, name: str, delay: float
+    ) -> AsyncGenerator[Content, None]:
+        with in_flight:
+            await asyncio.sleep(delay)
+            for index in range(2):
+                yield build_content(name, index)
+
+        self.cursor = f"{name}-cursor"
+
+
+class SyncWatcher(BaseWatcher):
+    """A watcher polling in a thread of the event loop."""
+
+    type = "sync"
+
+    def iter_content(  # type: ignore
+        self, name: str, delay: float
+    ) -> Generator[Content, None, None]:
+        with in_flight:
+            time.sleep(delay)
+            yield build_content(name, 0)
+
+
+class FailingWatcher(BaseWatcher):
+    """A watcher failing after its first content entry."""
+
+    type = "failing"
+
+    def iter_content(self, name: str) -> Generator[Content, None, None]:  # type: ignore
+        yield build_content(name, 0)
+        raise RuntimeError(f"{name} failed")
+
+
+WATCHERS = {
+    watcher.type: watcher for watcher in (AsyncWatcher, SyncWatcher, FailingWatcher)
+}
+
+
+@pytest.fixture(autouse=True)
+def watchers(monkeypatch: pytest.MonkeyPatch):
+    """Poll the watchers of this module rather than the registered watchers."""
+
+    global in_flight
+    in_flight = InFlight()
+    monkeypatch.setattr(poll, "get_watcher", WATCHERS.get)
+
+
+def test_poll_many_bounded():
+    """Ensure at most the concurrency of watches are polled at once, in order."""
+
+    # later watches finish first, results are still in the order of the watches
+    watches = [
+        ("async", [f"watch{index}", 0.05 * (10 - index)], {}) for index in range(10)
+    ]
+
+    polls = poll_many(watches, 3)
+
+    assert in_flight.peak == 3
+    assert [watch_poll.args[0] for watch_poll in polls] == [
+        f"watch{index}" for index in range(10)
+    ]
+    for watch_poll in polls:
+        assert watch_poll.error is None
+        assert watch_poll.cursor == f"{watch_poll.args[0]}-cursor"
+        assert [content.source_id for content in watch_poll.contents] == [
+            f"{watch_poll.args[0]}-{index}" for index in range(2)
+        ]
+
+
+def test_poll_many_threads():
+    """Ensure synchronous watchers are polled concurrently in threads."""
+
+    started_at = time.monotonic()
+    polls = poll_many([("sync", [f"watch{index}", 0.3], {}) for index in range(4)], 4)
+
+    assert time.monotonic() - started_at < 1.0
+    assert in_flight.peak == 4
+    assert [len(watch_poll.contents) for watch_poll in polls] == [1] * 4
+
+
+def test_poll_many_isolates_errors():
+    """Ensure a failing watch never affects the polls of the other watches."""
+
+    polls = poll_many(
+        [
+            ("failing", ["failed"], {}),
+            ("async", ["first", 0], {}),
+            ("missing", [], {}),
+            ("sync", ["second", 0], {}),
+        ],
+        2,
+    )
+
+    failed, first, missing, second = polls
+    assert isinstance(failed.error, RuntimeError)
+    assert [content.source_id for content in failed.contents] == ["failed-0"]
+    assert failed.save_state is None
+
+    assert isinstance(missing.error, ValueError)
+    assert first.error is None and len(first.contents) == 2
+    assert second.error is None and len(second.contents) == 1
@@ -0,0 +1,91 @@
+# -*- encoding: utf-8 -*-
+# Copyright (c) 2021 Stephen Bunn <stephen@bunn.io>
+# ISC License <https://choosealicense.com/licenses/isc>
+
+"""This module tests the preflight probe against a local HTTP server."""
+
+import os
+from pathlib import Path
+from urllib.parse import urlparse
+
+from megu.models import Content as MeguContent
+from megu.models import HttpResource
+from sqlalchemy.orm import Session
+
+from brut.preflight import (
+    find_archived,
+    get_etag_identifier,
+    probe_content,
+    record_identifiers,
+)
+from brut.store import Store, Volume
+
+from .helpers import LocalServer, put_artifact, serve_bytes
+
+BODY = os.urandom(2 ** 12)
+ETAG = '"body"'
+
+
+def build_content(url: str) -> MeguContent:
+    """Build content with a single HTTP resource."""
+
+    return MeguContent(
+        id="body",
+        group="body",
+        name="body",
+        url=url,
+        quality=1.0,
+        size=0,
+        type="application/octet-stream",
+        resources=[HttpResource(method="GET", url=url)],
+    )
+
+
+def test_probe_content(http_server: LocalServer):
+    """Ensure the size and ETag of content are probed with a HEAD request."""
+
+    http_server.routes["/body"] = serve_bytes(BODY, etag=ETAG)
+    url = http_server.url("/body")
+
+    probe = probe_content(build_content(url))
+
+    assert probe.size == len(BODY)
+    assert probe.identifiers == [
+        get_etag_identifier([(urlparse(url).netloc, ETAG, len(BODY))])
+    ]
+    (request,) = http_server.get_requests("/body")
+    assert request.method == "HEAD"
+
+
+def test_probe_content_ignores_weak_etag(http_server: LocalServer):
+    """Ensure weak ETag values are not used as identifiers."""
+
+    http_server.routes["/body"] = serve_bytes(BODY, etag=f"W/{ETAG}")
+
+    probe = probe_content(build_content(http_server.url("/body")))
+
+    assert probe.size == len(BODY)
+    assert probe.identifiers == []
+
+
+def test_find_archived(http_server: LocalServer, session: Session, tmp_path: Path):
+    """Ensure content with a recorded ETag resolves to its archived artifact."""
+
+    http_server.routes["/body"] = serve_bytes(BODY, etag=ETAG)
+    store = Store([Volume(tmp_path / "store")])
+    artifact = put_artifact(store, session, "body.bin")
+
+    probe = probe_content(build_content(http_server.url("/body")))
+    assert find_archived(session, probe.identifiers, store) is None
+
+    record_identifiers(session, artifact.id, probe.identifiers)
+    session.commit()
+
+    probe = probe_content(build_content(http_server.url("/body")))
+    assert find_archived(session, probe.identifiers, store) == artifact
+
+    # an artifact whose file is gone from the store must be downloaded again
+    path = store.locate(artifact.fingerprint, "body.bin")
+    assert path is not None
+    path.unlink()
+    assert find_archived(session, probe.identifiers, store) is None
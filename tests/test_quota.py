@@ -0,0 +1,166 @@
+# -*- encoding: utf-8 -*-
+# Copyright (c) 2021 Stephen Bunn <stephen@bunn.io>
+# ISC License <https://choosealicense.com/licenses/isc>
+
+"""This module tests tracking the API quota and pacing watches within it."""
+
+import time
+from typing import Any, List
+
+import pytest
+from redis import Redis
+
+from brut.dispatch import WatchDispatcher, pop_follow_ups, queue_follow_up
+from brut.leader import LeaderLock
+from brut.quota import Quota, QuotaTracker, parse_quota
+
+QUOTA_KEY = "brut:test:quota"
+LOCK_KEY = "brut:test:leader"
+
+
+def get_headers(remaining: float, reset: float, used: int = 0) -> dict:
+    """Build the rate-limit headers of a Reddit API response."""
+
+    return {
+        "x-ratelimit-remaining": str(remaining),
+        "x-ratelimit-used": str(used),
+        "x-ratelimit-reset": str(reset),
+    }
+
+
+@pytest.fixture
+def tracker(redis: Redis) -> QuotaTracker:
+    """Track the quota in the local Redis server."""
+
+    return QuotaTracker(redis, QUOTA_KEY)
+
+
+def test_parse_quota():
+    """Ensure the quota is parsed from the rate-limit headers of a response."""
+
+    assert parse_quota(get_headers(598.0, 30, used=2), 1000.0) == Quota(
+        remaining=598.0, used=2, reset_at=1030.0
+    )
+    assert parse_quota({"x-ratelimit-reset": "30"}, 1000.0) is None
+    assert parse_quota(get_headers("many", 30), 1000.0) is None  # type: ignore
+
+
+def test_quota_tracker(tracker: QuotaTracker, redis: Redis):
+    """Ensure the quota reported by responses is kept until its window resets."""
+
+    assert tracker.get() is None
+    assert tracker.update({"content-type": "application/json"}) is None
+
+    quota = tracker.update(get_headers(100, 10, used=500))
+    assert quota is not None
+    assert tracker.get() == quota
+    assert redis.ttl(QUOTA_KEY) > 0
+
+    # 100 requests over the 10 seconds left in the window
+    assert tracker.get_rate() == pytest.approx(10, rel=0.05)
+    assert tracker.get_rate(reserve=50) == pytest.approx(5, rel=0.05)
+    assert tracker.get_rate(reserve=200) == 0
+
+    redis.hset(QUOTA_KEY, "reset_at", time.time() - 1)
+    assert tracker.get() is None
+    assert tracker.get_rate() is None
+
+
+def test_dispatcher_paces_within_quota(tracker: QuotaTracker):
+    """Ensure due watches are sent, stalest first, only while tokens are available."""
+
+    batches: List[List[Any]] = []
+    dispatcher = WatchDispatcher(
+        lambda *args, **kwargs: pytest.fail("many watches are sent as a batch"),
+        tracker,
+        send_many=batches.append,
+    )
+    tracker.update(get_headers(100, 10))
+    for index in range(15):
+        dispatcher.request(f"watch-{index}", "subreddit", [f"sub{index}"], {})
+
+    # watches that were sent before wait behind the ones that never were
+    dispatcher.last_sent = {"watch-0": time.time(), "watch-1": time.time()}
+
+    # the first tick only starts refilling the bucket
+    assert dispatcher.tick() == 0
+
+    # a tick's worth of 10 requests is refilled after a couple of seconds
+    dispatcher.refilled_at = time.monotonic() - 2
+    assert dispatcher.tick() == 10
+    (batch,) = batches
+    assert [watch[1] for watch in batch] == [[f"sub{index}"] for index in range(2, 12)]
+
+    assert dispatcher.tick() == 0
+    assert len(dispatcher.pending) == 5
+
+    # a watch that is already due isn't requested twice
+    dispatcher.request("watch-0", "subreddit", ["sub0"], {})
+    assert len(dispatcher.pending) == 5
+
+
+def test_dispatcher_unknown_quota(tracker: QuotaTracker):
+    """Ensure all due watches are sent while the quota is unknown."""
+
+    sent: List[Any] = []
+    dispatcher = WatchDispatcher(lambda *args, **kwargs: sent.append(args), tracker)
+    for index in range(3):
+        dispatcher.request(f"watch-{index}", "subreddit", [f"sub{index}"], {})
+
+    assert dispatcher.tick() == 3
+    assert sent == [("subreddit", f"sub{index}") for index in range(3)]
+
+
+def test_follow_ups_sent_first(tracker: QuotaTracker, redis: Redis):
+    """Ensure queued follow-up pages are sent before any scheduled watch."""
+
+    queue_follow_up(redis, "subreddit", ["sub0"], {"after": "t3_0"})
+    queue_follow_up(redis, "subreddit", ["sub1"], {"after": "t3_1"})
+    follow_ups = pop_follow_ups(redis)
+    assert follow_ups == [
+        ("subreddit", ["sub0"], {"after": "t3_0"}),
+        ("subreddit", ["sub1"], {"after": "t3_1"}),
+    ]
+    assert pop_follow_ups(redis) == []
+
+    sent: List[Any] = []
+    dispatcher = WatchDispatcher(lambda *args, **kwargs: sent.append(args), tracker)
+    tracker.update(get_headers(100, 10))
+    dispatcher.request("watch-0", "subreddit", ["sub0"], {})
+    for watcher_type, args, kwargs in follow_ups:
+        dispatcher.request(
+            f"follow-up:{kwargs['after']}", watcher_type, args, kwargs, follow_up=True
+        )
+
+    dispatcher.tick()
+    dispatcher.refilled_at = time.monotonic() - 0.2
+    assert dispatcher.tick() == 2
+    assert sent == [("subreddit", "sub0"), ("subreddit", "sub1")]
+    assert list(dispatcher.pending) == ["watch-0"]
+    assert list(dispatcher.last_sent) == []
+
+
+def test_follow_ups_only_taken_by_leader(
+    tracker: QuotaTracker, redis: Redis, monkeypatch: pytest.MonkeyPatch
+):
+    """Ensure follow-up pages are left queued for the leader by a standby."""
+
+    from brut import schedule
+
+    leader = LeaderLock(redis, LOCK_KEY, 30)
+    standby = LeaderLock(redis, LOCK_KEY, 30)
+    assert leader.acquire()
+
+    dispatcher = WatchDispatcher(lambda *args, **kwargs: None, tracker)
+    monkeypatch.setattr(schedule.context, "dispatcher", dispatcher)
+    queue_follow_up(redis, "subreddit", ["sub0"], {"after": "t3_0"})
+
+    monkeypatch.setattr(schedule.context, "lock", standby)
+    schedule.dispatch_follow_ups()
+    assert len(dispatcher.pending) == 0
+
+    monkeypatch.setattr(schedule.context, "lock", leader)
+    schedule.dispatch_follow_ups()
+    (request,) = dispatcher.pending.values()
+    assert request.follow_up and request.kwargs == {"after": "t3_0"}
+    assert pop_follow_ups(redis) == []
@@ -0,0 +1,94 @@
+# -*- encoding: utf-8 -*-
+# Copyright (c) 2021 Stephen Bunn <stephen@bunn.io>
+# ISC License <https://choosealicense.com/licenses/isc>
+
+"""This module tests the high-water marks of grouped subreddit watches."""
+
+from types import SimpleNamespace
+from typing import List, Optional
+
+import pytest
+from redis import Redis
+
+from brut.watchers import reddit
+from brut.watchers.reddit import HIGH_WATER_MARGIN, MultiredditWatcher
+
+
+def build_submission(subreddit: str, created_utc: float) -> SimpleNamespace:
+    """Build a submission posted to a subreddit at the given time."""
+
+    submission_id = f"{subreddit}{int(created_utc)}"
+    return SimpleNamespace(
+        id=submission_id,
+        name=f"t3_{submission_id}",
+        url=f"https://example.com/{submission_id}",
+        is_self=False,
+        title=submission_id,
+        created_utc=created_utc,
+        permalink=f"/r/{subreddit}/{submission_id}",
+        subreddit=SimpleNamespace(display_name=subreddit),
+    )
+
+
+class Listing:
+    """A combined listing of new submissions, sorted by newest."""
+
+    def __init__(self):
+        """Initialize the listing without any submissions."""
+
+        self.submissions: List[SimpleNamespace] = []
+
+    def iter_subreddit(self, subreddit: str, after: Optional[str] = None):
+        """Iterate over the submissions of the listing."""
+
+        yield from sorted(
+            self.submissions,
+            key=lambda submission: submission.created_utc,
+            reverse=True,
+        )
+
+
+def poll(*subreddits: str) -> List[str]:
+    """Poll subreddits and persist their marks as if their content was committed."""
+
+    watcher = MultiredditWatcher()
+    ids = [content.source_id for content in watcher.iter_content(*subreddits)]
+    watcher.save_state()
+    return ids
+
+
+@pytest.fixture
+def listing(redis: Redis, monkeypatch: pytest.MonkeyPatch) -> Listing:
+    """Poll a local listing and keep high-water marks in the local Redis server."""
+
+    listing = Listing()
+    monkeypatch.setattr(reddit, "get_redis", lambda: redis)
+    monkeypatch.setattr(MultiredditWatcher, "iter_subreddit", listing.iter_subreddit)
+    return listing
+
+
+def test_high_water_margin(listing: Listing):
+    """Ensure submissions appearing late within the margin are polled again."""
+
+    listing.submissions = [
+        build_submission("a", 10000),
+        build_submission("b", 10000),
+        build_submission("a", 9000),
+    ]
+    assert poll("a", "b") == ["a10000", "b10000", "a9000"]
+
+    # an older submission appears after newer submissions were polled
+    late = 10000 - HIGH_WATER_MARGIN // 2
+    listing.submissions += [
+        build_submission("a", late),
+        build_submission("b", 10000 - HIGH_WATER_MARGIN - 1),
+    ]
+    assert poll("a", "b") == ["a10000", "b10000", f"a{late}"]
+
+    # submissions within the margin never lower the marks
+    listing.submissions = [build_submission("a", late)]
+    assert poll("a", "b") == [f"a{late}"]
+    assert MultiredditWatcher().get_high_water(["a", "b"]) == {
+        "a": 10000,
+        "b": 10000,
+    }
@@ -0,0 +1,215 @@
+# -*- encoding: utf-8 -*-
+# Copyright (c) 2021 Stephen Bunn <stephen@bunn.io>
+# ISC License <https://choosealicense.com/licenses/isc>
+
+"""This module tests building and synchronizing the jobs of the scheduler."""
+
+from datetime import datetime, timedelta
+from typing import Dict, Generator, List
+
+import pytest
+from apscheduler.jobstores.memory import MemoryJobStore
+from apscheduler.schedulers.background import BackgroundScheduler
+from apscheduler.triggers.cron import CronTrigger
+from apscheduler.triggers.date import DateTrigger
+from apscheduler.triggers.interval import IntervalTrigger
+from redis import Redis
+
+from brut.config import IntervalConfig, ScheduleConfig, SchedulerConfig, WatchConfig
+from brut.schedule import (
+    build_job_spec,
+    get_phase,
+    get_watch_job_id,
+    group_watches,
+    run_watch,
+    spread_trigger,
+    sync_jobs,
+)
+
+GROUP_SIZE = 4
+
+
+def build_watch(
+    name: str,
+    minutes: int = 5,
+    watch_type: str = "subreddit",
+    immediate: bool = False,
+):
+    """Build the config of a watch of a single subreddit."""
+
+    return WatchConfig(
+        name=name,
+        type=watch_type,
+        args=[name],
+        schedule=ScheduleConfig(
+            interval=IntervalConfig(minutes=minutes), immediate=immediate
+        ),
+    )
+
+
+def get_groups(watch_configs: List[WatchConfig]) -> Dict[str, List[str]]:
+    """Get the subreddits of each grouped watch by its name."""
+
+    return {
+        watch_config.name: watch_config.args
+        for watch_config in group_watches(watch_configs, GROUP_SIZE)
+    }
+
+
+def sync(
+    scheduler: BackgroundScheduler,
+    watch_configs: List[WatchConfig],
+    scheduler_config: SchedulerConfig = SchedulerConfig(),
+):
+    """Synchronize the jobs of the grouped watches with the scheduler."""
+
+    specs = [
+        build_job_spec(
+            get_watch_job_id(watch_config.name),
+            run_watch,
+            watch_config.name,
+            watch_config.schedule,
+            scheduler_config,
+        )
+        for watch_config in group_watches(watch_configs, GROUP_SIZE)
+    ]
+    return sync_jobs(
+        scheduler,
+        {spec.id: spec for spec in specs if spec is not None},
+        scheduler_config,
+    )
+
+
+@pytest.fixture
+def scheduler() -> Generator[BackgroundScheduler, None, None]:
+    """Provide a paused scheduler keeping its jobs in memory."""
+
+    scheduler = BackgroundScheduler(jobstores={"default": MemoryJobStore()})
+    scheduler.start(paused=True)
+    try:
+        yield scheduler
+    finally:
+        scheduler.shutdown(wait=False)
+
+
+def test_get_phase():
+    """Ensure phases are deterministic offsets within their period."""
+
+    phases = [get_phase(f"watch-{index}", 600) for index in range(100)]
+    assert phases == [get_phase(f"watch-{index}", 600) for index in range(100)]
+    assert all(0 <= phase < 600 for phase in phases)
+    # jobs sharing the same period are spread rather than all offset alike
+    assert len(set(phases)) > 50
+    assert get_phase("watch", 0) == 0
+
+
+def test_spread_trigger():
+    """Ensure triggers are offset by their phase with a bounded jitter."""
+
+    trigger = spread_trigger(IntervalTrigger(minutes=10), "watch", 5)
+    assert isinstance(trigger, IntervalTrigger)
+    assert trigger.interval == timedelta(minutes=10)
+    assert trigger.start_date.timestamp() % 600 == get_phase("watch", 600)
+    assert trigger.jitter == 5
+
+    # the jitter never exceeds a tenth of the interval
+    assert spread_trigger(IntervalTrigger(seconds=20), "watch", 5).jitter == 2
+    assert spread_trigger(IntervalTrigger(seconds=5), "watch", 5).jitter is None
+
+    trigger = spread_trigger(CronTrigger(minute="*/5"), "watch", 5)
+    assert isinstance(trigger, CronTrigger)
+    fields = {field.name: str(field) for field in trigger.fields}
+    assert fields["minute"] == "*/5"
+    assert fields["second"] == str(get_phase("watch", 60))
+    assert trigger.jitter == 5
+
+    # triggers that can't be spread are left as is
+    date_trigger = DateTrigger()
+    assert spread_trigger(date_trigger, "watch", 5) is date_trigger
+    assert spread_trigger(None, "watch", 5) is None
+
+
+def test_group_watches_stable():
+    """Ensure a changed subreddit only changes the members of its own group."""
+
+    watch_configs = [build_watch(f"sub{index}") for index in range(20)]
+    groups = get_groups(watch_configs)
+    assert all(len(members) <= GROUP_SIZE for members in groups.values())
+    assert sorted(sum(groups.values(), [])) == sorted(
+        watch_config.name for watch_config in watch_configs
+    )
+    assert get_groups(list(reversed(watch_configs))) == groups
+
+    # a removed subreddit that leaves the number of groups as is only changes its group
+    removed_groups = get_groups(watch_configs[1:])
+    assert [name for name in groups if removed_groups.get(name) != groups[name]] == [
+        name for name, members in groups.items() if "sub0" in members
+    ]
+
+    # watches that can't be grouped and duplicates are left alone
+    ungrouped = build_watch("sub21", watch_type="multireddit")
+    duplicate = build_watch("duplicate")
+    duplicate.args = ["SUB1"]
+    grouped = group_watches(watch_configs + [ungrouped, duplicate], GROUP_SIZE)
+    assert ungrouped in grouped
+    assert sorted(sum((watch.args for watch in grouped[1:]), [])) == sorted(
+        watch_config.name for watch_config in watch_configs
+    )
+
+
+def test_sync_jobs_only_changed(redis: Redis, scheduler: BackgroundScheduler):
+    """Ensure syncing only adds, removes, or reschedules the jobs that changed."""
+
+    watch_configs = [build_watch(f"sub{index}") for index in range(20)]
+    watch_configs.append(build_watch("other", minutes=10, watch_type="multireddit"))
+    job_count = len(get_groups(watch_configs))
+
+    assert sync(scheduler, watch_configs) == (job_count, 0, 0)
+    next_run_times = {job.id: job.next_run_time for job in scheduler.get_jobs()}
+    assert len(next_run_times) == job_count
+
+    # an unchanged config keeps every job and its next run
+    assert sync(scheduler, watch_configs) == (0, 0, 0)
+    assert {job.id: job.next_run_time for job in scheduler.get_jobs()} == (
+        next_run_times
+    )
+
+    # a removed subreddit only changes the arguments of its own group, which are
+    # looked up when the job runs
+    assert sync(scheduler, watch_configs[1:]) == (0, 0, 0)
+
+    # a watch whose schedule changed is rescheduled in place
+    watch_configs[-1] = build_watch("other", minutes=15, watch_type="multireddit")
+    assert sync(scheduler, watch_configs) == (0, 0, 1)
+
+    # a removed watch only removes its own job
+    assert sync(scheduler, watch_configs[:-1]) == (0, 1, 0)
+    assert {job.id for job in scheduler.get_jobs()} == set(next_run_times) - {
+        get_watch_job_id("other")
+    }
+
+
+def test_sync_jobs_ramp(redis: Redis, scheduler: BackgroundScheduler):
+    """Ensure immediate jobs are ramped up one interval apart from each other."""
+
+    scheduler_config = SchedulerConfig(startup_interval=10)
+    watch_configs = [
+        build_watch(f"other{index}", watch_type="multireddit") for index in range(3)
+    ] + [
+        build_watch(f"immediate{index}", watch_type="multireddit", immediate=True)
+        for index in range(3)
+    ]
+    assert sync(scheduler, watch_configs, scheduler_config) == (6, 0, 0)
+
+    # jobs that aren't triggered immediately don't delay the ramp
+    next_run_times = [
+        scheduler.get_job(get_watch_job_id(f"immediate{index}")).next_run_time
+        for index in range(3)
+    ]
+    assert next_run_times[0] - datetime.now(next_run_times[0].tzinfo) < timedelta(
+        seconds=5
+    )
+    assert [
+        (next_run_time - next_run_times[0]).total_seconds()
+        for next_run_time in next_run_times
+    ] == [0, 10, 20]
@@ -0,0 +1,130 @@
+# -*- encoding: utf-8 -*-
+# Copyright (c) 2021 Stephen Bunn <stephen@bunn.io>
+# ISC License <https://choosealicense.com/licenses/isc>
+
+"""This module tests the multi-index hashing index of perceptual hashes."""
+
+import random
+import threading
+from datetime import datetime
+from pathlib import Path
+from typing import List
+
+import pytest
+from sqlalchemy.engine import create_engine
+from sqlalchemy.orm import Session
+
+from brut.db import Artifact, orm_registry
+from brut.similarity import PENDING_LIMIT, HashIndex, to_signed
+
+pytest.importorskip("numpy")
+
+
+def flip_bits(value: int, count: int, rng: random.Random) -> int:
+    """Flip a number of distinct random bits of a 64-bit hash."""
+
+    for bit in rng.sample(range(64), count):
+        value ^= 1 << bit
+
+    return value
+
+
+def add_artifacts(session: Session, hashes: List[int], start_id: int = 1):
+    """Catalog artifacts with the given perceptual hashes and consecutive IDs."""
+
+    for artifact_id, value in enumerate(hashes, start_id):
+        artifact = Artifact(
+            created_at=datetime.now(),
+            fingerprint=f"{artifact_id:016x}",
+            phash=to_signed(value),
+        )
+        artifact.id = artifact_id
+        session.add(artifact)
+
+    session.commit()
+
+
+def test_search_recall():
+    """Ensure every indexed hash within the distance is found, flushed or pending."""
+
+    rng = random.Random(0)
+    hashes = [rng.getrandbits(64) for _ in range(PENDING_LIMIT + 500)]
+    index = HashIndex()
+    for artifact_id, value in enumerate(hashes, 1):
+        index.add(artifact_id, value)
+
+    assert len(index.pending) == 500
+    for distance in range(0, 9):
+        for artifact_id in rng.sample(range(1, len(hashes) + 1), 50):
+            query = flip_bits(hashes[artifact_id - 1], distance, rng)
+            expected = sorted(
+                (other_id, bin(value ^ query).count("1"))
+                for other_id, value in enumerate(hashes, 1)
+                if bin(value ^ query).count("1") <= 8
+            )
+            matches = index.search(query, 8)
+            assert sorted(matches) == expected
+            assert (artifact_id, distance) in matches
+
+
+def test_refresh_out_of_order(session: Session):
+    """Ensure artifacts committed after greater IDs are still loaded once."""
+
+    index = HashIndex()
+    add_artifacts(session, [1, 2, 3], start_id=1)
+    add_artifacts(session, [5], start_id=5)
+    index.refresh(session)
+    assert len(index) == 4
+
+    # artifact 4 was committed after artifact 5 by another worker
+    add_artifacts(session, [4], start_id=4)
+    index.refresh(session)
+    index.refresh(session)
+
+    assert len(index) == 5
+    assert index.search(4, 0) == [(4, 0)]
+
+
+def test_concurrent_refresh_and_search(tmp_path: Path):
+    """Ensure concurrent refreshes and lookups neither drop nor duplicate hashes."""
+
+    engine = create_engine(f"sqlite:///{tmp_path / 'catalog.db'}")
+    orm_registry.metadata.create_all(engine)
+    rng = random.Random(1)
+    hashes = [rng.getrandbits(64) for _ in range(PENDING_LIMIT * 2)]
+
+    index = HashIndex()
+    errors: List[BaseException] = []
+
+    def run():
+        try:
+            with Session(engine) as session:
+                for _ in range(20):
+                    index.refresh(session)
+                    value = rng.choice(hashes)
+                    index.search(value, 4)
+        except BaseException as exc:
+            errors.append(exc)
+
+    with Session(engine) as session:
+        add_artifacts(session, hashes[:PENDING_LIMIT])
+
+    threads = [threading.Thread(target=run) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+
+    with Session(engine) as session:
+        add_artifacts(session, hashes[PENDING_LIMIT:], start_id=PENDING_LIMIT + 1)
+
+    for thread in threads:
+        thread.join()
+
+    assert errors == []
+    with Session(engine) as session:
+        index.refresh(session)
+
+    index.flush()
+    assert len(index) == len(hashes)
+    assert sorted(index.ids.tolist()) == list(range(1, len(hashes) + 1))
+    for artifact_id, value in enumerate(hashes, 1):
+        assert (artifact_id, 0) in index.search(value, 0)
@@ -0,0 +1,62 @@
+# -*- encoding: utf-8 -*-
+# Copyright (c) 2021 Stephen Bunn <stephen@bunn.io>
+# ISC License <https://choosealicense.com/licenses/isc>
+
+"""This module tests rebalancing the store along with its catalog."""
+
+import shutil
+from pathlib import Path
+
+from sqlalchemy.orm import Session
+
+from brut.garbage import index_store, iter_catalog_paths, iter_orphans
+from brut.store import Store, Volume
+
+from .helpers import put_artifact
+
+
+def test_rebalance_updates_catalog(session: Session, tmp_path: Path):
+    """Ensure rebalanced artifacts are not considered orphans of the catalog."""
+
+    volume = Volume(tmp_path / "store")
+    artifacts = [
+        put_artifact(Store([volume], fanout=[1, 2]), session, f"{index}.bin")
+        for index in range(8)
+    ]
+    artifacts.append(
+        put_artifact(Store([volume], fanout=[1, 2]), session, "8.bin", compress=True)
+    )
+
+    store = Store([volume], fanout=[2, 2])
+    assert store.rebalance(session=session, batch_size=3) == len(artifacts)
+
+    for artifact in artifacts:
+        session.refresh(artifact)
+        assert (
+            artifact.path
+            == store.get_relative_path(
+                artifact.fingerprint, Path(artifact.path).name
+            ).as_posix()
+        )
+        assert store.locate(artifact.fingerprint, Path(artifact.path).name)
+
+    assert not list(
+        iter_orphans(index_store(store, workers=1), iter_catalog_paths(session))
+    )
+
+
+def test_volume_usage_excludes_unweighted(tmp_path: Path):
+    """Ensure each device is measured once and only for volumes receiving artifacts."""
+
+    store = Store(
+        [
+            Volume(tmp_path / "drained", weight=0),
+            Volume(tmp_path / "first"),
+            Volume(tmp_path / "second"),
+        ]
+    )
+
+    (usage,) = store.get_volume_usage()
+    assert usage[0] == shutil.disk_usage(tmp_path).total
+    assert (tmp_path / "first").is_dir() and (tmp_path / "second").is_dir()
+    assert not (tmp_path / "drained").exists()
@@ -0,0 +1,147 @@
+# -*- encoding: utf-8 -*-
+# Copyright (c) 2021 Stephen Bunn <stephen@bunn.io>
+# ISC License <https://choosealicense.com/licenses/isc>
+
+"""This module tests discovering and lazily importing watchers from entry points."""
+
+import sys
+from importlib.metadata import EntryPoint
+from pathlib import Path
+from typing import Generator, List, NamedTuple
+
+import pytest
+
+from brut import watchers
+from brut.log import instance as log
+from brut.watchers import BUILTIN_WATCHERS, ENTRY_POINT_GROUP, WatcherRegistry
+
+PLUGIN_MODULE = "brut_test_watchers"
+PLUGIN_SOURCE = """
+from brut.watchers.base import BaseWatcher
+
+
+class PluginWatcher(BaseWatcher):
+    type = "plugin"
+
+    def iter_content(self):
+        yield from ()
+
+
+class NotAWatcher:
+    type = "invalid"
+"""
+
+
+class FakeEntryPoints(NamedTuple):
+    """Entry points of installed packages that can be selected by their group."""
+
+    entry_points: List[EntryPoint]
+
+    def select(self, group: str) -> List[EntryPoint]:
+        """Select the entry points of a group."""
+
+        return [
+            entry_point
+            for entry_point in self.entry_points
+            if entry_point.group == group
+        ]
+
+
+@pytest.fixture
+def plugin(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> Generator[str, None, None]:
+    """Provide an importable module of third-party watchers that isn't imported."""
+
+    (tmp_path / f"{PLUGIN_MODULE}.py").write_text(PLUGIN_SOURCE)
+    monkeypatch.syspath_prepend(str(tmp_path))
+    try:
+        yield PLUGIN_MODULE
+    finally:
+        sys.modules.pop(PLUGIN_MODULE, None)
+
+
+@pytest.fixture
+def warnings() -> Generator[List[str], None, None]:
+    """Collect the messages of logged warnings."""
+
+    messages: List[str] = []
+    handler_id = log.add(messages.append, level="WARNING", format="{message}")
+    try:
+        yield messages
+    finally:
+        log.remove(handler_id)
+
+
+def build_registry(monkeypatch: pytest.MonkeyPatch, **paths: str) -> WatcherRegistry:
+    """Build a registry discovering the given watcher paths by their type."""
+
+    discovered = FakeEntryPoints(
+        [
+            EntryPoint(name=name, value=path, group=ENTRY_POINT_GROUP)
+            for name, path in paths.items()
+        ]
+        + [EntryPoint(name="other", value="other:Watcher", group="other.group")]
+    )
+    monkeypatch.setattr(watchers, "entry_points", lambda: discovered)
+    return WatcherRegistry(ENTRY_POINT_GROUP, BUILTIN_WATCHERS)
+
+
+def test_discover(monkeypatch: pytest.MonkeyPatch, plugin: str):
+    """Ensure watchers of the group are discovered along with the builtin watchers."""
+
+    registry = build_registry(monkeypatch, Plugin=f"{plugin}:PluginWatcher")
+
+    assert registry.get_paths() == {
+        **BUILTIN_WATCHERS,
+        "plugin": f"{plugin}:PluginWatcher",
+    }
+    assert registry.get("other") is None
+    assert registry.get("missing") is None
+
+
+def test_lazy_import(monkeypatch: pytest.MonkeyPatch, plugin: str):
+    """Ensure watcher modules are only imported once their watcher is requested."""
+
+    registry = build_registry(monkeypatch, plugin=f"{plugin}:PluginWatcher")
+    registry.get_paths()
+    assert plugin not in sys.modules
+
+    watcher = registry.get("PLUGIN")
+    assert watcher is not None and watcher.__name__ == "PluginWatcher"
+    assert plugin in sys.modules
+    assert registry.get("plugin") is watcher
+
+
+def test_builtin_wins(
+    monkeypatch: pytest.MonkeyPatch, plugin: str, warnings: List[str]
+):
+    """Ensure a third-party watcher never replaces a builtin watcher of its type."""
+
+    registry = build_registry(
+        monkeypatch,
+        subreddit=f"{plugin}:PluginWatcher",
+        feed=BUILTIN_WATCHERS["feed"],
+    )
+
+    assert registry.get_paths()["subreddit"] == BUILTIN_WATCHERS["subreddit"]
+    assert len(warnings) == 1
+    assert "'subreddit'" in warnings[0] and plugin in warnings[0]
+    assert plugin not in sys.modules
+
+
+def test_reject_invalid(monkeypatch: pytest.MonkeyPatch, plugin: str):
+    """Ensure entry points that aren't importable watcher classes are rejected."""
+
+    registry = build_registry(
+        monkeypatch,
+        invalid=f"{plugin}:NotAWatcher",
+        unknown=f"{plugin}:MissingWatcher",
+        missing="brut_missing_watchers:Watcher",
+    )
+
+    assert registry.get("invalid") is None
+    assert registry.get("unknown") is None
+    assert registry.get("missing") is None
+    # failed imports aren't retried for every poll
+    assert registry.watchers == {"invalid": None, "unknown": None, "missing": None}